@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""
+输入映射与命令解析热路径的微基准
+
+覆盖:
+    - CarServer._process_command            （模拟GPIO）
+    - CarController.set_motor               （模拟GPIO）
+    - KeyTracker.get_key_event / read_events / _check_key_release   （用管道代替终端）
+    - PygameController.get_movement_command / get_camera_command / _apply_deadzone
+    - PygameController 按键/摇杆事件处理（按配置表查下标）
+    - input_shaping 的响应曲线查找表和 MoveShaper
+    - nal_relay 的 NAL 切分和多路分发、rtp_packetizer 的 RTP 打包、segment_recorder 的 MPEG-TS 封装、
+      keyframe_snapshot 的关键帧缓存（合成的 H.264 字节流）
+
+这些函数在小车和客户端上以 60-100Hz 运行，单次调用开销很重要。
+不需要任何硬件；结果可保存为 JSON 并与之前的结果对比。
+
+用法:
+    python3 bench_micro.py                          # 运行全部
+    python3 bench_micro.py -k server                # 只运行名字包含 server 的用例
+    python3 bench_micro.py --json new.json --compare old.json
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import statistics
+
+# 服务端模块位于 server/motor 下
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'server', 'motor'))
+os.environ['CAR_GPIO'] = 'sim'
+os.environ.setdefault('CAR_LOG_LEVEL', 'ERROR')
+
+REPEAT = 5
+MIN_TIME = 0.2  # 每轮至少运行的秒数
+
+
+class Case:
+    """
+    一个基准用例
+
+    func:  被测的无参可调用对象
+    setup: 可选，每轮计时前调用 setup(number)，不计入耗时
+    """
+
+    def __init__(self, name, func, setup=None, max_number=None):
+        self.name = name
+        self.func = func
+        self.setup = setup
+        self.max_number = max_number
+
+    def _timed(self, number):
+        if self.setup:
+            self.setup(number)
+        func = self.func
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        return time.perf_counter() - start
+
+    def _autorange(self):
+        """与 timeit.Timer.autorange 相同：调用次数按 1,2,5,10... 增长直到一轮超过 MIN_TIME"""
+        i = 1
+        while True:
+            for j in (1, 2, 5):
+                number = i * j
+                if self.max_number and number >= self.max_number:
+                    return self.max_number
+                if self._timed(number) >= MIN_TIME:
+                    return number
+            i *= 10
+
+    def run(self, repeat=REPEAT):
+        number = self._autorange()
+        per_call = [self._timed(number) / number for _ in range(repeat)]
+        return {
+            'number': number,
+            'min_ns': min(per_call) * 1e9,
+            'median_ns': statistics.median(per_call) * 1e9,
+        }
+
+
+class _NullSocket:
+    def sendall(self, data):
+        pass
+
+
+def server_cases():
+    from server import CarServer
+
+    server = CarServer()
+    controller = server.controller
+    sink = _NullSocket()
+    cases = []
+    for cmd in ['MOVE:FORWARD', 'MOVE:LEFT:80', 'STOP', 'BELL:OFF', 'HEARTBEAT',
+                'STATUS:REQUEST', 'BOGUS:COMMAND', 'MOVE:FORWARD:60;BELL:OFF']:
+        cases.append(Case(f"server._process_command[{cmd}]",
+                          lambda cmd=cmd: server._process_command(cmd, sink)))
+
+    pwm = controller.pwms[0]
+    for speed in (50, -50, 0):
+        cases.append(Case(f"controller.set_motor[{speed}]",
+                          lambda speed=speed: controller.set_motor(pwm, 17, 18, speed)))
+    cases.append(Case("controller.forward", controller.forward))
+    return cases
+
+
+def client_cases():
+    import client
+
+    # 用管道代替终端 stdin
+    read_fd, write_fd = os.pipe()
+    os.set_blocking(write_fd, False)
+    tracker = client.KeyTracker(fd=read_fd)
+
+    def fill_repeat(number):
+        # 模拟按住 W 的自动重复
+        tracker.key_states['w_move'] = True
+        tracker.combo_hits = 1
+        os.write(write_fd, b'w' * number)
+
+    burst = b'w' * 12 + b'\x1b[D' * 4 + b'kk'
+
+    def read_burst():
+        # 一整批输入：自动重复 + 方向键 + 摄像头（含一次管道写入的开销）
+        os.write(write_fd, burst)
+        return tracker.read_events()
+
+    def idle_state(number):
+        for key in tracker.key_states:
+            tracker.key_states[key] = False
+        tracker.combo_hits = 0
+
+    def expire_keys():
+        tracker.key_states['w_move'] = True
+        tracker.key_states['a_move'] = True
+        tracker.combo_hits = 2
+        tracker.last_key_time = 0.0
+        return tracker._check_key_release()
+
+    return [
+        Case("client.get_key_event[repeat]", tracker.get_key_event,
+             setup=fill_repeat, max_number=50000),
+        Case("client.get_key_event[idle]", tracker.get_key_event,
+             setup=idle_state),
+        Case("client.read_events[burst]", read_burst),
+        Case("client._check_key_release[idle]", tracker._check_key_release,
+             setup=idle_state),
+        Case("client._check_key_release[release]", expire_keys),
+    ]
+
+
+def shaping_cases():
+    from input_shaping import MoveShaper, ResponseCurve
+
+    curve = ResponseCurve()
+    shaper = MoveShaper()
+    return [
+        Case("shaping.curve", lambda: curve(-0.61)),
+        Case("shaping.move[forward]", lambda: shaper.shape(0.2, 0.8)),
+        Case("shaping.move[diagonal]", lambda: shaper.shape(0.7, 0.71)),
+    ]
+
+
+def joystick_cases():
+    try:
+        import joystick
+    except ImportError as e:
+        print(f"跳过 joystick 用例: {e}")
+        return []
+
+    from types import SimpleNamespace
+    from input_shaping import MoveShaper
+    from controller_profiles import CompiledProfile, PROFILES
+
+    # 跳过 pygame.init()，只测映射逻辑
+    controller = joystick.PygameController.__new__(joystick.PygameController)
+    controller.stick_deadzone = 0.1
+    controller.move_shaper = MoveShaper(deadzone=0.1)
+    controller.left_stick_x = controller.left_stick_y = 0.0
+    controller.right_stick_x = controller.right_stick_y = 0.0
+    controller.buttons = dict.fromkeys(
+        ['a', 'b', 'x', 'y', 'l', 'r', 'zl', 'zr', 'minus', 'plus',
+         'left_stick_press', 'right_stick_press'], False)
+    controller.profile = CompiledProfile(PROFILES[0], 16, 6)
+    press_b = SimpleNamespace(button=1)
+    axis_event = SimpleNamespace(axis=1, value=-0.62)
+
+    def toggle_b():
+        controller._process_button_down(press_b)
+        controller._process_button_up(press_b)
+
+    def stick(lx, ly, rx=0.0, ry=0.0):
+        def set_sticks(number):
+            controller.left_stick_x, controller.left_stick_y = lx, ly
+            controller.right_stick_x, controller.right_stick_y = rx, ry
+        return set_sticks
+
+    return [
+        Case("joystick._apply_deadzone[inside]", lambda: controller._apply_deadzone(0.05)),
+        Case("joystick._apply_deadzone[outside]", lambda: controller._apply_deadzone(-0.73)),
+        Case("joystick.get_movement_command[idle]", controller.get_movement_command,
+             setup=stick(0.0, 0.0)),
+        Case("joystick.get_movement_command[forward]", controller.get_movement_command,
+             setup=stick(0.2, 0.8)),
+        Case("joystick.get_movement_command[turn]", controller.get_movement_command,
+             setup=stick(-0.9, 0.3)),
+        Case("joystick.get_camera_command[idle]", controller.get_camera_command,
+             setup=stick(0.0, 0.0)),
+        Case("joystick.get_camera_command[diagonal]", controller.get_camera_command,
+             setup=stick(0.0, 0.0, 0.8, 0.8)),
+        Case("joystick._process_button_down+up", toggle_b),
+        Case("joystick._process_axis_motion", lambda: controller._process_axis_motion(axis_event)),
+    ]
+
+
+def relay_cases():
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'server'))
+    from nal_relay import NalSplitter, ParameterSets, NalRelay, Viewer
+    from rtp_packetizer import RtpPacketizer
+    from segment_recorder import TsMuxer
+    from keyframe_snapshot import KeyframeSnapshot
+
+    # 合成一次读取的数据：SPS + PPS + IDR，后面是若干 P 帧，共约 64KB
+    chunk = (b'\x00\x00\x00\x01\x67' + b'\x42' * 12 + b'\x00\x00\x00\x01\x68' + b'\xce' * 4
+             + b'\x00\x00\x00\x01\x65\x88' + b'\x11' * 30000
+             + (b'\x00\x00\x00\x01\x41\x9a' + b'\x22' * 3000) * 11)
+    splitter = NalSplitter()
+    # NAL 回调的输入：与 StreamSupervisor 相同，切分一次，先更新参数集再交给回调
+    pieces = NalSplitter().feed(chunk)
+    params = ParameterSets()
+
+    def nal_feed(sink):
+        def run():
+            for piece, nal_type in pieces:
+                params.update(piece, nal_type)
+                sink(piece, nal_type)
+        return run
+
+    class _NullViewer(Viewer):
+        def start(self):
+            pass
+
+    relay = NalRelay(params)
+    for i in range(4):
+        viewer = _NullViewer(f'null{i}', max_bytes=1 << 30)
+        relay.add_viewer(viewer)
+
+    packetizer = RtpPacketizer(params, ('127.0.0.1', 9))
+    muxer = TsMuxer()
+    snapshot = KeyframeSnapshot(params)
+    frame = chunk[:30032]
+    ts_out = bytearray()
+
+    def drain(number):
+        for viewer in relay.viewers:
+            viewer.queue.clear()
+            viewer.queued = 0
+
+    return [
+        Case("relay.split[64k]", lambda: splitter.feed(chunk)),
+        Case("relay.feed_nal[64k, 4 viewers]", nal_feed(relay.feed_nal), setup=drain, max_number=2000),
+        # 发往本机 discard 端口，包含 sendmsg 系统调用的开销
+        Case("rtp.feed_nal[64k]", nal_feed(packetizer.feed_nal)),
+        Case("record.ts_mux[30k frame]", lambda: muxer.write_frame(ts_out, frame, 90000, True),
+             setup=lambda number: ts_out.clear(), max_number=2000),
+        # 没有截图请求时读取线程的额外开销
+        Case("snapshot.feed_nal[64k]", nal_feed(snapshot.feed_nal)),
+    ]
+
+
+GROUPS = [server_cases, client_cases, shaping_cases, joystick_cases, relay_cases]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="热路径微基准（无需硬件）")
+    parser.add_argument('-k', metavar='PATTERN', help="只运行名字包含 PATTERN 的用例")
+    parser.add_argument('--repeat', type=int, default=REPEAT, help="重复轮数")
+    parser.add_argument('--json', metavar='PATH', help="把结果写入 JSON")
+    parser.add_argument('--compare', metavar='PATH', help="与之前保存的 JSON 结果对比")
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+
+    results = {}
+    print(f"{'用例':48s} {'中位数':>12s} {'最小值':>12s}")
+    for group in GROUPS:
+        for case in group():
+            if args.k and args.k not in case.name:
+                continue
+            result = case.run(args.repeat)
+            results[case.name] = result
+            line = f"{case.name:48s} {result['median_ns']:10.0f}ns {result['min_ns']:10.0f}ns"
+            old = baseline.get(case.name)
+            if old:
+                line += f"  {result['median_ns'] / old['median_ns'] - 1:+.1%}"
+            print(line)
+
+    if args.json:
+        report = {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'results': results,
+        }
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+手柄后端启动开销对比（pygame vs evdev）
+
+每个后端在独立的子进程里启动若干次，测量：
+    - 导入 joystick 模块的耗时
+    - 创建后端并查找、连接手柄的耗时（没有手柄时测到查找失败为止）
+    - 进程总耗时（含解释器启动）
+    - 就绪时的 RSS 和峰值 RSS
+
+适合在第二台树莓派之类的小设备上确认哪个后端更轻。
+
+用法:
+    python3 bench_startup.py                       # 两个后端各跑 5 次
+    python3 bench_startup.py --backend evdev --repeat 10 --json startup.json
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import resource
+import statistics
+import subprocess
+
+BACKENDS = ['evdev', 'pygame']
+REPEAT = 5
+
+
+def _rss_kb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def child(backend):
+    """子进程入口：启动一个后端并把测量结果以 JSON 打印到 stdout"""
+    start = time.perf_counter()
+    try:
+        import joystick
+        imported = time.perf_counter()
+        controller = joystick.create_controller(backend)
+        connected = controller.connect()
+        ready = time.perf_counter()
+    except ImportError as e:
+        print(json.dumps({'error': str(e)}))
+        return 1
+    result = {
+        'import_ms': (imported - start) * 1000,
+        'init_ms': (ready - imported) * 1000,
+        'connected': connected,
+        'rss_kb': _rss_kb(),
+        'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+    controller.close()
+    print(json.dumps(result))
+    return 0
+
+
+def run_once(backend):
+    env = dict(os.environ)
+    env.setdefault('CAR_LOG_LEVEL', 'ERROR')
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', backend],
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, env=env,
+        cwd=os.path.dirname(os.path.abspath(__file__)))
+    wall = time.perf_counter() - start
+    lines = proc.stdout.decode().strip().splitlines()
+    if not lines:
+        return {'error': f"子进程退出码 {proc.returncode}"}
+    result = json.loads(lines[-1])
+    result['process_ms'] = wall * 1000
+    return result
+
+
+def summarize(runs):
+    summary = {'runs': len(runs), 'connected': all(r['connected'] for r in runs)}
+    for key in ('import_ms', 'init_ms', 'process_ms', 'rss_kb', 'max_rss_kb'):
+        values = [r[key] for r in runs if r.get(key) is not None]
+        if values:
+            summary[key] = statistics.median(values)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="手柄后端启动时间和内存对比")
+    parser.add_argument('--backend', choices=BACKENDS, action='append',
+                        help="只测指定后端（可重复），默认全部")
+    parser.add_argument('--repeat', type=int, default=REPEAT, help="每个后端启动次数")
+    parser.add_argument('--json', metavar='PATH', help="把结果写入 JSON")
+    parser.add_argument('--child', choices=BACKENDS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return child(args.child)
+
+    results = {}
+    print(f"{'后端':8s} {'导入':>10s} {'初始化':>10s} {'进程':>10s} {'RSS':>10s} {'峰值RSS':>10s}")
+    for backend in args.backend or BACKENDS:
+        runs = [run_once(backend) for _ in range(args.repeat)]
+        errors = [r['error'] for r in runs if 'error' in r]
+        if errors:
+            print(f"{backend:8s} 跳过: {errors[0]}")
+            continue
+        s = results[backend] = summarize(runs)
+        print(f"{backend:8s} {s['import_ms']:8.1f}ms {s['init_ms']:8.1f}ms "
+              f"{s['process_ms']:8.1f}ms {s.get('rss_kb', 0):8d}KB {s['max_rss_kb']:8d}KB"
+              + ("" if s['connected'] else "  (未连接手柄)"))
+
+    if args.json:
+        report = {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'repeat': args.repeat,
+            'results': results,
+        }
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
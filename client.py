@@ -1,22 +1,162 @@
 #!/usr/bin/env python3
+import os
 import sys
 import select
+import selectors
+import heapq
 import termios
 import tty
 import socket
 import time
 import logging
+import threading
+import urllib.request
 
 # 配置日志
 logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger('CarClient')
 
-class KeyTracker:
+# 心跳间隔（秒）
+HEARTBEAT_INTERVAL = 5.0
+
+# 终端按键抬起判定的固定超时（未校准时使用）
+SINGLE_KEY_TIMEOUT = 0.5
+COMBO_KEY_TIMEOUT = 0.1
+# 自动重复校准：超时 = 观测间隔 * REPEAT_MARGIN + REPEAT_SLACK
+REPEAT_MARGIN = 1.5
+REPEAT_SLACK = 0.015
+REPEAT_ALPHA = 0.25  # 间隔估计的 EWMA 系数
+# 首次重复之前：超时 = 观测到的首次延迟 + DELAY_SLACK
+DELAY_SLACK = 0.03
+# 可信的自动重复首次延迟和重复间隔范围（秒），范围外视为人为连按
+REPEAT_DELAY_RANGE = (0.1, 1.0)
+REPEAT_INTERVAL_RANGE = (0.01, 0.2)
+
+class RepeatCalibrator:
+    """
+    终端自动重复节奏的在线估计
+
+    分别估计首次重复延迟（按下到第一次重复）和重复间隔，
+    按键单独估计，没有该键数据时使用本次会话所有键的估计。
+    """
+
     def __init__(self):
-        self.fd = sys.stdin.fileno()
-        self.old_settings = termios.tcgetattr(self.fd)
-        tty.setcbreak(self.fd)
+        self.delay = {}      # 键 -> 首次延迟估计
+        self.interval = {}   # 键 -> 重复间隔估计
+        self.session_delay = None
+        self.session_interval = None
+        self.releases = 0
+        self.saved_total = 0.0
+
+    @staticmethod
+    def _ewma(old, value):
+        return value if old is None else old + REPEAT_ALPHA * (value - old)
+
+    def observe(self, key, gap, repeats):
+        """记录同一按键的一次重复，repeats 为此前已收到的重复次数"""
+        if repeats == 0:
+            low, high = REPEAT_DELAY_RANGE
+            if low <= gap <= high:
+                self.delay[key] = self._ewma(self.delay.get(key), gap)
+                self.session_delay = self._ewma(self.session_delay, gap)
+        else:
+            low, high = REPEAT_INTERVAL_RANGE
+            estimate = self.interval.get(key, self.session_interval)
+            if low <= gap <= high and (estimate is None or gap < estimate * 3):
+                self.interval[key] = self._ewma(self.interval.get(key), gap)
+                self.session_interval = self._ewma(self.session_interval, gap)
+
+    def timeout(self, key, repeats, fixed):
+        """按键 key 已收到 repeats 次重复时的抬起判定超时"""
+        if repeats > 0:
+            estimate = self.interval.get(key, self.session_interval)
+            if estimate is None:
+                return fixed
+            return min(fixed, estimate * REPEAT_MARGIN + REPEAT_SLACK)
+        # 首次重复之前：首次延迟是系统设置，非常稳定，只留少量余量
+        estimate = self.delay.get(key, self.session_delay)
+        if estimate is None:
+            return fixed
+        return estimate + DELAY_SLACK
+
+    def record_release(self, fixed, used):
+        self.releases += 1
+        self.saved_total += fixed - used
+
+    def summary(self):
+        def ms(value):
+            return f"{value * 1000:.0f}ms" if value is not None else "n/a"
+        saved = self.saved_total / self.releases * 1000 if self.releases else 0.0
+        return (f"delay={ms(self.session_delay)} interval={ms(self.session_interval)} "
+                f"releases={self.releases} avg_stop_latency_saved={saved:.0f}ms")
+
+# 方向键转义序列（普通模式 ESC [ x 和应用模式 ESC O x）对应的按键
+ARROW_KEYS = {'A': 'w', 'B': 's', 'C': 'd', 'D': 'a'}
+
+def decode_keys(data):
+    """
+    把终端输入解码为按键字符列表，方向键转换为对应的 WASD
+
+    返回 (按键列表, 末尾不完整的转义序列)
+    """
+    keys = []
+    i = 0
+    n = len(data)
+    while i < n:
+        ch = data[i]
+        if ch != '\x1b':
+            keys.append(ch)
+            i += 1
+            continue
+        if i + 1 >= n or (data[i + 1] in '[O' and i + 2 >= n):
+            return keys, data[i:]
+        if data[i + 1] in '[O':
+            # ESC [ 后可能带数字参数（如 ESC [ 1 ; 5 A），跳到结束字符
+            j = i + 2
+            while j < n and (data[j].isdigit() or data[j] == ';'):
+                j += 1
+            if j >= n:
+                return keys, data[i:]
+            if data[j] in ARROW_KEYS:
+                keys.append(ARROW_KEYS[data[j]])
+            i = j + 1
+        else:
+            i += 1  # 单独的 ESC，忽略
+    return keys, ''
+
+def reduce_events(events):
+    """
+    把一批事件合并为一次状态变化
+
+    移动（方向/STOP）和铃音只保留最后的状态；摄像头、回中、状态查询等瞬时动作
+    按顺序保留，连续重复的只保留一次；遇到 quit 时丢弃之后的事件。
+    """
+    actions = []
+    move = None
+    bell = None
+    for event in events:
+        if not event:
+            continue
+        if event == 'quit':
+            actions.append(event)
+            break
+        if event.endswith('_move') or event == 'stop':
+            move = event
+        elif event in ('bell_ring', 'bell_off'):
+            bell = event
+        elif not actions or actions[-1] != event:
+            actions.append(event)
+    reduced = [e for e in (move, bell) if e]
+    return reduced + actions
+
+class KeyTracker:
+    def __init__(self, fd=None):
+        self.fd = sys.stdin.fileno() if fd is None else fd
+        self.old_settings = None
+        if os.isatty(self.fd):
+            self.old_settings = termios.tcgetattr(self.fd)
+            tty.setcbreak(self.fd)
         self.key_states = {
             'w_move': False,
             's_move': False,
@@ -28,56 +168,106 @@ class KeyTracker:
         self.combo_hits = 0
         self.servo1_angle = 135
         self.servo2_angle = 90
+        # 自动重复校准：最后收到的按键及其重复次数
+        self.calibrator = RepeatCalibrator()
+        self.last_key = None
+        self.key_repeats = 0
+        # 跨两次读取的不完整转义序列
+        self.pending = ''
         logger.info("KeyTracker initialized")
 
+    def fileno(self):
+        return self.fd
+
+    def read_events(self):
+        """
+        输入可读时调用：一次读出终端缓冲区中所有待处理的字节，
+        解码方向键转义序列，返回合并后的事件列表（见 reduce_events）
+        """
+        data = self.pending + os.read(self.fd, 4096).decode(errors='ignore')
+        keys, self.pending = decode_keys(data)
+        return reduce_events([self.key_event(ch) for ch in keys])
+
     def get_key_event(self):
         """检测按键按下/抬起事件"""
-        if select.select([sys.stdin], [], [], 0)[0]:
-            ch = sys.stdin.read(1)
-            if ch.lower() in ['w', 's', 'a', 'd']:
-                key = f"{ch.lower()}_move"
-                self.last_key_time = time.time()
-                # 仅当按键状态改变时增加combo_hits
-                if not self.key_states.get(key, False):
-                    self.key_states[key] = True
-                    self.combo_hits += 1
-                    return key
-            elif ch.lower() in ['h', 'j', 'k', 'l']:
-                # HJKL是瞬时动作，不增加combo_hits
-                return f"{ch.lower()}_ang"
-            elif ch.lower() == 'b':
-                self.last_key_time = time.time()
-                # 仅当按键状态改变时增加combo_hits
-                if not self.key_states.get('bell_ring', False):
-                    self.key_states['bell_ring'] = True
-                    self.combo_hits += 1
-                    return 'bell_ring'
-            elif ch.lower() == 'q':
-                return 'quit'
-            elif ch.lower() == 'c':
-                return 'center_ang'
-            elif ch.lower() == 'i':
-                return 'status_request'
-            return None
+        if select.select([self.fd], [], [], 0)[0]:
+            return self.read_key_event()
         else:
             return self._check_key_release()
 
+    def read_key_event(self):
+        """stdin 可读时读取一个按键并转换为事件"""
+        return self.key_event(os.read(self.fd, 1).decode(errors='ignore'))
+
+    def key_event(self, ch):
+        """把一个按键字符转换为事件"""
+        if ch.lower() in ['w', 's', 'a', 'd']:
+            key = f"{ch.lower()}_move"
+            self._observe_key(key)
+            # 仅当按键状态改变时增加combo_hits
+            if not self.key_states.get(key, False):
+                self.key_states[key] = True
+                self.combo_hits += 1
+                return key
+        elif ch.lower() in ['h', 'j', 'k', 'l']:
+            # HJKL是瞬时动作，不增加combo_hits
+            return f"{ch.lower()}_ang"
+        elif ch.lower() == 'b':
+            self._observe_key('bell_ring')
+            # 仅当按键状态改变时增加combo_hits
+            if not self.key_states.get('bell_ring', False):
+                self.key_states['bell_ring'] = True
+                self.combo_hits += 1
+                return 'bell_ring'
+        elif ch.lower() == 'q':
+            return 'quit'
+        elif ch.lower() == 'c':
+            return 'center_ang'
+        elif ch.lower() == 'i':
+            return 'status_request'
+        elif ch.lower() == 'p':
+            return 'snapshot_request'
+        return None
+
+    def _observe_key(self, key):
+        """记录按键到达时间，同一按住的键再次到达即为一次自动重复"""
+        now = time.time()
+        if key == self.last_key and self.key_states.get(key, False):
+            self.calibrator.observe(key, now - self.last_key_time, self.key_repeats)
+            self.key_repeats += 1
+        else:
+            self.last_key = key
+            self.key_repeats = 0
+        self.last_key_time = now
+
+    def _fixed_timeout(self):
+        # 单键按下时使用较长的超时，多键按下时使用较短的超时
+        return SINGLE_KEY_TIMEOUT if self.combo_hits == 1 else COMBO_KEY_TIMEOUT
+
+    def release_timeout(self):
+        """当前的抬起判定超时：按观测到的自动重复节奏校准，未校准时使用固定值"""
+        return self.calibrator.timeout(self.last_key, self.key_repeats, self._fixed_timeout())
+
+    def release_deadline(self):
+        """下一次按键抬起判定的时间点（time.time()），没有按住的键时返回 None"""
+        if self.combo_hits == 0:
+            return None
+        return self.last_key_time + self.release_timeout()
+
     def _check_key_release(self):
         """检查是否有按键抬起"""
         now = time.time()
         key_released = False
         if self.combo_hits > 0:
-            # 单键按下时使用较长的超时
-            if self.combo_hits == 1:
-                if now - self.last_key_time > 0.5:
-                    key_released = True
-            # 多键按下时使用较短的超时
-            else:
-                if now - self.last_key_time > 0.1:
-                    key_released = True
+            timeout = self.release_timeout()
+            if now - self.last_key_time > timeout:
+                key_released = True
+                self.calibrator.record_release(self._fixed_timeout(), timeout)
 
         if key_released:
             self.last_key_time = now
+            self.last_key = None
+            self.key_repeats = 0
             released_keys = []
 
             # 检查方向键是否释放
@@ -118,8 +308,141 @@ class KeyTracker:
 
     def cleanup(self):
         """恢复终端设置"""
-        termios.tcsetattr(self.fd, termios.TCSADRAIN, self.old_settings)
-        logger.info("Terminal settings restored")
+        logger.info("Autorepeat calibration: %s", self.calibrator.summary())
+        if self.old_settings is not None:
+            termios.tcsetattr(self.fd, termios.TCSADRAIN, self.old_settings)
+            logger.info("Terminal settings restored")
+
+class EvdevKeyTracker:
+    """
+    基于 evdev 的按键跟踪
+
+    直接读取键盘的 EV_KEY 按下/抬起事件（参考 proto/key_test.py），
+    松开按键即发送 STOP，不需要靠自动重复超时推断。
+    需要本机键盘和 /dev/input 的读权限（input 组）。
+    """
+
+    def __init__(self, device_path=None):
+        import evdev
+        from evdev import ecodes
+
+        self.ecodes = ecodes
+        self.device = self._find_keyboard(evdev, device_path)
+        if self.device is None:
+            raise OSError("no keyboard input device found")
+
+        # 终端仍会收到按键字符：关闭回显，退出时丢弃（与 KeyTracker 相同，stdin 不是终端时跳过）
+        self.fd = sys.stdin.fileno()
+        self.old_settings = None
+        try:
+            if os.isatty(self.fd):
+                self.old_settings = termios.tcgetattr(self.fd)
+                tty.setcbreak(self.fd)
+        except termios.error:
+            self.device.close()
+            raise
+
+        # 键码 -> 事件名
+        self.move_keys = {
+            ecodes.KEY_W: 'w_move', ecodes.KEY_UP: 'w_move',
+            ecodes.KEY_S: 's_move', ecodes.KEY_DOWN: 's_move',
+            ecodes.KEY_A: 'a_move', ecodes.KEY_LEFT: 'a_move',
+            ecodes.KEY_D: 'd_move', ecodes.KEY_RIGHT: 'd_move',
+        }
+        self.press_keys = {
+            ecodes.KEY_H: 'h_ang', ecodes.KEY_J: 'j_ang',
+            ecodes.KEY_K: 'k_ang', ecodes.KEY_L: 'l_ang',
+            ecodes.KEY_C: 'center_ang', ecodes.KEY_I: 'status_request',
+            ecodes.KEY_P: 'snapshot_request',
+            ecodes.KEY_Q: 'quit', ecodes.KEY_ESC: 'quit',
+        }
+        # 按下顺序，松开一个方向键后回到仍按住的最后一个方向
+        self.held_moves = []
+        self.bell_held = False
+        logger.info("EvdevKeyTracker listening on %s (%s)", self.device.name, self.device.path)
+
+    @staticmethod
+    def _find_keyboard(evdev, device_path):
+        if device_path:
+            return evdev.InputDevice(device_path)
+        for path in evdev.list_devices():
+            try:
+                device = evdev.InputDevice(path)
+            except OSError:
+                continue  # 没有读权限的设备
+            keys = device.capabilities().get(evdev.ecodes.EV_KEY, [])
+            if evdev.ecodes.KEY_W in keys and evdev.ecodes.KEY_Q in keys:
+                return device
+            device.close()
+        return None
+
+    def fileno(self):
+        return self.device.fd
+
+    def read_events(self):
+        """读取所有待处理的输入事件，返回事件列表"""
+        ecodes = self.ecodes
+        events = []
+        try:
+            pending = list(self.device.read())
+        except BlockingIOError:
+            return events
+        for ev in pending:
+            if ev.type != ecodes.EV_KEY or ev.value == 2:  # 忽略自动重复
+                continue
+            pressed = ev.value == 1
+            if ev.code in self.move_keys:
+                key = self.move_keys[ev.code]
+                if pressed:
+                    if key in self.held_moves:
+                        continue
+                    self.held_moves.append(key)
+                    events.append(key)
+                elif key in self.held_moves:
+                    was_active = self.held_moves[-1] == key
+                    self.held_moves.remove(key)
+                    if not self.held_moves:
+                        events.append('stop')
+                    elif was_active:
+                        events.append(self.held_moves[-1])
+            elif ev.code == ecodes.KEY_B:
+                if pressed != self.bell_held:
+                    self.bell_held = pressed
+                    events.append('bell_ring' if pressed else 'bell_off')
+            elif pressed and ev.code in self.press_keys:
+                events.append(self.press_keys[ev.code])
+        return events
+
+    def release_deadline(self):
+        """按键抬起由事件直接给出，不需要超时判定"""
+        return None
+
+    def _check_key_release(self):
+        return None
+
+    def cleanup(self):
+        """关闭设备并恢复终端设置"""
+        self.device.close()
+        if self.old_settings is not None:
+            termios.tcflush(self.fd, termios.TCIFLUSH)
+            termios.tcsetattr(self.fd, termios.TCSADRAIN, self.old_settings)
+        logger.info("Input device closed, terminal settings restored")
+
+def create_key_tracker(input_mode='auto'):
+    """
+    创建按键跟踪器
+
+    input_mode: 'evdev' 强制使用 evdev；'terminal' 使用终端输入；
+                'auto' 本地会话优先 evdev，SSH 会话或 evdev 不可用时退回终端
+    """
+    if input_mode == 'evdev' or (input_mode == 'auto' and not os.environ.get('SSH_CONNECTION')):
+        try:
+            return EvdevKeyTracker()
+        except (ImportError, OSError, termios.error) as e:
+            if input_mode == 'evdev':
+                raise
+            logger.info("evdev input unavailable (%s), using terminal input", e)
+    return KeyTracker()
 
 def send_command(sock, command):
     """发送命令到服务器"""
@@ -131,7 +454,97 @@ def send_command(sock, command):
         logger.error("Failed to send command: %s", str(e))
         return False
 
-def main(server_host='localhost', server_port=5000):
+def send_commands(sock, commands):
+    """把多条命令合并为一条批量命令（';' 分隔，服务端整批一次应用）"""
+    return send_command(sock, ";".join(commands))
+
+class TimerQueue:
+    """基于堆的定时器，时间使用 time.monotonic()"""
+
+    def __init__(self):
+        self.heap = []
+        self.seq = 0  # 同一时刻的定时器按加入顺序执行
+
+    def schedule(self, when, callback, interval=None):
+        """
+        在 when 时刻调用 callback
+
+        interval 不为 None 时为周期定时器，下次触发时间按 when + interval 计算，
+        不会因处理延迟而漂移或重复触发
+        """
+        heapq.heappush(self.heap, (when, self.seq, callback, interval))
+        self.seq += 1
+
+    def timeout(self, now):
+        """距离最近一个定时器的秒数，没有定时器时返回 None"""
+        if not self.heap:
+            return None
+        return max(0.0, self.heap[0][0] - now)
+
+    def run_due(self, now):
+        """执行所有到期的定时器"""
+        while self.heap and self.heap[0][0] <= now:
+            when, _, callback, interval = heapq.heappop(self.heap)
+            callback()
+            if interval is not None:
+                # 跳过已经错过的周期，保证每个周期只触发一次
+                next_when = when + interval
+                if next_when <= now:
+                    next_when += ((now - next_when) // interval + 1) * interval
+                self.schedule(next_when, callback, interval)
+
+
+def event_to_command(event):
+    """把按键事件转换为命令"""
+    if event.endswith('_move'):
+        direction = event[0].upper()
+        return f"MOVE:{'FORWARD' if direction == 'W' else 'BACKWARD' if direction == 'S' else 'LEFT' if direction == 'A' else 'RIGHT'}"
+    elif event.endswith('_ang'):
+        action = event[0].upper()
+        return f"SERVO:{'LEFT' if action == 'H' else 'DOWN' if action == 'J' else 'UP' if action == 'K' else 'RIGHT'}"
+    elif event == "bell_ring":
+        return "BELL:ON"
+    elif event == "bell_off":
+        return "BELL:OFF"
+    elif event == "center_ang":
+        return "SERVO:CENTER"
+    elif event == "stop":
+        return "STOP"
+    elif event == "status_request":
+        return "STATUS:REQUEST"
+    elif event == "snapshot_request":
+        return "SNAPSHOT:REQUEST"
+    return None
+
+
+def fetch_snapshot(url):
+    """在后台下载服务端回复的截图地址，保存到当前目录"""
+    def fetch():
+        path = time.strftime('snapshot-%Y%m%d-%H%M%S.jpg')
+        try:
+            with urllib.request.urlopen(url, timeout=10) as resp, open(path, 'wb') as f:
+                f.write(resp.read())
+        except Exception as e:
+            print(f"\r截图失败: {e}        ", end='')
+            return
+        print(f"\r截图已保存: {path}        ", end='')
+    threading.Thread(target=fetch, daemon=True).start()
+
+
+def handle_server_line(line):
+    """处理服务端发来的一行消息"""
+    if line.startswith("STATUS:"):
+        print(f"\r{line} | 按I查看状态        ", end='')
+    elif line.startswith("SNAPSHOT:"):
+        fetch_snapshot(line[len("SNAPSHOT:"):])
+    elif line.startswith("RATE:"):
+        # 温控频率限制只对固定频率发送的手柄客户端有意义，键盘按事件发送
+        pass
+    elif line:
+        print(f"\r服务器响应: {line}        ", end='')
+
+
+def main(server_host='localhost', server_port=5000, input_mode='auto'):
     # 连接到服务器
     sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     try:
@@ -141,65 +554,78 @@ def main(server_host='localhost', server_port=5000):
         logger.error("Failed to connect to server: %s", str(e))
         return
 
-    tracker = KeyTracker()
+    tracker = create_key_tracker(input_mode)
+
+    # 同时等待输入、套接字和定时器，没有输入时阻塞，不再轮询
+    selector = selectors.DefaultSelector()
+    selector.register(tracker, selectors.EVENT_READ, 'input')
+    selector.register(sock, selectors.EVENT_READ, 'server')
+    timers = TimerQueue()
+    timers.schedule(time.monotonic() + HEARTBEAT_INTERVAL,
+                    lambda: send_command(sock, "HEARTBEAT"), HEARTBEAT_INTERVAL)
 
     try:
         print("\n===== 小车控制客户端 =====")
         print("方向键 (WASD): 移动小车")
         print("HJKL: 控制摄像头方向 | B: 鸣铃 | C: 舵机回中")
-        print("I: 查看状态 | Q: 退出")
+        print("I: 查看状态 | P: 截图 | Q: 退出")
         print("连接已建立，开始控制...\n")
 
-        while True:
-            # 发送心跳
-            if time.time() % 5 < 0.1:  # 每5秒
-                send_command(sock, "HEARTBEAT")
-
-            # 处理按键
-            event = tracker.get_key_event()
-            if event == "quit":
-                break
-            elif event:
-                # 转换事件为命令
-                if event.endswith('_move'):
-                    direction = event[0].upper()
-                    cmd = f"MOVE:{'FORWARD' if direction == 'W' else 'BACKWARD' if direction == 'S' else 'LEFT' if direction == 'A' else 'RIGHT'}"
-                    send_command(sock, cmd)
-                elif event.endswith('_ang'):
-                    action = event[0].upper()
-                    print(action)
-                    cmd = f"SERVO:{'LEFT' if action == 'H' else 'DOWN' if action == 'J' else 'UP' if action == 'K' else 'RIGHT'}"
-                    send_command(sock, cmd)
-                    print('llllllllllllllllllllll')
-                elif event == "bell_ring":
-                    send_command(sock, "BELL:ON")
-                elif event == "bell_off":
-                    send_command(sock, "BELL:OFF")
-                elif event == "center_ang":
-                    send_command(sock, "SERVO:CENTER")
-                elif event == "stop":
-                    send_command(sock, "STOP")
-                elif event == "status_request":
-                    send_command(sock, "STATUS:REQUEST")
-
-            # 处理状态响应
-            if select.select([sock], [], [], 0)[0]:
-                try:
-                    data = sock.recv(1024).decode().strip()
-                    if data:
-                        if data.startswith("STATUS:"):
-                            print(f"\r{data} | 按I查看状态        ", end='')
-                        else:
-                            print(f"\r服务器响应: {data}        ", end='')
-                except:
-                    logger.error("Error receiving data from server")
+        # 未收完整的半行消息（多条消息可能在一次 recv 中到达，也可能被拆开）
+        pending = b''
+        running = True
+        while running:
+            # 计算阻塞时间：最近的定时器或按键抬起判定
+            timeout = timers.timeout(time.monotonic())
+            deadline = tracker.release_deadline()
+            if deadline is not None:
+                release_in = max(0.0, deadline - time.time())
+                timeout = release_in if timeout is None else min(timeout, release_in)
+
+            events = []
+            for key, _ in selector.select(timeout):
+                if key.data == 'input':
+                    events.extend(tracker.read_events())
+                elif key.data == 'server':
+                    # 处理状态响应
+                    try:
+                        data = sock.recv(1024)
+                    except OSError:
+                        logger.error("Error receiving data from server")
+                        running = False
+                        break
+                    if not data:
+                        logger.error("Server closed the connection")
+                        running = False
+                        break
+                    pending += data
+                    *lines, pending = pending.split(b'\n')
+                    for line in lines:
+                        handle_server_line(line.decode(errors='replace').strip())
+
+            # 按键抬起判定
+            deadline = tracker.release_deadline()
+            if deadline is not None and time.time() >= deadline:
+                events.append(tracker._check_key_release())
+
+            # 本轮的所有事件合并为一条消息发送
+            commands = []
+            for event in reduce_events(events):
+                if event == "quit":
+                    running = False
                     break
+                cmd = event_to_command(event)
+                if cmd:
+                    commands.append(cmd)
+            if commands:
+                send_commands(sock, commands)
 
-            time.sleep(0.01)
+            timers.run_due(time.monotonic())
 
     except KeyboardInterrupt:
         logger.info("Keyboard interrupt, exiting")
     finally:
+        selector.close()
         tracker.cleanup()
         sock.close()
         print("\n客户端已退出")
@@ -215,4 +641,10 @@ if __name__ == "__main__":
     else:
         port = 5000
 
-    main(host, port)
+    # 输入模式: auto / evdev / terminal
+    if len(sys.argv) > 3:
+        input_mode = sys.argv[3]
+    else:
+        input_mode = 'auto'
+
+    main(host, port, input_mode)
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+手柄按键/摇杆映射配置
+
+每种手柄一个配置表：按钮编号 -> 逻辑按钮名，轴编号 -> 摇杆字段（或扳机）。
+逻辑按钮名沿用 Switch 手柄的名字，并按 Switch 布局的位置对应：
+下方的面键总是 'b'（铃音），右方 'a'，左方 'y'，上方 'x'。
+
+连接手柄时按名字匹配配置，再按手柄实际的按钮数和轴数编译成索引数组，
+事件处理时直接用编号取下标，不再逐个比较或重复查询设备。
+"""
+
+# 摇杆字段：轴编号 -> (控制器属性名, 符号)，Y 轴取反使向上为正
+SWITCH_STICKS = {
+    0: ('left_stick_x', 1),
+    1: ('left_stick_y', -1),
+    2: ('right_stick_x', 1),
+    3: ('right_stick_y', -1),
+}
+
+PROFILES = [
+    {
+        'name': 'Switch Pro',
+        'patterns': ['pro controller', 'nintendo switch', 'combined joy-cons', 'joy-con (l/r)'],
+        'buttons': {
+            0: 'a', 1: 'b', 2: 'x', 3: 'y',
+            4: 'l', 5: 'r', 6: 'zl', 7: 'zr',
+            8: 'minus', 9: 'plus',
+            10: 'left_stick_press', 11: 'right_stick_press',
+        },
+        'sticks': SWITCH_STICKS,
+        'triggers': {},
+    },
+    {
+        # 单只 Joy-Con 横握：只有一个摇杆，SL/SR 作为肩键
+        'name': 'Joy-Con',
+        'patterns': ['joy-con', 'switch left', 'switch right'],
+        'buttons': {
+            0: 'b', 1: 'a', 2: 'y', 3: 'x',
+            4: 'minus', 6: 'plus', 7: 'left_stick_press',
+            9: 'l', 10: 'r',
+        },
+        'sticks': {
+            0: ('left_stick_x', 1),
+            1: ('left_stick_y', -1),
+        },
+        'triggers': {},
+    },
+    {
+        # Linux xpad 驱动的编号；LT/RT 是轴，静止 -1，按到底 +1
+        'name': 'Xbox',
+        'patterns': ['xbox', 'x-box', 'microsoft'],
+        'buttons': {
+            0: 'b', 1: 'a', 2: 'y', 3: 'x',
+            4: 'l', 5: 'r', 6: 'minus', 7: 'plus',
+            9: 'left_stick_press', 10: 'right_stick_press',
+        },
+        'sticks': {
+            0: ('left_stick_x', 1),
+            1: ('left_stick_y', -1),
+            3: ('right_stick_x', 1),
+            4: ('right_stick_y', -1),
+        },
+        'triggers': {2: 'zl', 5: 'zr'},
+    },
+    {
+        # Linux hid-sony / hid-playstation 驱动的编号
+        'name': 'PlayStation',
+        'patterns': ['playstation', 'dualshock', 'dualsense', 'wireless controller'],
+        'buttons': {
+            0: 'b', 1: 'a', 2: 'x', 3: 'y',
+            4: 'l', 5: 'r', 6: 'zl', 7: 'zr',
+            8: 'minus', 9: 'plus',
+            11: 'left_stick_press', 12: 'right_stick_press',
+        },
+        'sticks': {
+            0: ('left_stick_x', 1),
+            1: ('left_stick_y', -1),
+            3: ('right_stick_x', 1),
+            4: ('right_stick_y', -1),
+        },
+        'triggers': {},
+    },
+]
+
+# 名字都不匹配时使用（与原来的默认映射一致）
+DEFAULT_PROFILE = PROFILES[0]
+
+# evdev 后端：内核驱动按 Linux 游戏手柄规范上报键码，BTN_SOUTH 总是下方的面键，
+# 所以不需要按型号区分。键码名在连接时解析成数值，设备没有的键码直接跳过。
+EVDEV_BUTTONS = {
+    'BTN_SOUTH': 'b', 'BTN_EAST': 'a', 'BTN_NORTH': 'x', 'BTN_WEST': 'y',
+    'BTN_TL': 'l', 'BTN_TR': 'r', 'BTN_TL2': 'zl', 'BTN_TR2': 'zr',
+    'BTN_SELECT': 'minus', 'BTN_START': 'plus',
+    'BTN_THUMBL': 'left_stick_press', 'BTN_THUMBR': 'right_stick_press',
+    # hid-nintendo 的方向键是按键而不是 HAT 轴
+    'BTN_DPAD_UP': 'dpad_up', 'BTN_DPAD_DOWN': 'dpad_down',
+    'BTN_DPAD_LEFT': 'dpad_left', 'BTN_DPAD_RIGHT': 'dpad_right',
+}
+
+# 轴码名 -> 与 CompiledProfile.axes 相同格式的映射；Xbox 的 LT/RT 是 ABS_Z / ABS_RZ
+EVDEV_AXES = {
+    'ABS_X': ('left_stick_x', 1, None),
+    'ABS_Y': ('left_stick_y', -1, None),
+    'ABS_RX': ('right_stick_x', 1, None),
+    'ABS_RY': ('right_stick_y', -1, None),
+    'ABS_Z': (None, 0, 'zl'),
+    'ABS_RZ': (None, 0, 'zr'),
+}
+
+# 扳机轴超过该值视为按下
+TRIGGER_THRESHOLD = 0.0
+
+# 日志里显示的按钮名称
+BUTTON_LABELS = {
+    'a': 'A键', 'b': 'B键', 'x': 'X键', 'y': 'Y键',
+    'l': 'L键', 'r': 'R键', 'zl': 'ZL键', 'zr': 'ZR键',
+    'minus': '-键', 'plus': '+键',
+    'left_stick_press': '左摇杆按下', 'right_stick_press': '右摇杆按下',
+    'dpad_up': 'D-pad 上', 'dpad_down': 'D-pad 下',
+    'dpad_left': 'D-pad 左', 'dpad_right': 'D-pad 右',
+}
+
+STICK_LABELS = {
+    'left_stick_x': '左摇杆X', 'left_stick_y': '左摇杆Y',
+    'right_stick_x': '右摇杆X', 'right_stick_y': '右摇杆Y',
+}
+
+
+def match_profile(name):
+    """按手柄名字查找配置，找不到返回 None"""
+    name = name.lower()
+    for profile in PROFILES:
+        if any(pattern in name for pattern in profile['patterns']):
+            return profile
+    return None
+
+
+class CompiledProfile:
+    """
+    按手柄实际的按钮数和轴数展开的映射
+
+    buttons[i]: 按钮 i 对应的逻辑按钮名，或 None
+    axes[i]:    轴 i 对应的 (控制器属性名, 符号, None) 或扳机 (None, 0, 逻辑按钮名)，或 None
+    """
+
+    def __init__(self, profile, num_buttons, num_axes):
+        self.name = profile['name']
+        self.buttons = [None] * num_buttons
+        for index, button in profile['buttons'].items():
+            if index < num_buttons:
+                self.buttons[index] = button
+        self.axes = [None] * num_axes
+        for index, (attr, sign) in profile['sticks'].items():
+            if index < num_axes:
+                self.axes[index] = (attr, sign, None)
+        for index, button in profile['triggers'].items():
+            if index < num_axes:
+                self.axes[index] = (None, 0, button)
+
+    def button_indices(self):
+        """[(按钮编号, 逻辑按钮名), ...]，用于连接时同步一次初始状态"""
+        return [(i, b) for i, b in enumerate(self.buttons) if b is not None]
+
+    def axis_indices(self):
+        return [(i, a) for i, a in enumerate(self.axes) if a is not None]
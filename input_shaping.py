@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+摇杆输入整形
+
+在生成命令之前处理原始摇杆值：
+    - 死区 + expo 响应曲线，预先计算成查找表，运行时只做一次索引
+    - 速度按可配置步长量化
+    - 主轴选择和速度档位都带迟滞，摇杆在对角线附近或档位边界抖动时输出保持不变
+"""
+
+# 默认参数
+DEADZONE = 0.1          # 死区（摇杆满量程的比例）
+EXPO = 0.3              # expo 系数，0 为线性，1 为纯三次曲线
+SPEED_STEP = 10         # 速度量化步长（%）
+AXIS_HYSTERESIS = 0.25  # 另一轴需超过当前主轴 25% 才切换
+LEVEL_HYSTERESIS = 0.3  # 速度需越过档位边界 0.3 档才切换
+LUT_SIZE = 1024
+
+
+class ResponseCurve:
+    """
+    死区 + expo 曲线的查找表
+
+    输入 [-1, 1]，死区内输出 0，死区外重新映射到 [0, 1] 后套用
+    f(x) = (1 - expo) * x + expo * x^3，符号保持不变。
+    """
+
+    def __init__(self, deadzone=DEADZONE, expo=EXPO, size=LUT_SIZE):
+        self.deadzone = deadzone
+        self.expo = expo
+        self.scale = size - 1
+        table = []
+        for i in range(size):
+            m = i / self.scale
+            if m < deadzone:
+                table.append(0.0)
+                continue
+            x = (m - deadzone) / (1.0 - deadzone)
+            table.append((1.0 - expo) * x + expo * x * x * x)
+        self.table = table
+
+    def __call__(self, value):
+        if value >= 0:
+            if value >= 1.0:
+                return self.table[-1]
+            return self.table[int(value * self.scale + 0.5)]
+        if value <= -1.0:
+            return -self.table[-1]
+        return -self.table[int(-value * self.scale + 0.5)]
+
+
+class MoveShaper:
+    """
+    左摇杆 -> (方向, 速度)
+
+    方向由主轴决定，主轴切换带迟滞；速度按 speed_step 量化成档位，档位切换带迟滞。
+    摇杆回到死区内时返回 (None, 0)，并清除迟滞状态。
+    """
+
+    def __init__(self, deadzone=DEADZONE, expo=EXPO, speed_step=SPEED_STEP,
+                 axis_hysteresis=AXIS_HYSTERESIS, level_hysteresis=LEVEL_HYSTERESIS):
+        self.curve = ResponseCurve(deadzone, expo)
+        self.speed_step = speed_step
+        self.levels = 100 // speed_step
+        self.axis_hysteresis = axis_hysteresis
+        self.level_hysteresis = level_hysteresis
+        self.axis = None   # 'x' 或 'y'
+        self.level = 0
+
+    def shape(self, x, y):
+        """x 向右为正，y 向前为正"""
+        curve = self.curve
+        sx = curve(x)
+        sy = curve(y)
+        ax = sx if sx >= 0 else -sx
+        ay = sy if sy >= 0 else -sy
+        if ax == 0.0 and ay == 0.0:
+            self.axis = None
+            self.level = 0
+            return None, 0
+
+        # 主轴选择（迟滞）
+        if self.axis == 'y':
+            if ax > ay * (1.0 + self.axis_hysteresis):
+                self.axis = 'x'
+        elif self.axis == 'x':
+            if ay > ax * (1.0 + self.axis_hysteresis):
+                self.axis = 'y'
+        else:
+            self.axis = 'y' if ay >= ax else 'x'
+
+        # 速度档位（迟滞）
+        raw_level = max(ax, ay) * self.levels
+        if self.level == 0 or abs(raw_level - self.level) > 0.5 + self.level_hysteresis:
+            self.level = min(self.levels, max(1, int(raw_level + 0.5)))
+
+        if self.axis == 'y':
+            direction = 'FORWARD' if sy > 0 else 'BACKWARD'
+        else:
+            direction = 'RIGHT' if sx > 0 else 'LEFT'
+        return direction, self.level * self.speed_step
@@ -1,23 +1,67 @@
 #!/usr/bin/env python3
-import pygame
 import time
 import logging
 import socket
 import sys
+import os
+import select
+import threading
+from collections import namedtuple
+
+# 日志管道模块位于 server/motor 下，与服务端共用
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'server', 'motor'))
+from log_pipeline import setup_async_logging, HotLogger
+from input_shaping import MoveShaper, SPEED_STEP
+from controller_profiles import (match_profile, CompiledProfile, DEFAULT_PROFILE,
+                                 EVDEV_BUTTONS, EVDEV_AXES,
+                                 TRIGGER_THRESHOLD, BUTTON_LABELS, STICK_LABELS)
 
-# 配置日志
-logging.basicConfig(level=logging.INFO,
-                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger('PygameController')
+# 热路径日志：每个调用点每秒最多 10 条
+hot = HotLogger(logger, rate=10)
+
+# 状态未变化时重发当前状态的保活间隔（秒）
+KEEPALIVE_INTERVAL = 1.0
+# 右摇杆保持推动时摄像头命令的重复间隔（秒），与服务端舵机防抖一致
+CAMERA_REPEAT_INTERVAL = 0.2
+# 发送线程的默认频率（Hz），可用第三个命令行参数修改
+SEND_RATE = 50
+# 等待手柄事件的最长时间（秒），超时后检查一次连接状态
+INPUT_WAIT_TIMEOUT = 0.5
+# 终端状态显示的刷新间隔（秒）
+STATUS_INTERVAL = 0.1
+
+# 输入线程发布给发送线程的一帧状态（不可变）
+InputState = namedtuple('InputState', [
+    'move_cmd', 'cam_cmd', 'bell_cmd',
+    'left_x', 'left_y', 'right_x', 'right_y', 'b'])
+# 手柄断开时发布的安全状态
+IDLE_STATE = InputState('STOP', None, 'BELL:OFF', 0.0, 0.0, 0.0, 0.0, False)
+
+# pygame 只在使用 pygame 后端时导入
+pygame = None
+
+
+def load_pygame():
+    """导入 pygame（首次调用时）"""
+    global pygame
+    if pygame is None:
+        import pygame as module
+        pygame = module
+    return pygame
+
+
+class GamepadController:
+    """
+    手柄状态和命令生成（各后端共用）
+
+    后端负责查找设备和读取事件，通过 _set_axis / _set_button / _set_hat 更新状态；
+    命令生成、状态快照和显示在这里统一实现，保证不同后端输出相同的命令。
+    """
+
+    backend = None
 
-
-class PygameController:
     def __init__(self):
-        # 初始化Pygame
-        pygame.init()
-        pygame.joystick.init()
-
-        self.joystick = None
         self.connected = False
         self.left_stick_x = 0
         self.left_stick_y = 0
@@ -43,12 +87,138 @@ class PygameController:
         }
         self.last_event_time = time.time()
         self.stick_deadzone = 0.1  # 摇杆死区
-        self.clock = pygame.time.Clock()
+        # 左摇杆整形：expo 曲线查找表 + 速度量化 + 迟滞
+        self.move_shaper = MoveShaper(deadzone=self.stick_deadzone)
+
+    def close(self):
+        """断开手柄并释放后端资源"""
+        self.disconnect()
+
+    def _set_axis(self, target, raw):
+        """
+        按映射更新一个轴
+
+        target: (控制器属性名, 符号, None) 或扳机 (None, 0, 逻辑按钮名)
+        raw:    归一化到 [-1, 1] 的原始值
+        """
+        attr, sign, button = target
+        if button:
+            # 扳机轴当作按钮
+            self._set_button(button, raw > TRIGGER_THRESHOLD)
+            return
+        value = self._apply_deadzone(sign * raw)
+        setattr(self, attr, value)
+        hot.debug(attr, "%s: %.3f -> %.3f", STICK_LABELS[attr], raw, value)
+
+    def _set_button(self, button, pressed):
+        if self.buttons[button] == pressed:
+            return
+        self.buttons[button] = pressed
+        # 每个按钮单独限速，连按一个按钮不会吞掉其他按钮的日志
+        if pressed:
+            hot.info('button_down:' + button, "%s 按下", BUTTON_LABELS[button])
+        else:
+            hot.info('button_up:' + button, "%s 释放", BUTTON_LABELS[button])
+
+    def _set_hat(self, x, y):
+        """方向键状态，y 向上为正"""
+        self.buttons['dpad_left'] = (x < 0)
+        self.buttons['dpad_right'] = (x > 0)
+        self.buttons['dpad_up'] = (y > 0)
+        self.buttons['dpad_down'] = (y < 0)
+
+        # 记录方向键状态变化
+        if x < 0:
+            hot.info('dpad_left', "D-pad 左")
+        elif x > 0:
+            hot.info('dpad_right', "D-pad 右")
+        if y > 0:
+            hot.info('dpad_up', "D-pad 上")
+        elif y < 0:
+            hot.info('dpad_down', "D-pad 下")
+
+    def _apply_deadzone(self, value):
+        """应用摇杆死区"""
+        if abs(value) < self.stick_deadzone:
+            return 0.0
+        return value
+
+    def get_movement_command(self):
+        """根据左摇杆获取移动命令"""
+        # 整形后得到方向和量化速度（0-100），主轴和档位切换带迟滞
+        direction, speed = self.move_shaper.shape(self.left_stick_x, self.left_stick_y)
+        if direction is None:
+            return "STOP"
+        return f"MOVE:{direction}:{speed}"
+
+    def get_camera_command(self):
+        """根据右摇杆获取摄像头命令"""
+        commands = []
+
+        # 摄像头上下
+        if self.right_stick_y > 0.5:
+            commands.append("SERVO:UP")
+        elif self.right_stick_y < -0.5:
+            commands.append("SERVO:DOWN")
+
+        # 摄像头左右
+        if self.right_stick_x > 0.5:
+            commands.append("SERVO:RIGHT")
+        elif self.right_stick_x < -0.5:
+            commands.append("SERVO:LEFT")
+
+        if not commands:
+            return None
+
+        return ";".join(commands)  # 支持同时上下左右移动
+
+    def get_bell_command(self):
+        """根据B键获取铃音命令"""
+        if self.buttons['b']:
+            return "BELL:ON"
+        else:
+            return "BELL:OFF"
+
+    def snapshot(self):
+        """生成当前的命令和摇杆状态（只在输入线程调用，MoveShaper 的迟滞状态归输入线程所有）"""
+        return InputState(
+            self.get_movement_command(), self.get_camera_command(), self.get_bell_command(),
+            self.left_stick_x, self.left_stick_y, self.right_stick_x, self.right_stick_y,
+            bool(self.buttons['b']))
+
+    def print_status(self, state=None):
+        """打印当前状态"""
+        if state is None:
+            state = self.snapshot()
+        print(f"\r左摇杆: X={state.left_x:+.3f} Y={state.left_y:+.3f} | "
+              f"右摇杆: X={state.right_x:+.3f} Y={state.right_y:+.3f} | "
+              f"B键: {'按下' if state.b else '释放'}", end='', flush=True)
+
+
+class PygameController(GamepadController):
+    """pygame 后端，按手柄名字匹配 controller_profiles 中的编号映射"""
+
+    backend = 'pygame'
+
+    def __init__(self):
+        super().__init__()
+        load_pygame()
+        # 只初始化事件队列所需的显示子系统和手柄子系统，不初始化音频、字体等
+        pygame.display.init()
+        pygame.joystick.init()
+        # 只关心手柄相关事件，其余事件不唤醒输入循环
+        pygame.event.set_blocked(None)
+        pygame.event.set_allowed([pygame.QUIT, pygame.JOYAXISMOTION, pygame.JOYBUTTONDOWN,
+                                  pygame.JOYBUTTONUP, pygame.JOYHATMOTION,
+                                  pygame.JOYDEVICEREMOVED])
+
+        self.joystick = None
+        self.profile = None  # 连接时编译的 CompiledProfile
 
         logger.info("PygameController初始化完成")
 
     def find_switch_controller(self):
-        """查找Switch手柄设备"""
+        """查找手柄设备，按名字匹配按键映射配置"""
         logger.info("正在查找手柄...")
 
         joystick_count = pygame.joystick.get_count()
@@ -60,38 +230,31 @@ class PygameController:
         for i in range(joystick_count):
             joystick = pygame.joystick.Joystick(i)
             joystick.init()
-            name = joystick.get_name().lower()
-
-            # 常见的Switch手柄名称模式
-            switch_patterns = [
-                'pro controller',
-                'nintendo switch',
-                'joy-con',
-                'switch left',
-                'switch right'
-            ]
-
-            if any(pattern in name for pattern in switch_patterns):
-                self.joystick = joystick
-                self.connected = True
-                logger.info(f"找到Switch手柄: {joystick.get_name()}")
-                logger.info(f"轴数: {joystick.get_numaxes()}")
-                logger.info(f"按钮数: {joystick.get_numbuttons()}")
-                logger.info(f"方向键数: {joystick.get_numhats()}")
+            profile = match_profile(joystick.get_name())
+            if profile:
+                logger.info("找到%s手柄: %s", profile['name'], joystick.get_name())
+                self._attach(joystick, profile)
                 return True
-            else:
-                # 不是Switch手柄，释放它
-                joystick.quit()
-
-        # 如果没有找到Switch手柄，使用第一个手柄
-        if not self.connected and joystick_count > 0:
-            self.joystick = pygame.joystick.Joystick(0)
-            self.joystick.init()
-            self.connected = True
-            logger.info(f"使用默认手柄: {self.joystick.get_name()}")
-            return True
+            # 不是已知的手柄，释放它
+            joystick.quit()
+
+        # 如果没有找到已知手柄，使用第一个手柄和默认映射
+        joystick = pygame.joystick.Joystick(0)
+        joystick.init()
+        logger.info("使用默认手柄: %s", joystick.get_name())
+        self._attach(joystick, DEFAULT_PROFILE)
+        return True
 
-        return False
+    def _attach(self, joystick, profile):
+        """使用该手柄，并按其实际的按钮数和轴数编译映射"""
+        self.joystick = joystick
+        self.connected = True
+        self.profile = CompiledProfile(profile, joystick.get_numbuttons(), joystick.get_numaxes())
+        logger.info("按键映射: %s", self.profile.name)
+        logger.info("轴数: %d", joystick.get_numaxes())
+        logger.info("按钮数: %d", joystick.get_numbuttons())
+        logger.info("方向键数: %d", joystick.get_numhats())
+        self._sync_state()
 
     def connect(self):
         """连接手柄"""
@@ -110,14 +273,21 @@ class PygameController:
         self.connected = False
         logger.info("已断开手柄连接")
 
-    def read_events(self):
-        """读取手柄事件"""
+    def read_events(self, timeout=INPUT_WAIT_TIMEOUT):
+        """
+        等待并处理手柄事件
+
+        阻塞在 pygame.event.wait 上直到有事件或超时，再一次取出所有积压的事件。
+        状态完全由事件更新，不再逐帧轮询摇杆和按钮。
+        """
         if not self.connected or not self.joystick:
             return False
 
         try:
-            # 处理Pygame事件
-            for event in pygame.event.get():
+            event = pygame.event.wait(int(timeout * 1000))
+            if event.type == pygame.NOEVENT:
+                return True
+            for event in [event] + pygame.event.get():
                 if event.type == pygame.QUIT:
                     return False
                 elif event.type == pygame.JOYAXISMOTION:
@@ -128,255 +298,274 @@ class PygameController:
                     self._process_button_up(event)
                 elif event.type == pygame.JOYHATMOTION:
                     self._process_hat_motion(event)
-
-            # 直接读取当前状态（用于连续输入）
-            self._update_stick_positions()
-            self._update_button_states()
+                elif event.type == pygame.JOYDEVICEREMOVED:
+                    if event.instance_id == self.joystick.get_instance_id():
+                        self.connected = False
+                        return False
 
             self.last_event_time = time.time()
             return True
 
         except Exception as e:
-            logger.error(f"读取手柄事件失败: {str(e)}")
+            logger.error("读取手柄事件失败: %s", str(e))
             self.connected = False
             return False
 
+    def _sync_state(self):
+        """连接后读取一次当前摇杆和按钮状态，之后由事件增量更新"""
+        self._update_stick_positions()
+        self._update_button_states()
+
     def _update_stick_positions(self):
         """更新摇杆位置（直接读取）"""
-        if not self.joystick:
-            return
-
-        # 左摇杆 (轴0=X, 轴1=Y)
-        if self.joystick.get_numaxes() >= 2:
-            self.left_stick_x = self._apply_deadzone(self.joystick.get_axis(0))
-            # Y轴方向相反
-            self.left_stick_y = self._apply_deadzone(-self.joystick.get_axis(1))
-
-        # 右摇杆 (轴2=X, 轴3=Y) - Switch Pro Controller
-        if self.joystick.get_numaxes() >= 4:
-            self.right_stick_x = self._apply_deadzone(self.joystick.get_axis(2))
-            # Y轴方向相反
-            self.right_stick_y = self._apply_deadzone(-self.joystick.get_axis(3))
+        for axis, (attr, sign, button) in self.profile.axis_indices():
+            value = self.joystick.get_axis(axis)
+            if button:
+                self.buttons[button] = value > TRIGGER_THRESHOLD
+            else:
+                setattr(self, attr, self._apply_deadzone(sign * value))
 
     def _update_button_states(self):
         """更新按钮状态（直接读取）"""
-        if not self.joystick:
-            return
-
-        num_buttons = self.joystick.get_numbuttons()
-
-        # 根据常见Switch手柄的按钮映射
-        # 注意：不同手柄的按钮编号可能不同
-        if num_buttons >= 1:
-            # B键 (通常为按钮1)
-            if num_buttons > 1:  # 确保有足够按钮
-                self.buttons['b'] = self.joystick.get_button(1)
-
-        if num_buttons >= 4:
-            # A, X, Y键
-            self.buttons['a'] = self.joystick.get_button(0)  # A键
-            self.buttons['x'] = self.joystick.get_button(2)  # X键
-            self.buttons['y'] = self.joystick.get_button(3)  # Y键
-
-        if num_buttons >= 6:
-            # L, R键
-            self.buttons['l'] = self.joystick.get_button(4)  # L键
-            self.buttons['r'] = self.joystick.get_button(5)  # R键
-
-        if num_buttons >= 8:
-            # ZL, ZR键
-            self.buttons['zl'] = self.joystick.get_button(6)  # ZL键
-            self.buttons['zr'] = self.joystick.get_button(7)  # ZR键
-
-        # + 和 - 键 (通常为按钮9和8)
-        if num_buttons >= 10:
-            self.buttons['plus'] = self.joystick.get_button(9)  # +键
-            self.buttons['minus'] = self.joystick.get_button(8)  # -键
-
-        # 摇杆按下
-        if num_buttons >= 11:
-            self.buttons['left_stick_press'] = self.joystick.get_button(10)  # 左摇杆按下
-        if num_buttons >= 12:
-            self.buttons['right_stick_press'] = self.joystick.get_button(11)  # 右摇杆按下
+        for index, button in self.profile.button_indices():
+            self.buttons[button] = bool(self.joystick.get_button(index))
 
     def _process_axis_motion(self, event):
         """处理摇杆移动事件"""
-        if event.axis == 0:  # 左摇杆X轴
-            self.left_stick_x = self._apply_deadzone(event.value)
-            logger.debug(f"左摇杆X: {event.value:.3f} -> {self.left_stick_x:.3f}")
-        elif event.axis == 1:  # 左摇杆Y轴
-            self.left_stick_y = self._apply_deadzone(-event.value)  # Y轴方向相反
-            logger.debug(f"左摇杆Y: {event.value:.3f} -> {self.left_stick_y:.3f}")
-        elif event.axis == 2:  # 右摇杆X轴
-            self.right_stick_x = self._apply_deadzone(event.value)
-            logger.debug(f"右摇杆X: {event.value:.3f} -> {self.right_stick_x:.3f}")
-        elif event.axis == 3:  # 右摇杆Y轴
-            self.right_stick_y = self._apply_deadzone(-event.value)  # Y轴方向相反
-            logger.debug(f"右摇杆Y: {event.value:.3f} -> {self.right_stick_y:.3f}")
+        axes = self.profile.axes
+        if event.axis >= len(axes) or axes[event.axis] is None:
+            return
+        self._set_axis(axes[event.axis], event.value)
 
     def _process_button_down(self, event):
         """处理按键按下事件"""
-        button = event.button
-
-        # 根据按钮编号设置状态
-        if button == 1:  # B键
-            self.buttons['b'] = True
-            logger.info("B键 按下")
-        elif button == 0:  # A键
-            self.buttons['a'] = True
-            logger.info("A键 按下")
-        elif button == 2:  # X键
-            self.buttons['x'] = True
-            logger.info("X键 按下")
-        elif button == 3:  # Y键
-            self.buttons['y'] = True
-            logger.info("Y键 按下")
-        elif button == 4:  # L键
-            self.buttons['l'] = True
-            logger.info("L键 按下")
-        elif button == 5:  # R键
-            self.buttons['r'] = True
-            logger.info("R键 按下")
-        elif button == 6:  # ZL键
-            self.buttons['zl'] = True
-            logger.info("ZL键 按下")
-        elif button == 7:  # ZR键
-            self.buttons['zr'] = True
-            logger.info("ZR键 按下")
-        elif button == 8:  # -键
-            self.buttons['minus'] = True
-            logger.info("-键 按下")
-        elif button == 9:  # +键
-            self.buttons['plus'] = True
-            logger.info("+键 按下")
-        elif button == 10:  # 左摇杆按下
-            self.buttons['left_stick_press'] = True
-            logger.info("左摇杆按下 按下")
-        elif button == 11:  # 右摇杆按下
-            self.buttons['right_stick_press'] = True
-            logger.info("右摇杆按下 按下")
+        buttons = self.profile.buttons
+        if event.button < len(buttons) and buttons[event.button]:
+            self._set_button(buttons[event.button], True)
 
     def _process_button_up(self, event):
         """处理按键释放事件"""
-        button = event.button
-
-        if button == 1:  # B键
-            self.buttons['b'] = False
-            logger.info("B键 释放")
-        elif button == 0:  # A键
-            self.buttons['a'] = False
-            logger.info("A键 释放")
-        elif button == 2:  # X键
-            self.buttons['x'] = False
-            logger.info("X键 释放")
-        elif button == 3:  # Y键
-            self.buttons['y'] = False
-            logger.info("Y键 释放")
-        elif button == 4:  # L键
-            self.buttons['l'] = False
-            logger.info("L键 释放")
-        elif button == 5:  # R键
-            self.buttons['r'] = False
-            logger.info("R键 释放")
-        elif button == 6:  # ZL键
-            self.buttons['zl'] = False
-            logger.info("ZL键 释放")
-        elif button == 7:  # ZR键
-            self.buttons['zr'] = False
-            logger.info("ZR键 释放")
-        elif button == 8:  # -键
-            self.buttons['minus'] = False
-            logger.info("-键 释放")
-        elif button == 9:  # +键
-            self.buttons['plus'] = False
-            logger.info("+键 释放")
-        elif button == 10:  # 左摇杆按下
-            self.buttons['left_stick_press'] = False
-            logger.info("左摇杆按下 释放")
-        elif button == 11:  # 右摇杆按下
-            self.buttons['right_stick_press'] = False
-            logger.info("右摇杆按下 释放")
+        buttons = self.profile.buttons
+        if event.button < len(buttons) and buttons[event.button]:
+            self._set_button(buttons[event.button], False)
 
     def _process_hat_motion(self, event):
         """处理方向键事件"""
-        hat = event.value
+        self._set_hat(*event.value)
 
-        # 更新dpad状态
-        self.buttons['dpad_left'] = (hat[0] < 0)
-        self.buttons['dpad_right'] = (hat[0] > 0)
-        self.buttons['dpad_up'] = (hat[1] > 0)
-        self.buttons['dpad_down'] = (hat[1] < 0)
+    def close(self):
+        super().close()
+        pygame.quit()
 
-        # 记录方向键状态变化
-        if hat[0] < 0:
-            logger.info("D-pad 左")
-        elif hat[0] > 0:
-            logger.info("D-pad 右")
-        if hat[1] > 0:
-            logger.info("D-pad 上")
-        elif hat[1] < 0:
-            logger.info("D-pad 下")
 
-    def _apply_deadzone(self, value):
-        """应用摇杆死区"""
-        if abs(value) < self.stick_deadzone:
-            return 0.0
-        return value
+class EvdevController(GamepadController):
+    """
+    evdev 后端，不依赖 pygame
+
+    直接读取手柄的 EV_ABS / EV_KEY 事件（参考 proto/key_test.py）。按键和轴按
+    Linux 游戏手柄规范的键码映射（见 controller_profiles.EVDEV_BUTTONS / EVDEV_AXES），
+    连接时按设备的 absinfo 预先算好每个轴的中心和缩放。
+    需要 /dev/input 的读权限（input 组）。
+    """
+
+    backend = 'evdev'
+
+    def __init__(self, device_path=None):
+        import evdev
+
+        super().__init__()
+        self.evdev = evdev
+        self.ecodes = evdev.ecodes
+        self.device_path = device_path
+        self.device = None
+        self.key_map = {}  # 键码 -> 逻辑按钮名
+        self.abs_map = {}  # 轴码 -> (映射, 中心值, 缩放)
+        self.hat_x = 0
+        self.hat_y = 0
+
+        logger.info("EvdevController初始化完成")
+
+    def _find_gamepad(self):
+        """查找同时有摇杆轴和 BTN_SOUTH 的输入设备"""
+        evdev = self.evdev
+        ecodes = self.ecodes
+        if self.device_path:
+            return evdev.InputDevice(self.device_path)
+        for path in evdev.list_devices():
+            try:
+                device = evdev.InputDevice(path)
+            except OSError:
+                continue  # 没有读权限的设备
+            caps = device.capabilities(absinfo=False)
+            if (ecodes.BTN_SOUTH in caps.get(ecodes.EV_KEY, [])
+                    and ecodes.ABS_X in caps.get(ecodes.EV_ABS, [])):
+                return device
+            device.close()
+        return None
+
+    def _attach(self, device):
+        """使用该设备，并按其实际的按键和轴编译映射"""
+        ecodes = self.ecodes
+        caps = device.capabilities(absinfo=False)
+        keys = set(caps.get(ecodes.EV_KEY, []))
+        axes = set(caps.get(ecodes.EV_ABS, []))
+
+        self.key_map = {}
+        for name, button in EVDEV_BUTTONS.items():
+            code = getattr(ecodes, name, None)
+            if code in keys:
+                self.key_map[code] = button
+
+        self.abs_map = {}
+        for name, target in EVDEV_AXES.items():
+            code = getattr(ecodes, name, None)
+            if code not in axes:
+                continue
+            info = device.absinfo(code)
+            half = (info.max - info.min) / 2.0 or 1.0
+            self.abs_map[code] = (target, info.min + half, 1.0 / half)
+
+        self.device = device
+        self.connected = True
+        logger.info("找到手柄: %s (%s)", device.name, device.path)
+        logger.info("轴数: %d", len(self.abs_map))
+        logger.info("按钮数: %d", len(self.key_map))
+        self._sync_state()
 
-    def get_movement_command(self):
-        """根据左摇杆获取移动命令"""
-        if abs(self.left_stick_x) < 0.1 and abs(self.left_stick_y) < 0.1:
-            return "STOP"
+    def connect(self):
+        """连接手柄"""
+        if self.connected:
+            return True
 
-        # 计算速度（0-100）
-        speed = int(min(max(abs(self.left_stick_x), abs(self.left_stick_y)) * 100, 100))
-        if abs(self.left_stick_y) > abs(self.left_stick_x):
-            # 主要Y轴控制（前进/后退）
-            if self.left_stick_y > 0:
-                return f"MOVE:FORWARD:{speed}"
-            else:
-                return f"MOVE:BACKWARD:{speed}"
-        else:
-            print(self.left_stick_x, self.left_stick_y)
-            # 主要X轴控制（转向）
-            if self.left_stick_x > 0:
-                return f"MOVE:RIGHT:{speed}"
-            else:
-                return f"MOVE:LEFT:{speed}"
+        logger.info("正在查找手柄...")
+        try:
+            device = self._find_gamepad()
+        except OSError as e:
+            logger.error("打开手柄设备失败: %s", str(e))
+            return False
+        if device is None:
+            logger.error("未找到任何游戏手柄")
+            return False
 
-    def get_camera_command(self):
-        """根据右摇杆获取摄像头命令"""
-        commands = []
+        self._attach(device)
+        logger.info("成功连接到手柄")
+        return True
 
-        # 摄像头上下
-        if self.right_stick_y > 0.5:
-            commands.append("SERVO:UP")
-        elif self.right_stick_y < -0.5:
-            commands.append("SERVO:DOWN")
+    def disconnect(self):
+        """断开连接"""
+        if self.device:
+            try:
+                self.device.close()
+            except OSError:
+                pass
+            self.device = None
+        self.connected = False
+        logger.info("已断开手柄连接")
 
-        # 摄像头左右
-        if self.right_stick_x > 0.5:
-            commands.append("SERVO:RIGHT")
-        elif self.right_stick_x < -0.5:
-            commands.append("SERVO:LEFT")
+    def read_events(self, timeout=INPUT_WAIT_TIMEOUT):
+        """
+        等待并处理手柄事件
 
-        if not commands:
-            return None
+        阻塞在设备文件上直到有事件或超时，再一次读出所有积压的事件。
+        """
+        if not self.connected or not self.device:
+            return False
 
-        return ";".join(commands)  # 支持同时上下左右移动
+        try:
+            readable, _, _ = select.select([self.device.fd], [], [], timeout)
+            if not readable:
+                return True
+            for event in self.device.read():
+                self._process_event(event)
+        except BlockingIOError:
+            return True
+        except OSError as e:
+            # 设备被拔出或蓝牙断开
+            logger.error("读取手柄事件失败: %s", str(e))
+            self.connected = False
+            return False
 
-    def get_bell_command(self):
-        """根据B键获取铃音命令"""
-        if self.buttons['b']:
-            return "BELL:ON"
+        self.last_event_time = time.time()
+        return True
+
+    def _process_event(self, event):
+        ecodes = self.ecodes
+        if event.type == ecodes.EV_ABS:
+            entry = self.abs_map.get(event.code)
+            if entry:
+                target, center, scale = entry
+                self._set_axis(target, (event.value - center) * scale)
+            elif event.code == ecodes.ABS_HAT0X:
+                self.hat_x = event.value
+                self._set_hat(self.hat_x, -self.hat_y)
+            elif event.code == ecodes.ABS_HAT0Y:
+                # evdev 的 HAT0Y 向上为负
+                self.hat_y = event.value
+                self._set_hat(self.hat_x, -self.hat_y)
+        elif event.type == ecodes.EV_KEY:
+            button = self.key_map.get(event.code)
+            if button and event.value != 2:  # 忽略自动重复
+                self._set_button(button, event.value == 1)
+        elif event.type == ecodes.EV_SYN and event.code == ecodes.SYN_DROPPED:
+            # 内核缓冲区溢出丢了事件，直接重新读取完整状态
+            hot.warning('syn_dropped', "手柄事件丢失，重新同步状态")
+            self._sync_state()
+
+    def _sync_state(self):
+        """读取一次当前按键和轴状态，之后由事件增量更新"""
+        ecodes = self.ecodes
+        active = set(self.device.active_keys())
+        for code, button in self.key_map.items():
+            self.buttons[button] = code in active
+        for code, (target, center, scale) in self.abs_map.items():
+            self._set_axis(target, (self.device.absinfo(code).value - center) * scale)
+        caps = self.device.capabilities(absinfo=False).get(ecodes.EV_ABS, [])
+        if ecodes.ABS_HAT0X in caps and ecodes.ABS_HAT0Y in caps:
+            self.hat_x = self.device.absinfo(ecodes.ABS_HAT0X).value
+            self.hat_y = self.device.absinfo(ecodes.ABS_HAT0Y).value
+            self._set_hat(self.hat_x, -self.hat_y)
+
+
+def create_controller(backend='auto'):
+    """
+    创建手柄后端
+
+    backend: 'evdev' 或 'pygame' 强制使用对应后端；
+             'auto' 优先 evdev（启动快、内存小），evdev 不可用或找不到手柄时使用 pygame
+    """
+    if backend in ('auto', 'evdev'):
+        try:
+            controller = EvdevController()
+        except ImportError as e:
+            if backend == 'evdev':
+                raise
+            logger.info("evdev 不可用 (%s)，使用 pygame", e)
         else:
-            return "BELL:OFF"
+            if backend == 'evdev' or controller.connect():
+                return controller
+            logger.info("evdev 未找到手柄，使用 pygame")
+    return PygameController()
 
-    def print_status(self):
-        """打印当前状态"""
-        print(f"\r左摇杆: X={self.left_stick_x:+.3f} Y={self.left_stick_y:+.3f} | "
-              f"右摇杆: X={self.right_stick_x:+.3f} Y={self.right_stick_y:+.3f} | "
-              f"B键: {'按下' if self.buttons['b'] else '释放'}", end='', flush=True)
+
+class LatestState:
+    """
+    单槽最新状态
+
+    输入线程整体替换一个不可变的 InputState，发送线程只读取引用。
+    属性赋值在 CPython 中是原子的，读写双方都不需要加锁；发送线程只关心最新一帧，
+    中间被覆盖的帧直接丢弃。
+    """
+
+    def __init__(self, state=IDLE_STATE):
+        self.state = state
+        self.version = 0  # 只由写入方递增
+
+    def publish(self, state):
+        self.state = state
+        self.version += 1
+
+    def read(self):
+        return self.state
 
 
 def send_command(sock, command):
@@ -390,13 +579,157 @@ def send_command(sock, command):
         return False
 
 
-def main(server_host='localhost', server_port=5000):
+class CommandSender:
+    """
+    增量发送：只在命令状态变化时发送
+
+    移动和铃音是状态量，变化时发送一次，之后每 KEEPALIVE_INTERVAL 重发一次当前状态；
+    摄像头是动作量，右摇杆保持推动时每 CAMERA_REPEAT_INTERVAL 发送一次。
+    同一帧的命令用 ';' 拼成一行批量命令，服务端整批一次应用；编码结果缓存复用。
+    """
+
+    def __init__(self, sock, keepalive=KEEPALIVE_INTERVAL, camera_repeat=CAMERA_REPEAT_INTERVAL):
+        self.sock = sock
+        self.keepalive = keepalive
+        self.camera_repeat = camera_repeat
+        self.last_move = None
+        self.last_bell = None
+        self.last_camera = None
+        self.last_camera_time = 0.0
+        self.last_send_time = 0.0
+        self.sent_messages = 0
+        # 预先编码所有可能的命令
+        self.encoded = {}
+        for direction in ('FORWARD', 'BACKWARD', 'LEFT', 'RIGHT'):
+            for speed in range(SPEED_STEP, 101, SPEED_STEP):
+                self.encode(f"MOVE:{direction}:{speed}")
+        for cmd in ('STOP', 'BELL:ON', 'BELL:OFF'):
+            self.encode(cmd)
+
+    def encode(self, cmd):
+        data = self.encoded.get(cmd)
+        if data is None:
+            data = self.encoded[cmd] = (cmd + "\n").encode()
+        return data
+
+    def update(self, move_cmd, cam_cmd, bell_cmd, now=None):
+        """提交本帧的命令，有需要发送的内容时发送，返回是否发送"""
+        if now is None:
+            now = time.monotonic()
+        parts = []
+        keepalive = now - self.last_send_time >= self.keepalive
+
+        if move_cmd and (move_cmd != self.last_move or keepalive):
+            parts.append(move_cmd)
+            self.last_move = move_cmd
+        if bell_cmd and (bell_cmd != self.last_bell or keepalive):
+            parts.append(bell_cmd)
+            self.last_bell = bell_cmd
+        if cam_cmd and (cam_cmd != self.last_camera
+                        or now - self.last_camera_time >= self.camera_repeat):
+            parts.append(cam_cmd)
+            self.last_camera_time = now
+        self.last_camera = cam_cmd
+
+        if not parts:
+            return False
+        data = self.encode(";".join(parts))
+        try:
+            self.sock.sendall(data)
+        except Exception as e:
+            # 断线时每个发送周期都会失败，限速输出
+            hot.error('send_failed', "Failed to send command: %s", str(e))
+            return False
+        self.last_send_time = now
+        self.sent_messages += 1
+        hot.debug('send', "Sent: %s", data)
+        return True
+
+
+class SenderThread(threading.Thread):
+    """
+    固定频率的发送线程
+
+    每个周期读取一次最新状态交给 CommandSender（离线时只记录日志），
+    终端状态显示也在这里按 STATUS_INTERVAL 刷新，不占用输入路径。
+    """
+
+    def __init__(self, slot, sender, controller, rate=SEND_RATE):
+        super().__init__(name='joystick-sender', daemon=True)
+        self.slot = slot
+        self.sender = sender
+        self.controller = controller
+        self.rate = rate
+        self.period = 1.0 / rate
+        self.stop_event = threading.Event()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def limit_rate(self, limit):
+        """服务端要求的频率上限（RATE:<Hz>，0 为不限制），不高于命令行设置的频率"""
+        rate = min(self.rate, limit) if limit > 0 else self.rate
+        self.period = 1.0 / rate
+        logger.info("发送频率: %.0f Hz", rate)
+
+    def run(self):
+        next_tick = time.monotonic()
+        last_print_time = 0.0
+        while not self.stop_event.is_set():
+            state = self.slot.read()
+            now = time.monotonic()
+            if self.sender:
+                self.sender.update(state.move_cmd, state.cam_cmd, state.bell_cmd, now)
+            else:
+                # 离线模式，仅显示
+                hot.debug('move_cmd', "移动命令: %s", state.move_cmd)
+                if state.cam_cmd:
+                    hot.debug('cam_cmd', "摄像头命令: %s", state.cam_cmd)
+                hot.debug('bell_cmd', "铃音命令: %s", state.bell_cmd)
+
+            if now - last_print_time >= STATUS_INTERVAL:
+                self.controller.print_status(state)
+                last_print_time = now
+
+            # 按绝对时间推进，不累积漂移；落后太多时从当前时间重新开始
+            next_tick += self.period
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                self.stop_event.wait(delay)
+            else:
+                next_tick = time.monotonic()
+
+
+def read_server(sock, sender_thread):
+    """接收服务端的消息：温控时服务端用 RATE:<Hz> 限制发送频率，其余消息忽略"""
+    pending = b''
+    while True:
+        try:
+            data = sock.recv(1024)
+        except OSError:
+            return
+        if not data:
+            return
+        pending += data
+        *lines, pending = pending.split(b'\n')
+        for line in lines:
+            if line.startswith(b'RATE:'):
+                try:
+                    sender_thread.limit_rate(float(line[5:]))
+                except ValueError:
+                    logger.warning("无法识别的频率限制: %s", line)
+
+
+def main(server_host='localhost', server_port=5000, send_rate=SEND_RATE, backend='auto'):
     """主函数"""
-    controller = PygameController()
+    # 配置日志（队列 + 后台线程写出，CAR_LOG_LEVEL 控制级别）
+    setup_async_logging()
+    controller = create_controller(backend)
 
     # 创建TCP连接
     sock = None
-    connected_to_server = False
+    sender = None
+    sender_thread = None
 
     try:
         # 连接手柄
@@ -408,13 +741,14 @@ def main(server_host='localhost', server_port=5000):
         try:
             sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             sock.connect((server_host, server_port))
-            connected_to_server = True
-            logger.info(f"成功连接到小车服务端 {server_host}:{server_port}")
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sender = CommandSender(sock)
+            logger.info("成功连接到小车服务端 %s:%d", server_host, server_port)
         except Exception as e:
-            logger.warning(f"无法连接到小车服务端: {str(e)}")
+            logger.warning("无法连接到小车服务端: %s", str(e))
             logger.info("将以离线模式运行，仅显示手柄输入")
 
-        print("\nSwitch手柄测试程序 (Pygame版本)")
+        print(f"\nSwitch手柄测试程序 ({controller.backend}后端)")
         print("功能映射:")
         print("  - 左摇杆: 小车移动")
         print("  - 右摇杆: 摄像头方向")
@@ -422,59 +756,37 @@ def main(server_host='localhost', server_port=5000):
         print("  - Ctrl+C: 退出")
         print("\n正在读取手柄输入...\n")
 
-        last_print_time = time.time()
+        # 主线程阻塞等待手柄事件并发布最新状态，发送线程按固定频率读取
+        slot = LatestState()
+        sender_thread = SenderThread(slot, sender, controller, send_rate)
+        sender_thread.start()
+        if sock:
+            threading.Thread(target=read_server, args=(sock, sender_thread),
+                             name='joystick-server', daemon=True).start()
 
         while True:
-            # 读取手柄事件
-            if not controller.read_events():
-                logger.warning("手柄连接中断，尝试重新连接...")
-                time.sleep(1)
-                controller.disconnect()
-                if not controller.connect():
-                    continue
-
-            # 打印状态（每秒一次）
-            current_time = time.time()
-            if current_time - last_print_time > 0.1:  # 每100ms更新一次
-                controller.print_status()
-                last_print_time = current_time
-
-            # 获取控制命令
-            move_cmd = controller.get_movement_command()
-            cam_cmd = controller.get_camera_command()
-            bell_cmd = controller.get_bell_command()
-
-            # 发送命令到小车服务端
-            if connected_to_server:
-                if move_cmd:
-                    send_command(sock, move_cmd)
-
-                if cam_cmd:
-                    send_command(sock, cam_cmd)
-
-                if bell_cmd:
-                    send_command(sock, bell_cmd)
-            else:
-                # 离线模式，仅显示
-                if move_cmd:
-                    logger.debug(f"移动命令: {move_cmd}")
-                if cam_cmd:
-                    logger.debug(f"摄像头命令: {cam_cmd}")
-                if bell_cmd:
-                    logger.debug(f"铃音命令: {bell_cmd}")
+            if controller.read_events():
+                slot.publish(controller.snapshot())
+                continue
 
-            # 限制帧率
-            controller.clock.tick(60)
+            # 手柄断开期间发送停止状态
+            slot.publish(IDLE_STATE)
+            logger.warning("手柄连接中断，尝试重新连接...")
+            time.sleep(1)
+            controller.disconnect()
+            controller.connect()
 
     except KeyboardInterrupt:
         logger.info("用户中断程序")
     except Exception as e:
-        logger.exception(f"程序异常: {str(e)}")
+        logger.exception("程序异常: %s", str(e))
     finally:
-        controller.disconnect()
+        if sender_thread:
+            sender_thread.stop()
+            sender_thread.join()
+        controller.close()
         if sock:
             sock.close()
-        pygame.quit()
         print("\n程序结束")
 
 
@@ -489,4 +801,15 @@ if __name__ == "__main__":
     else:
         port = 5000
 
-    main(host, port)
\ No newline at end of file
+    if len(sys.argv) > 3:
+        send_rate = float(sys.argv[3])
+    else:
+        send_rate = SEND_RATE
+
+    # 手柄后端: auto / evdev / pygame
+    if len(sys.argv) > 4:
+        backend = sys.argv[4]
+    else:
+        backend = 'auto'
+
+    main(host, port, send_rate, backend)
\ No newline at end of file
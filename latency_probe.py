@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+视频延迟测量（接收端）
+
+推流端用 stream_supervisor.py --stamp-latency 在每帧前插入服务端时间戳 SEI。
+本工具接收视频流，对每一帧记录：
+    - 到达延迟：SEI 到达本机的时刻 - 服务端读出该帧的时刻
+    - 解码延迟：ffmpeg 解码输出该帧的时刻 - 服务端读出该帧的时刻
+两台机器的时钟差通过控制连接的 TIME:REQUEST 估计（取往返时间最短的一次）；
+本机测试时不指定 --control，时钟差为 0。
+
+时间戳在服务端读出编码器输出时打上，不包含摄像头曝光和编码器内部的延迟。
+
+输入:
+    tcp://HOST:PORT      连接 relay 模式的小车
+    listen://HOST:PORT   等待 tcp 模式的小车连入（替代 nc -l）
+    其他                 交给 ffmpeg 转封装，例如 udp://、srt://、rtmp://、.sdp 文件
+
+用法（本机完整测试，无需摄像头）:
+    python3 server/stream_supervisor.py relay 127.0.0.1:33064 --source test --stamp-latency
+    python3 latency_probe.py tcp://127.0.0.1:33064 --duration 20 --json relay.json
+
+    # 对比不同的解码参数（-probesize 32 -analyzeduration 0 可缩短 ffmpeg 启动时的分析）
+    python3 latency_probe.py tcp://127.0.0.1:33064 --decoder-flags "-fflags nobuffer -flags low_delay"
+    python3 latency_probe.py stream.sdp --input-flags "-probesize 32 -analyzeduration 0"
+"""
+import os
+import sys
+import json
+import time
+import shlex
+import socket
+import platform
+import argparse
+import threading
+import subprocess
+from collections import deque
+
+# 推流端模块位于 server 下
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'server'))
+os.environ.setdefault('CAR_LOG_LEVEL', 'WARNING')
+from nal_relay import NalSplitter
+from latency_sei import parse_sei, is_frame_start, NAL_SEI
+
+CHUNK_SIZE = 65536
+SYNC_SAMPLES = 16
+# 开始的几秒不计入统计：ffmpeg 默认最多分析 5 秒输入才开始输出，relay 新观看端也会先收到缓存的 GOP
+WARMUP = 5.0
+DECODE_SIZE = 16       # 解码输出缩放成 16x16 灰度图，只用来确定每帧解码完成的时刻
+DECODE_FRAME_BYTES = DECODE_SIZE * DECODE_SIZE
+
+
+def sync_clock(address, samples=SYNC_SAMPLES):
+    """
+    通过控制连接估计时钟差（服务端时间 - 本机时间，纳秒）
+
+    返回 (时钟差, 最短往返时间)
+    """
+    best = None
+    with socket.create_connection(address, timeout=5) as sock:
+        reader = sock.makefile('rb')
+        for _ in range(samples):
+            t0 = time.time_ns()
+            sock.sendall(b"TIME:REQUEST\n")
+            while True:
+                line = reader.readline()
+                if not line:
+                    raise ConnectionError("控制连接已关闭")
+                if line.startswith(b"TIME:"):
+                    break
+            t1 = time.time_ns()
+            server = int(line[5:])
+            rtt = t1 - t0
+            if best is None or rtt < best[1]:
+                best = (server - (t0 + t1) // 2, rtt)
+            time.sleep(0.05)
+    return best
+
+
+def open_input(url, input_flags):
+    """返回 (读取函数, 关闭函数)"""
+    if url.startswith('tcp://') or url.startswith('listen://'):
+        scheme, _, rest = url.partition('://')
+        host, _, port = rest.rpartition(':')
+        if scheme == 'tcp':
+            sock = socket.create_connection((host, int(port)), timeout=10)
+        else:
+            server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            server.bind((host, int(port)))
+            server.listen(1)
+            print(f"等待连接 {host}:{port} ...", flush=True)
+            sock, _ = server.accept()
+            server.close()
+        sock.settimeout(10)
+        return (lambda: sock.recv(CHUNK_SIZE)), sock.close
+
+    cmd = ['ffmpeg', '-hide_banner', '-loglevel', 'error']
+    if url.endswith('.sdp'):
+        cmd += ['-protocol_whitelist', 'file,udp,rtp']
+    cmd += input_flags + ['-i', url, '-an', '-c:v', 'copy', '-f', 'h264', '-flush_packets', '1', '-']
+    proc = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, bufsize=0)
+    fd = proc.stdout.fileno()
+
+    def close():
+        proc.terminate()
+        proc.wait()
+    return (lambda: os.read(fd, CHUNK_SIZE)), close
+
+
+class LatencyProbe:
+    """
+    解析时间戳 SEI，并把码流送入 ffmpeg 解码，按顺序把解码输出的帧对应到 SEI
+
+    offset_ns: 服务端时间 - 本机时间
+    """
+
+    def __init__(self, offset_ns=0, decoder_flags=(), warmup=WARMUP):
+        self.offset_ns = offset_ns
+        self.warmup = warmup
+        self.splitter = NalSplitter()
+        self.sei = None            # 正在接收的 SEI（可能跨两次读取）
+        self.sei_arrival = 0
+        self.stamp = None          # 已解析、等待本帧第一个 slice 的时间戳
+        self.seen_idr = False
+        self.awaiting = deque()    # 已送入解码器、尚未解码输出的帧
+        self.frames = []           # 每帧 (序号, 到达延迟 ms, 解码延迟 ms)
+        self.started = time.monotonic()
+
+        cmd = (['ffmpeg', '-hide_banner', '-loglevel', 'error'] + list(decoder_flags) +
+               ['-f', 'h264', '-i', 'pipe:0', '-vsync', '0',
+                '-vf', f'scale={DECODE_SIZE}:{DECODE_SIZE}', '-pix_fmt', 'gray',
+                '-f', 'rawvideo', 'pipe:1'])
+        self.decoder = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, bufsize=0)
+        self.decode_thread = threading.Thread(target=self._read_decoded, daemon=True)
+        self.decode_thread.start()
+
+    def feed(self, chunk):
+        now = time.time_ns()
+        for piece, nal_type in self.splitter.feed(chunk):
+            if nal_type is None:
+                if self.sei is not None:
+                    self.sei += piece
+                continue
+            self._finish_sei()
+            if nal_type == NAL_SEI:
+                self.sei = bytes(piece)
+                self.sei_arrival = now
+            elif is_frame_start(piece, nal_type):
+                self._start_frame(nal_type)
+        self.decoder.stdin.write(chunk)
+
+    def _finish_sei(self):
+        if self.sei is None:
+            return
+        offset = 4 if self.sei[2] == 0 else 3
+        stamp = parse_sei(self.sei[offset:])
+        if stamp is not None:
+            self.stamp = (stamp[0], stamp[1], self.sei_arrival)
+        self.sei = None
+
+    def _start_frame(self, nal_type):
+        # 解码器从第一个 IDR 开始输出，之前的帧不参与对应；
+        # 没有时间戳的帧（例如 relay 丢帧后从 IDR 重新开始时）也占一个位置，保持顺序对应
+        if nal_type == 'idr':
+            self.seen_idr = True
+        if self.seen_idr:
+            self.awaiting.append(self.stamp)
+        self.stamp = None
+
+    def _read_decoded(self):
+        fd = self.decoder.stdout.fileno()
+        buffered = 0
+        while True:
+            data = os.read(fd, CHUNK_SIZE)
+            if not data:
+                break
+            now = time.time_ns()
+            buffered += len(data)
+            while buffered >= DECODE_FRAME_BYTES:
+                buffered -= DECODE_FRAME_BYTES
+                if not self.awaiting:
+                    continue
+                stamp = self.awaiting.popleft()
+                if stamp is None or time.monotonic() - self.started < self.warmup:
+                    continue
+                server_ns, seq, arrival_ns = stamp
+                local_to_server = self.offset_ns - server_ns
+                self.frames.append((seq, (arrival_ns + local_to_server) / 1e6,
+                                    (now + local_to_server) / 1e6))
+
+    def close(self):
+        try:
+            self.decoder.stdin.close()
+        except OSError:
+            pass
+        self.decoder.wait()
+        self.decode_thread.join()
+
+
+def percentile(sorted_values, q):
+    index = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(values):
+    values = sorted(values)
+    return {
+        'count': len(values),
+        'min_ms': values[0],
+        'p50_ms': percentile(values, 0.5),
+        'p90_ms': percentile(values, 0.9),
+        'p99_ms': percentile(values, 0.99),
+        'max_ms': values[-1],
+        'mean_ms': sum(values) / len(values),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="视频延迟测量（接收端）")
+    parser.add_argument('input', help="tcp://HOST:PORT、listen://HOST:PORT，或 ffmpeg 能打开的 URL / SDP 文件")
+    parser.add_argument('--control', metavar='HOST:PORT', help="控制服务端地址，用于对时（本机测试可省略）")
+    parser.add_argument('--duration', type=float, default=20.0, help="测量时长（秒）")
+    parser.add_argument('--warmup', type=float, default=WARMUP, help="开始的几秒不计入统计")
+    parser.add_argument('--input-flags', default='', help="转封装 ffmpeg 的输入参数，如 \"-fflags nobuffer\"")
+    parser.add_argument('--decoder-flags', default='', help="解码 ffmpeg 的输入参数，如 \"-flags low_delay\"")
+    parser.add_argument('--label', default='', help="结果标签（写入 JSON）")
+    parser.add_argument('--json', metavar='PATH', help="把统计结果写入 JSON")
+    parser.add_argument('--csv', metavar='PATH', help="把每帧的延迟写入 CSV")
+    args = parser.parse_args()
+
+    offset_ns, rtt_ns = 0, None
+    if args.control:
+        host, _, port = args.control.rpartition(':')
+        offset_ns, rtt_ns = sync_clock((host, int(port)))
+        print(f"时钟差 {offset_ns / 1e6:+.2f}ms（往返 {rtt_ns / 1e6:.2f}ms）")
+
+    read, close_input = open_input(args.input, shlex.split(args.input_flags))
+    probe = LatencyProbe(offset_ns, shlex.split(args.decoder_flags), args.warmup)
+    deadline = time.monotonic() + args.duration
+    try:
+        while time.monotonic() < deadline:
+            chunk = read()
+            if not chunk:
+                print("输入已结束")
+                break
+            probe.feed(chunk)
+    except (OSError, KeyboardInterrupt) as e:
+        print(f"停止: {e or '中断'}")
+    close_input()
+    probe.close()
+
+    if not probe.frames:
+        print("没有测到带时间戳的帧（推流端需要 --stamp-latency）")
+        return 1
+
+    arrival = summarize([f[1] for f in probe.frames])
+    decode = summarize([f[2] for f in probe.frames])
+    print(f"{'阶段':8s} {'帧数':>6s} {'最小':>8s} {'中位数':>8s} {'P90':>8s} {'P99':>8s} {'最大':>8s}")
+    for name, s in (('到达', arrival), ('解码', decode)):
+        print(f"{name:8s} {s['count']:6d} {s['min_ms']:7.1f}ms {s['p50_ms']:7.1f}ms "
+              f"{s['p90_ms']:7.1f}ms {s['p99_ms']:7.1f}ms {s['max_ms']:7.1f}ms")
+
+    if args.csv:
+        with open(args.csv, 'w') as f:
+            f.write("seq,arrival_ms,decode_ms\n")
+            for seq, a, d in probe.frames:
+                f.write(f"{seq},{a:.3f},{d:.3f}\n")
+    if args.json:
+        report = {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'label': args.label,
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'input': args.input,
+            'input_flags': args.input_flags,
+            'decoder_flags': args.decoder_flags,
+            'clock_offset_ms': offset_ns / 1e6,
+            'clock_rtt_ms': rtt_ns / 1e6 if rtt_ns is not None else None,
+            'arrival': arrival,
+            'decode': decode,
+        }
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
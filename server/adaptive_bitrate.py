@@ -0,0 +1,151 @@
+#!/usr/bin/python3
+"""
+推流自适应码率
+
+每秒采样一次 StreamSupervisor 的输出端：
+    - 发送队列积压（queue_bytes），按当前档位码率折算成秒
+    - 送达率：这一秒实际送出的字节（写入量减去积压增量）/ 编码器产生的字节
+
+积压或送达率持续变差时沿 stream_supervisor.PROFILES 降一档（先降码率，再降帧率，
+最后降分辨率）；持续良好一段时间后试探升一档，升档后很快又降档时加倍下次升档的等待时间，
+避免在两档之间来回振荡。
+
+本机测试（link_emulator.py 模拟带宽变化的链路）:
+    python3 link_emulator.py --listen 127.0.0.1:6000 --schedule 3000:20,400:30,3000:60
+    python3 stream_supervisor.py tcp 127.0.0.1:6000 --source test --profile medium --adaptive
+"""
+import os
+import sys
+import time
+import logging
+import threading
+
+logger = logging.getLogger('AdaptiveBitrate')
+
+SAMPLE_INTERVAL = 1.0   # 采样间隔（秒）
+DOWN_QUEUE = 0.25       # 积压超过 0.25 秒的数据视为拥塞
+UP_QUEUE = 0.05         # 积压低于 0.05 秒视为空闲
+DOWN_DELIVERY = 0.7     # 送达率低于 70% 视为拥塞
+DOWN_SAMPLES = 2        # 连续几次拥塞才降档
+UP_HOLD = 10.0          # 持续空闲多久才试探升档（秒）
+UP_HOLD_MAX = 120.0
+COOLDOWN = 3.0          # 切换档位后忽略的时间（编码器重启期间的采样不可靠）
+
+
+class AbrPolicy:
+    """
+    升降档决策，只依赖输入的采样值，便于用合成数据验证
+
+    update() 返回 -1（降档）、+1（升档）或 0。
+    """
+
+    def __init__(self, down_queue=DOWN_QUEUE, up_queue=UP_QUEUE, down_delivery=DOWN_DELIVERY,
+                 down_samples=DOWN_SAMPLES, up_hold=UP_HOLD, up_hold_max=UP_HOLD_MAX,
+                 cooldown=COOLDOWN):
+        self.down_queue = down_queue
+        self.up_queue = up_queue
+        self.down_delivery = down_delivery
+        self.down_samples = down_samples
+        self.initial_up_hold = up_hold
+        self.up_hold = up_hold
+        self.up_hold_max = up_hold_max
+        self.cooldown = cooldown
+        self.bad = 0
+        self.good_since = None
+        self.last_up = None
+        self.cooldown_until = 0.0
+
+    def update(self, queue_s, delivery, now):
+        if now < self.cooldown_until:
+            return 0
+
+        if queue_s > self.down_queue or delivery < self.down_delivery:
+            self.good_since = None
+            self.bad += 1
+            if self.bad < self.down_samples:
+                return 0
+            if self.last_up is not None and now - self.last_up < self.up_hold:
+                # 刚升档就拥塞：这一档撑不住，下次多等一倍时间再试
+                self.up_hold = min(self.up_hold_max, self.up_hold * 2)
+            self.last_up = None
+            self._switched(now)
+            return -1
+
+        self.bad = 0
+        if self.last_up is not None and now - self.last_up >= self.up_hold:
+            # 升档后稳定运行，恢复初始等待时间
+            self.up_hold = self.initial_up_hold
+            self.last_up = None
+        if queue_s >= self.up_queue:
+            self.good_since = None
+            return 0
+        if self.good_since is None:
+            self.good_since = now
+        if now - self.good_since < self.up_hold:
+            return 0
+        self.last_up = now
+        self._switched(now)
+        return 1
+
+    def _switched(self, now):
+        self.bad = 0
+        self.good_since = None
+        self.cooldown_until = now + self.cooldown
+
+
+class AdaptiveBitrate:
+    """按 AbrPolicy 的决策调整 StreamSupervisor 的画质档位，采样结果写入 supervisor.stats['abr']"""
+
+    def __init__(self, supervisor, policy=None, interval=SAMPLE_INTERVAL):
+        self.supervisor = supervisor
+        self.policy = policy or AbrPolicy()
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name='adaptive-bitrate', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+
+    def run(self):
+        sup = self.supervisor
+        prev = None
+        while not self.stop_event.wait(self.interval):
+            if sup.stats['state'] != 'running':
+                prev = None
+                continue
+            now = time.monotonic()
+            sample = (now, sup.bytes_in, sup.bytes_out, sup.queue_bytes())
+            if prev is None:
+                prev = sample
+                continue
+            dt = now - prev[0]
+            produced = sample[1] - prev[1]
+            # 送出的字节中，积压增加的部分还没有真正送达
+            delivered = max(0, (sample[2] - prev[2]) - (sample[3] - prev[3]))
+            prev = sample
+
+            if produced > 0:
+                delivery = delivered / produced
+            else:
+                # 读取线程阻塞在写输出上时编码器数据也停了，有积压说明链路不通
+                delivery = 0.0 if sample[3] else 1.0
+            queue_s = sample[3] * 8 / sup.profile.bitrate
+            sup.stats['abr'] = {
+                'queue_bytes': sample[3],
+                'queue_s': round(queue_s, 3),
+                'delivery': round(delivery, 3),
+                'throughput_kbps': round(delivered * 8 / 1000 / dt, 1),
+                'up_hold_s': self.policy.up_hold,
+            }
+
+            step = self.policy.update(queue_s, delivery, now)
+            if step:
+                logger.info("%s一档（积压 %.2fs，送达率 %.0f%%）",
+                            '降' if step < 0 else '升', queue_s, delivery * 100)
+                sup.step_profile(step)
@@ -9,35 +9,11 @@ HEIGHT=360        # 360P画质，大幅节省资源
 FPS=25            # 帧率
 BITRATE=500000    # 比特率压缩到500kbps
 GOP=15            # 更短的关键帧间隔
-DISABLE_PREVIEW="-n" # 关闭摄像头本地预览
 
-if ! command -v raspivid &> /dev/null || ! command -v ffmpeg &> /dev/null; then
-    echo "错误：请先安装 raspivid 和 ffmpeg！"
-    echo "安装命令：sudo apt install ffmpeg"
-    exit 1
-fi
-
-raspivid $DISABLE_PREVIEW -o - -t 0 \
-    -w $WIDTH -h $HEIGHT -fps $FPS -b $BITRATE -g $GOP \
-    --codec H264 | \
-ffmpeg -fflags nobuffer \
-       -flags low_delay \
-       -f h264 \
-       -i - \
-       -c:v copy \
-       -preset ultrafast \
-       -tune zerolatency \
-       -flags low_delay \
-       -f flv \
-       -flush_packets 1 \
-       $RTMP_URL &
-
-# 降低进程优先级
-PID=$!
-renice -n 10 -p $PID
-
-# 资源监控提示
-echo "推流已启动（PID: $PID），资源监控："
-echo "1. 实时CPU/内存：top -p $PID"
-echo "2. 温度监测：vcgencmd measure_temp"
-echo "3. 停止推流：kill $PID"
+# 编码器/ffmpeg 进程由 stream_supervisor.py 管理：异常退出时按退避时间自动重启，
+# 无摄像头时可追加 --source test 使用测试画面
+# 同时在本地分段录制可追加 --record <目录>（与推流共用同一个编码器，不重新编码）
+# 夏天过热时可追加 --thermal：按 SoC 温度和 CPU 负载分级降低画质，降温后逐级恢复
+exec python3 "$(dirname "$0")/stream_supervisor.py" rtmp "$RTMP_URL" \
+    --width $WIDTH --height $HEIGHT --fps $FPS --bitrate $BITRATE --gop $GOP \
+    --nice 10 "$@"
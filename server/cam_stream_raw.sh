@@ -5,6 +5,7 @@
 #gst-launch-1.0 fdsrc ! h264parse ! rtph264pay config-interval=1 pt=96 ! udpsink host=192.168.1.5 port=5000
 #raspivid -t 0 -w 640 -h 480 -fps 30 -b 2000000 -o - | \
 #ncat --send-only --udp 192.168.1.5 5000
+# 以上为原来的参考命令，分别对应 stream_supervisor.py 的 udp、rtp 和 udp 模式
 
 # 设置目标地址和端口
 RECEIVER_IP="192.168.1.5"  # 替换为你的接收方 IP
@@ -16,18 +17,9 @@ HEIGHT=480
 FPS=25
 BITRATE=500000
 
-echo "Starting auto-reconnecting video stream..."
-
-while true; do
-    echo "[$(date)] Starting stream to $RECEIVER_IP:$PORT..."
-    # 开始推流
-    raspivid -t 0 -w $WIDTH -h $HEIGHT -fps $FPS -b $BITRATE -o - | \
-    # pv -L 1m | nc $RECEIVER_IP $PORT
-    nc $RECEIVER_IP $PORT
-    # nc -s 192.168.1.100 -u -w 1 $RECEIVER_IP $PORT
-    # 如果退出状态不是正常退出（即出错），则等待重试
-    if [ $? -ne 0 ]; then
-        echo "[$(date)] Connection failed or closed. Retrying in 1 second..."
-    fi
-    sleep 1
-done
+# H.264 裸流通过 TCP 发送给接收方（原 nc 方式）；连接失败或断开时按退避时间自动重连。
+# 改用 UDP 时把 tcp 换成 udp；无摄像头时可追加 --source test 使用测试画面
+# 需要多人同时观看时改用 relay 模式：stream_supervisor.py relay 0.0.0.0:$PORT，由观看端连接小车
+# 需要标准 RTP 播放（原 gst rtph264pay 方式）时改用 rtp 模式：stream_supervisor.py rtp $RECEIVER_IP:5004 --sdp stream.sdp
+exec python3 "$(dirname "$0")/stream_supervisor.py" tcp "$RECEIVER_IP:$PORT" \
+    --width $WIDTH --height $HEIGHT --fps $FPS --bitrate $BITRATE "$@"
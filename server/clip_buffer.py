@@ -0,0 +1,178 @@
+#!/usr/bin/python3
+"""
+事件前视频缓存与片段导出
+
+在内存中保留最近 N 秒的 H.264 码流（不解码），按 GOP 存放，总是从关键帧开始。
+收到保存请求时，把缓存的内容加上之后 M 秒的码流交给 ffmpeg 转封装为 MP4（-c copy，不重新编码）。
+
+保存请求来自控制服务端：server.py 收到 CLIP:SAVE（或 --clip-on-bell 时铃音按下）后，
+向本模块监听的本机 UDP 端口发送一个 "CLIP:SAVE" 数据报。
+
+由 stream_supervisor.py 使用:
+    python3 stream_supervisor.py rtmp "rtmp://..." --clip-buffer 10 --clip-post 5 --clip-dir clips
+    python3 motor/server.py --clip-notify 127.0.0.1:33100 --clip-on-bell
+"""
+import os
+import sys
+import time
+import socket
+import logging
+import threading
+import subprocess
+from collections import deque
+
+logger = logging.getLogger('ClipBuffer')
+
+PRE_SECONDS = 10.0
+POST_SECONDS = 5.0
+MAX_BYTES = 16 * 1024 * 1024   # 缓存上限，码率很高时按字节数截断
+CLIP_PORT = 33100
+CLIP_COMMAND = b'CLIP:SAVE'
+
+
+class ClipBuffer:
+    """
+    feed_nal(piece, nal_type) 作为 StreamSupervisor 的 NAL 回调；request_save() 可从任意线程调用
+
+    params:     StreamSupervisor 的 ParameterSets，每个 GOP 前写入其中的 SPS/PPS
+    fps_getter: 返回当前帧率的可调用对象（裸流没有时间戳，导出时按帧率生成）
+    """
+
+    def __init__(self, params, out_dir, pre_seconds=PRE_SECONDS, post_seconds=POST_SECONDS,
+                 max_bytes=MAX_BYTES, fps_getter=lambda: 25):
+        self.params = params
+        self.out_dir = out_dir
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.max_bytes = max_bytes
+        self.fps_getter = fps_getter
+
+        # 每个 GOP: [开始时间, 片段列表, 字节数]，第一个片段是 SPS/PPS
+        self.gops = deque()
+        self.total_bytes = 0
+        self.generation = params.generation
+
+        self.save_requested = False
+        self.capture = None   # 正在收集的片段: (截止时间, 片段列表, 文件路径, 帧率)
+        self.saved = []
+        self.stop_event = threading.Event()
+
+    # ===== 触发 =====
+
+    def request_save(self):
+        """在读取线程处理下一个片段时开始保存；正在保存时忽略"""
+        self.save_requested = True
+
+    def listen(self, address):
+        """监听保存请求数据报"""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(address)
+        sock.settimeout(0.5)
+        threading.Thread(target=self._listen_loop, args=(sock,), name='clip-listen', daemon=True).start()
+        logger.info("片段保存请求监听 %s:%d", *address)
+
+    def _listen_loop(self, sock):
+        while not self.stop_event.is_set():
+            try:
+                data, _ = sock.recvfrom(64)
+            except socket.timeout:
+                continue
+            if data.strip() == CLIP_COMMAND:
+                self.request_save()
+        sock.close()
+
+    def stop(self):
+        self.stop_event.set()
+
+    # ===== 数据 =====
+
+    def feed_nal(self, piece, nal_type):
+        now = time.monotonic()
+        if self.save_requested:
+            self.save_requested = False
+            self._start_capture(now)
+
+        params = self.params
+        if params.generation != self.generation:
+            # 编码器重启或切换档位，参数变化后的码流不能接在同一个 MP4 里
+            self.generation = params.generation
+            self._reset()
+        # SPS/PPS 不进缓存，在每个 GOP 开头由 _start_gop 写入
+        if params.current is None:
+            if nal_type == 'idr' and params.sps and params.pps:
+                self._start_gop(now)
+            self._append(piece)
+
+        if self.capture and now >= self.capture[0]:
+            self._finish_capture()
+
+    def _start_gop(self, now):
+        header = self.params.sps + self.params.pps
+        self.gops.append([now, [header], len(header)])
+        self.total_bytes += len(header)
+        # 保留最近 pre_seconds 秒（至少保留当前 GOP），并限制总字节数
+        while len(self.gops) > 1 and (now - self.gops[1][0] >= self.pre_seconds
+                                      or self.total_bytes > self.max_bytes):
+            self.total_bytes -= self.gops.popleft()[2]
+
+    def _append(self, piece):
+        if not self.gops:
+            return
+        # 片段是 64 KB 读取块的 memoryview，存下来会让整块一直不能释放，
+        # max_bytes 也会严重低估实际内存；复制出片段本身再缓存
+        piece = bytes(piece)
+        gop = self.gops[-1]
+        gop[1].append(piece)
+        gop[2] += len(piece)
+        self.total_bytes += len(piece)
+        if self.capture:
+            self.capture[1].append(piece)
+
+    def _reset(self):
+        if self.capture:
+            self._finish_capture()
+        self.gops.clear()
+        self.total_bytes = 0
+
+    # ===== 导出 =====
+
+    def _start_capture(self, now):
+        if self.capture:
+            logger.info("正在保存片段，忽略新的保存请求")
+            return
+        if not self.gops:
+            logger.warning("缓存为空，无法保存片段")
+            return
+        pieces = [piece for gop in self.gops for piece in gop[1]]
+        name = time.strftime('clip-%Y%m%d-%H%M%S.mp4')
+        path = os.path.join(self.out_dir, name)
+        # 帧率在开始时确定：中途切换档位时参数变化会提前结束本次保存
+        self.capture = (now + self.post_seconds, pieces, path, self.fps_getter())
+        logger.info("保存片段 %s（之前 %.1f 秒，之后 %.1f 秒）",
+                    name, now - self.gops[0][0], self.post_seconds)
+
+    def _finish_capture(self):
+        _, pieces, path, fps = self.capture
+        self.capture = None
+        threading.Thread(target=self._write_mp4, args=(pieces, path, fps),
+                         name='clip-writer', daemon=True).start()
+
+    def _write_mp4(self, pieces, path, fps):
+        os.makedirs(self.out_dir, exist_ok=True)
+        cmd = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y',
+               '-f', 'h264', '-framerate', str(fps), '-i', '-',
+               '-c:v', 'copy', '-movflags', '+faststart', path]
+        start = time.monotonic()
+        try:
+            proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+            _, err = proc.communicate(b''.join(pieces))
+        except OSError as e:
+            logger.error("保存片段失败: %s", e)
+            return
+        if proc.returncode != 0:
+            logger.error("保存片段失败（ffmpeg 返回码 %d）: %s", proc.returncode,
+                         err.decode(errors='replace').strip())
+            return
+        self.saved.append(path)
+        logger.info("片段已保存: %s（%.1f MB，用时 %.2f 秒）", path,
+                    os.path.getsize(path) / 1e6, time.monotonic() - start)
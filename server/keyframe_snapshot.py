@@ -0,0 +1,235 @@
+#!/usr/bin/python3
+"""
+关键帧截图
+
+从推流的码流中缓存最新的关键帧（SPS + PPS + IDR 帧，只保存引用，不复制、不解码），
+有人请求时才把这一帧交给 ffmpeg 转成 JPEG。转换结果保留到下一个关键帧到来之前，
+期间的重复请求直接返回缓存。不需要第二个摄像头进程，转换在 HTTP 线程里以低优先级进行，
+不影响推流的读取线程。
+
+由 stream_supervisor.py 使用:
+    python3 stream_supervisor.py rtmp "rtmp://..." --snapshot-listen 0.0.0.0:8081
+    curl -o snap.jpg http://<小车IP>:8081/snapshot.jpg
+控制端发送 SNAPSHOT:REQUEST 时，server.py（--snapshot-port 8081）回复截图地址。
+
+自检（本机端口，测试画面由 ffmpeg lavfi 生成）:
+    python3 keyframe_snapshot.py --check
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+import threading
+import subprocess
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'motor'))
+from log_pipeline import setup_async_logging
+from nal_relay import NalSplitter, ParameterSets, NAL_IDR
+
+logger = logging.getLogger('KeyframeSnapshot')
+
+SNAPSHOT_PATH = '/snapshot.jpg'
+JPEG_QUALITY = 3         # ffmpeg mjpeg 的 -q:v，2-31，越小越清晰
+CONVERT_TIMEOUT = 10.0
+CONVERT_NICE = 10
+
+
+class KeyframeSnapshot:
+    """
+    feed_nal(piece, nal_type) 作为 StreamSupervisor 的 NAL 回调；snapshot() 可从任意线程调用
+
+    params: StreamSupervisor 的 ParameterSets，关键帧前面加上其中的 SPS/PPS
+    """
+
+    def __init__(self, params, quality=JPEG_QUALITY):
+        self.params = params
+        self.quality = quality
+        self.collecting = None     # 正在接收的 IDR 帧：SPS + PPS + 片段
+        # 最新的完整关键帧：(序号, 到达时间, SPS + PPS + 片段)
+        self.keyframe = None
+        self.keyframe_seq = 0
+        self.jpeg = None           # (关键帧序号, JPEG 数据)
+        self.convert_lock = threading.Lock()
+        self.conversions = 0
+        self.requests = 0
+        self.server = None
+
+    # ===== 数据（读取线程） =====
+
+    def feed_nal(self, piece, nal_type):
+        if nal_type is None:
+            # 接续片段
+            if self.collecting is not None:
+                self.collecting.append(piece)
+            return
+        if self.collecting is not None and nal_type != NAL_IDR:
+            # IDR 帧的所有 slice 都已收到
+            self._finish_keyframe()
+        if nal_type == 'idr':
+            params = self.params
+            if params.sps and params.pps:
+                # 在帧开始时取参数集：帧结束时可能已经收到下一组 SPS/PPS
+                self.collecting = [params.sps, params.pps, piece]
+        elif nal_type == NAL_IDR and self.collecting is not None:
+            self.collecting.append(piece)
+
+    def _finish_keyframe(self):
+        self.keyframe_seq += 1
+        self.keyframe = (self.keyframe_seq, time.time(), self.collecting)
+        self.collecting = None
+
+    # ===== 截图 =====
+
+    def snapshot(self):
+        """
+        返回 (关键帧序号, 关键帧时间, JPEG 数据)，还没有关键帧或转换失败时返回 None
+
+        同一个关键帧只转换一次；同时到达的请求等待同一次转换的结果。
+        """
+        self.requests += 1
+        keyframe = self.keyframe
+        if keyframe is None:
+            return None
+        seq, stamp, pieces = keyframe
+        with self.convert_lock:
+            jpeg = self.jpeg
+            if jpeg is None or jpeg[0] != seq:
+                data = self._convert(pieces)
+                if data is None:
+                    return None
+                self.jpeg = jpeg = (seq, data)
+        return seq, stamp, jpeg[1]
+
+    def _convert(self, pieces):
+        cmd = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-f', 'h264', '-i', '-',
+               '-frames:v', '1', '-q:v', str(self.quality), '-f', 'image2pipe', '-c:v', 'mjpeg', '-']
+        cmd = ['nice', '-n', str(CONVERT_NICE)] + cmd
+        start = time.monotonic()
+        try:
+            result = subprocess.run(cmd, input=b''.join(pieces), capture_output=True,
+                                    timeout=CONVERT_TIMEOUT)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            logger.error("截图转换失败: %s", e)
+            return None
+        if result.returncode != 0 or not result.stdout:
+            logger.error("截图转换失败（ffmpeg 返回码 %d）: %s", result.returncode,
+                         result.stderr.decode(errors='replace').strip())
+            return None
+        self.conversions += 1
+        logger.info("截图已生成（%d 字节，用时 %.0fms）", len(result.stdout),
+                    (time.monotonic() - start) * 1000)
+        return result.stdout
+
+    def stats(self):
+        return {'keyframes': self.keyframe_seq, 'requests': self.requests,
+                'conversions': self.conversions}
+
+    # ===== HTTP =====
+
+    def serve(self, address):
+        """在后台线程中提供 GET /snapshot.jpg"""
+        snapshot = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != SNAPSHOT_PATH:
+                    self.send_error(404)
+                    return
+                result = snapshot.snapshot()
+                if result is None:
+                    # 状态行按 latin-1 编码，原因短语只能用 ASCII，中文说明放在响应正文
+                    self.send_error(503, "No keyframe yet", explain="还没有可用的关键帧或转换失败")
+                    return
+                seq, stamp, jpeg = result
+                etag = f'"{seq}"'
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'image/jpeg')
+                self.send_header('Content-Length', str(len(jpeg)))
+                self.send_header('Cache-Control', 'no-cache')
+                self.send_header('ETag', etag)
+                self.send_header('X-Keyframe-Age', f'{time.time() - stamp:.3f}')
+                self.end_headers()
+                self.wfile.write(jpeg)
+
+            def log_message(self, fmt, *args):
+                logger.debug("%s %s", self.address_string(), fmt % args)
+
+        self.server = ThreadingHTTPServer(address, Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name='snapshot-http', daemon=True).start()
+        host, port = self.server.server_address[:2]
+        logger.info("截图服务 http://%s:%d%s", host, port, SNAPSHOT_PATH)
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+def _get(url, etag=None):
+    """返回 (状态码, ETag, 正文)，连接被断开时状态码为 None"""
+    request = urllib.request.Request(url, headers={'If-None-Match': etag} if etag else {})
+    try:
+        with urllib.request.urlopen(request, timeout=CONVERT_TIMEOUT) as response:
+            return response.status, response.headers.get('ETag'), response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers.get('ETag'), e.read()
+    except OSError:
+        return None, None, b''
+
+
+def check():
+    """自检：没有关键帧时返回 503，收到关键帧后返回 JPEG，相同 ETag 返回 304"""
+    params = ParameterSets()
+    snapshot = KeyframeSnapshot(params)
+    snapshot.serve(('127.0.0.1', 0))
+    url = f'http://127.0.0.1:{snapshot.server.server_address[1]}{SNAPSHOT_PATH}'
+    failures = []
+    try:
+        status, _, _ = _get(url)
+        if status != 503:
+            failures.append(f"没有关键帧时返回 {status}，应为 503")
+
+        cmd = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-f', 'lavfi',
+               '-i', 'testsrc=size=320x240:rate=10', '-frames:v', '12', '-c:v', 'libx264',
+               '-g', '10', '-f', 'h264', '-']
+        stream = subprocess.run(cmd, capture_output=True, timeout=CONVERT_TIMEOUT).stdout
+        # 与 StreamSupervisor 相同：切分后先更新参数集再交给回调
+        for piece, nal_type in NalSplitter().feed(stream):
+            params.update(piece, nal_type)
+            snapshot.feed_nal(piece, nal_type)
+        status, etag, body = _get(url)
+        if status != 200 or not body.startswith(b'\xff\xd8'):
+            failures.append(f"收到关键帧后返回 {status}（{len(body)} 字节），应为 200 和 JPEG")
+        elif _get(url, etag)[0] != 304:
+            failures.append("相同 ETag 没有返回 304")
+    finally:
+        snapshot.stop()
+    for failure in failures:
+        print("失败:", failure)
+    print("自检通过" if not failures else f"自检失败 {len(failures)} 项")
+    return 1 if failures else 0
+
+
+def main():
+    setup_async_logging()
+    parser = argparse.ArgumentParser(description="关键帧截图（由 stream_supervisor.py --snapshot-listen 使用）")
+    parser.add_argument('--check', action='store_true', help="在本机端口上自检 HTTP 接口")
+    args = parser.parse_args()
+    if args.check:
+        return check()
+    parser.print_help()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
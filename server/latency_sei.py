@@ -0,0 +1,107 @@
+#!/usr/bin/python3
+"""
+视频延迟测量用的 SEI 时间戳
+
+推流端（stream_supervisor.py --stamp-latency）在每帧第一个 slice 前插入一个
+user_data_unregistered SEI（payloadType 5），内容为固定的 UUID、帧序号和
+读出该帧时的服务端时间（time.time_ns()）。接收端（latency_probe.py）解析这个 SEI，
+用控制连接上 TIME:REQUEST 同步的时钟偏差计算延迟。
+
+SEI 经 flv/mpegts 封装（-c:v copy）、relay 和 RTP 转发都会原样保留。
+"""
+import time
+import struct
+
+STAMP_UUID = bytes.fromhex('7a1c5e0b3d8f4c21a9e6b2d4f0c8e135')
+STAMP_PAYLOAD = struct.Struct('!QI')   # 服务端时间（纳秒）、帧序号
+SEI_USER_DATA_UNREGISTERED = 5
+NAL_SEI = 6
+
+
+def _escape(rbsp):
+    """插入防竞争字节：00 00 后面跟 00-03 时在中间插入 03"""
+    out = bytearray()
+    zeros = 0
+    for b in rbsp:
+        if zeros >= 2 and b <= 3:
+            out.append(3)
+            zeros = 0
+        out.append(b)
+        zeros = zeros + 1 if b == 0 else 0
+    return bytes(out)
+
+
+def _unescape(ebsp):
+    return ebsp.replace(b'\x00\x00\x03', b'\x00\x00')
+
+
+def is_frame_start(piece, nal_type):
+    """piece 是否为一帧的第一个 slice（first_mb_in_slice 为 0，ue(v) 编码的首位为 1）"""
+    if nal_type == 'idr':
+        return True
+    if nal_type != 1:
+        return False
+    offset = 4 if piece[2] == 0 else 3
+    return bool(piece[offset + 1] & 0x80)
+
+
+def build_sei(time_ns, seq):
+    """带起始码的 SEI NAL"""
+    payload = STAMP_UUID + STAMP_PAYLOAD.pack(time_ns, seq)
+    rbsp = bytes((SEI_USER_DATA_UNREGISTERED, len(payload))) + payload + b'\x80'
+    return b'\x00\x00\x00\x01' + bytes((NAL_SEI,)) + _escape(rbsp)
+
+
+def parse_sei(nal):
+    """
+    从 SEI NAL（不含起始码，从 NAL 头开始）中取出时间戳
+
+    返回 (服务端时间纳秒, 帧序号)，不是本模块写入的 SEI 时返回 None
+    """
+    rbsp = _unescape(bytes(nal[1:]))
+    pos = 0
+    while pos + 2 <= len(rbsp) and rbsp[pos] != 0x80:
+        # payloadType / payloadSize 按 0xff 续接编码
+        payload_type = 0
+        while rbsp[pos] == 0xff:
+            payload_type += 255
+            pos += 1
+        payload_type += rbsp[pos]
+        pos += 1
+        size = 0
+        while pos < len(rbsp) and rbsp[pos] == 0xff:
+            size += 255
+            pos += 1
+        if pos >= len(rbsp):
+            return None
+        size += rbsp[pos]
+        pos += 1
+        body = rbsp[pos:pos + size]
+        if (payload_type == SEI_USER_DATA_UNREGISTERED and body[:16] == STAMP_UUID
+                and len(body) >= 16 + STAMP_PAYLOAD.size):
+            return STAMP_PAYLOAD.unpack_from(body, 16)
+        pos += size
+    return None
+
+
+class SeiStamper:
+    """
+    在每帧第一个 slice（first_mb_in_slice 为 0）之前插入时间戳 SEI
+
+    stamp(pieces) 的输入是 StreamSupervisor 切分好的 [(piece, nal_type), ...]，
+    返回插入 SEI 后的新列表（SEI 片段的 nal_type 为 NAL_SEI）。
+    """
+
+    def __init__(self, clock=time.time_ns):
+        self.clock = clock
+        self.seq = 0
+
+    def stamp(self, pieces):
+        now = self.clock()
+        out = []
+        for piece, nal_type in pieces:
+            if is_frame_start(piece, nal_type):
+                out.append((build_sei(now, self.seq), NAL_SEI))
+                self.seq += 1
+            out.append((piece, nal_type))
+        return out
@@ -0,0 +1,147 @@
+#!/usr/bin/python3
+"""
+限速 TCP 链路模拟器，用于在本机验证自适应码率
+
+监听一个 TCP 端口，以令牌桶限制读取速率（接收缓冲区设得很小，限速会很快反压到发送端），
+数据转发到 --forward 指定的地址，不指定则丢弃。每秒打印一次实际接收速率。
+
+用法:
+    python3 link_emulator.py --listen 127.0.0.1:6000 --rate 800
+    python3 link_emulator.py --listen 127.0.0.1:6000 --schedule 3000:20,400:30,3000:60
+    python3 link_emulator.py --listen 0.0.0.0:6000 --forward 192.168.1.5:33064 --rate 1500
+"""
+import os
+import sys
+import time
+import socket
+import logging
+import argparse
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'motor'))
+from log_pipeline import setup_async_logging
+from stream_supervisor import parse_address
+
+logger = logging.getLogger('LinkEmulator')
+
+RCVBUF = 16 * 1024   # 接收缓冲区（字节），越小反压越快
+READ_SIZE = 4096
+BURST = 0.05         # 令牌桶容量（秒数据量）
+
+
+def parse_schedule(text):
+    """'3000:20,400:30' -> [(3000, 20.0), (400, 30.0)]，速率单位 kbit/s，时长单位秒"""
+    steps = []
+    for item in text.split(','):
+        rate, _, duration = item.partition(':')
+        steps.append((float(rate), float(duration)))
+    return steps
+
+
+class LinkEmulator:
+    """
+    限速接收端
+
+    rate_kbps: 初始速率（kbit/s）
+    forward:   转发地址 (host, port)，None 表示丢弃
+    """
+
+    def __init__(self, listen, rate_kbps, forward=None):
+        self.listen = listen
+        self.forward = forward
+        self.rate = rate_kbps * 1000 / 8
+        self.received = 0
+        self.stop_event = threading.Event()
+
+    def set_rate(self, rate_kbps):
+        self.rate = rate_kbps * 1000 / 8
+        logger.info("链路速率: %.0f kbit/s", rate_kbps)
+
+    def serve(self):
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        # 接收缓冲区须在 listen 前设置，accept 出的连接继承该值
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RCVBUF)
+        server.bind(self.listen)
+        server.listen(1)
+        server.settimeout(0.5)
+        logger.info("监听 %s:%d", *self.listen)
+        while not self.stop_event.is_set():
+            try:
+                conn, peer = server.accept()
+            except socket.timeout:
+                continue
+            logger.info("连接来自 %s:%d", *peer)
+            with conn:
+                self._relay(conn)
+            logger.info("连接断开")
+        server.close()
+
+    def _relay(self, conn):
+        out = socket.create_connection(self.forward) if self.forward else None
+        conn.settimeout(0.5)
+        tokens = 0.0
+        last = time.monotonic()
+        try:
+            while not self.stop_event.is_set():
+                now = time.monotonic()
+                tokens = min(max(self.rate * BURST, READ_SIZE), tokens + (now - last) * self.rate)
+                last = now
+                if tokens < READ_SIZE:
+                    time.sleep((READ_SIZE - tokens) / self.rate)
+                    continue
+                try:
+                    data = conn.recv(READ_SIZE)
+                except socket.timeout:
+                    continue
+                if not data:
+                    break
+                tokens -= len(data)
+                self.received += len(data)
+                if out:
+                    out.sendall(data)
+        except OSError as e:
+            logger.warning("转发出错: %s", e)
+        finally:
+            if out:
+                out.close()
+
+    def run_schedule(self, steps):
+        """按 [(kbps, 秒), ...] 依次切换速率，结束后停止"""
+        for rate, duration in steps:
+            self.set_rate(rate)
+            if self.stop_event.wait(duration):
+                return
+        self.stop_event.set()
+
+
+def main():
+    setup_async_logging()
+    parser = argparse.ArgumentParser(description="限速 TCP 链路模拟器")
+    parser.add_argument('--listen', default='127.0.0.1:6000', help="监听地址 host:port")
+    parser.add_argument('--forward', help="转发到 host:port，不指定则丢弃数据")
+    parser.add_argument('--rate', type=float, default=1000, help="链路速率（kbit/s）")
+    parser.add_argument('--schedule', help="速率变化表 kbps:秒,kbps:秒,...，结束后退出")
+    args = parser.parse_args()
+
+    emulator = LinkEmulator(parse_address(args.listen), args.rate,
+                            parse_address(args.forward) if args.forward else None)
+    threading.Thread(target=emulator.serve, daemon=True).start()
+    if args.schedule:
+        threading.Thread(target=emulator.run_schedule, args=(parse_schedule(args.schedule),),
+                         daemon=True).start()
+
+    last = emulator.received
+    try:
+        while not emulator.stop_event.wait(1.0):
+            received = emulator.received
+            print(f"接收 {(received - last) * 8 / 1000:8.1f} kbit/s"
+                  f"（限速 {emulator.rate * 8 / 1000:.0f}）", flush=True)
+            last = received
+    except KeyboardInterrupt:
+        emulator.stop_event.set()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
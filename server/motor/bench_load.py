@@ -0,0 +1,359 @@
+#!/usr/bin/python3
+"""
+CarServer 负载测试
+
+在本进程内用模拟 GPIO 启动 CarServer，在子进程中开启多个并发的合成客户端：
+    joystick  - 60Hz 手柄流（每帧 MOVE + BELL，与 joystick.py 相同）
+    keys      - 键盘按键连发（autorepeat 突发后 STOP，偶尔转动摄像头）
+    status    - 周期性 STATUS:REQUEST 查询
+    reconnect - 反复连接/发送/断开
+
+统计命令吞吐量、命令到执行完成的延迟分布、服务端 CPU 和内存，
+结果写成 JSON 以便比较不同版本的线程模型和解析器。
+
+用法:
+    python3 bench_load.py --joystick 4 --keys 2 --status 1 --reconnect 1 --duration 20 --json result.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import socket
+import platform
+import resource
+import argparse
+import threading
+import subprocess
+import multiprocessing
+
+# 负载测试总是使用模拟 GPIO
+os.environ['CAR_GPIO'] = 'sim'
+os.environ.setdefault('CAR_LOG_LEVEL', 'WARNING')
+
+from log_pipeline import setup_async_logging
+from server import CarServer
+from replay import percentile
+
+MOVES = ['MOVE:FORWARD', 'MOVE:BACKWARD', 'MOVE:LEFT', 'MOVE:RIGHT']
+
+
+class BenchServer(CarServer):
+    """记录每条命令执行完成时间的 CarServer"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # 套接字 -> (对端端口, [完成时间, ...])
+        self.actuations = {}
+
+    def _process_command(self, cmd, client_socket):
+        super()._process_command(cmd, client_socket)
+        done = time.monotonic()
+        log = self.actuations.get(client_socket)
+        if log is None:
+            try:
+                peer_port = client_socket.getpeername()[1]
+            except OSError:
+                return
+            log = self.actuations[client_socket] = (peer_port, [])
+        log[1].append(done)
+
+
+# ===== 合成客户端（运行在子进程中）=====
+
+class SyntheticClient:
+    """一个合成客户端，记录每条命令的发送时间"""
+
+    def __init__(self, port, stop_at):
+        self.port = port
+        self.stop_at = stop_at
+        self.sock = None
+        self.sends = []  # [(本地端口, [发送时间, ...]), ...]
+        self.errors = 0
+        self.connects = 0
+
+    def connect(self):
+        self.close()
+        self.sock = socket.create_connection(('127.0.0.1', self.port))
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sends.append((self.sock.getsockname()[1], []))
+        self.connects += 1
+
+    def close(self):
+        if self.sock:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+
+    def send(self, *commands):
+        """一次 sendall 发出若干条命令，失败时重连"""
+        data = ''.join(cmd + '\n' for cmd in commands).encode()
+        now = time.monotonic()
+        try:
+            self.sock.sendall(data)
+        except OSError:
+            self.errors += 1
+            self.connect()
+            return
+        self.sends[-1][1].extend([now] * len(commands))
+
+    def running(self):
+        return time.monotonic() < self.stop_at
+
+
+def joystick_client(client, rng):
+    """60Hz 手柄流，每帧分别发送移动和铃音命令"""
+    client.connect()
+    period = 1.0 / 60
+    next_frame = time.monotonic()
+    move = 'STOP'
+    while client.running():
+        if rng.random() < 0.05:
+            move = rng.choice(MOVES + ['STOP'])
+        client.send(move if move == 'STOP' else f"{move}:{rng.randint(10, 100)}")
+        client.send('BELL:ON' if rng.random() < 0.01 else 'BELL:OFF')
+        next_frame += period
+        delay = next_frame - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def keys_client(client, rng):
+    """键盘连发：按住一段时间（30ms 重复），松开后 STOP"""
+    client.connect()
+    while client.running():
+        if rng.random() < 0.1:
+            client.send(rng.choice(['SERVO:LEFT', 'SERVO:RIGHT', 'SERVO:UP', 'SERVO:DOWN']))
+        else:
+            move = rng.choice(MOVES)
+            for _ in range(rng.randint(3, 20)):
+                client.send(move)
+                time.sleep(0.03)
+            client.send('STOP')
+        time.sleep(rng.uniform(0.2, 1.0))
+
+
+def status_client(client, rng):
+    """每 0.5 秒查询一次状态并读取回复"""
+    client.connect()
+    client.sock.settimeout(1.0)
+    while client.running():
+        client.send('STATUS:REQUEST')
+        try:
+            client.sock.recv(1024)
+        except OSError:
+            pass
+        time.sleep(0.5)
+
+
+def reconnect_client(client, rng):
+    """反复建立连接、发几条命令、断开"""
+    while client.running():
+        try:
+            client.connect()
+        except OSError:
+            client.errors += 1
+            time.sleep(0.1)
+            continue
+        client.send('HEARTBEAT', rng.choice(MOVES), 'STOP')
+        time.sleep(rng.uniform(0.02, 0.1))
+        client.close()
+        time.sleep(rng.uniform(0.05, 0.2))
+
+
+SCENARIOS = {
+    'joystick': joystick_client,
+    'keys': keys_client,
+    'status': status_client,
+    'reconnect': reconnect_client,
+}
+
+
+def run_clients(port, counts, duration, seed, result_queue):
+    """子进程入口：按配置启动所有客户端线程，结束后回传发送记录"""
+    stop_at = time.monotonic() + duration
+    rng = random.Random(seed)
+    workers = []
+    for scenario, count in counts.items():
+        for _ in range(count):
+            client = SyntheticClient(port, stop_at)
+            thread = threading.Thread(
+                target=SCENARIOS[scenario],
+                args=(client, random.Random(rng.random())),
+                daemon=True)
+            workers.append((scenario, client, thread))
+            thread.start()
+
+    for _, client, thread in workers:
+        thread.join(duration + 5)
+        client.close()
+
+    result_queue.put([
+        {'scenario': scenario, 'sends': client.sends,
+         'errors': client.errors, 'connects': client.connects}
+        for scenario, client, _ in workers])
+
+
+# ===== 统计 =====
+
+def _rss_kb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def match_latencies(client_results, actuations):
+    """按本地端口把客户端发送时间和服务端完成时间逐条配对"""
+    done_by_port = {}
+    for peer_port, times in actuations.values():
+        done_by_port.setdefault(peer_port, []).extend(times)
+
+    latencies = {}
+    for result in client_results:
+        for local_port, sent in result['sends']:
+            done = done_by_port.pop(local_port, [])
+            latencies.setdefault(result['scenario'], []).extend(
+                d - s for s, d in zip(sent, done))
+    return latencies
+
+
+def _latency_summary(values):
+    values = sorted(values)
+    return {
+        'count': len(values),
+        'p50_ms': percentile(values, 50) * 1000,
+        'p90_ms': percentile(values, 90) * 1000,
+        'p99_ms': percentile(values, 99) * 1000,
+        'max_ms': (values[-1] if values else 0.0) * 1000,
+    }
+
+
+def run_benchmark(counts, duration, seed=1, max_clients=None):
+    port = _free_port()
+    total_clients = sum(counts.values())
+    server = BenchServer('127.0.0.1', port, max_clients=max_clients or max(1, total_clients))
+    server_thread = threading.Thread(target=server.start, daemon=True)
+    server_thread.start()
+    time.sleep(0.2)  # 等待监听
+
+    rss_start = _rss_kb()
+    usage_start = resource.getrusage(resource.RUSAGE_SELF)
+    wall_start = time.monotonic()
+
+    result_queue = multiprocessing.Queue()
+    proc = multiprocessing.Process(
+        target=run_clients, args=(port, counts, duration, seed, result_queue))
+    proc.start()
+    client_results = result_queue.get()
+    proc.join()
+    time.sleep(0.2)  # 让服务端处理完剩余命令
+
+    wall = time.monotonic() - wall_start
+    usage_end = resource.getrusage(resource.RUSAGE_SELF)
+    rss_end = _rss_kb()
+    server.stop()
+
+    latencies = match_latencies(client_results, server.actuations)
+    processed = sum(len(times) for _, times in server.actuations.values())
+    sent = sum(len(times) for r in client_results for _, times in r['sends'])
+    cpu_s = ((usage_end.ru_utime - usage_start.ru_utime)
+             + (usage_end.ru_stime - usage_start.ru_stime))
+
+    all_latencies = [v for values in latencies.values() for v in values]
+    return {
+        'commands_sent': sent,
+        'commands_processed': processed,
+        'commands_per_s': processed / wall if wall > 0 else 0.0,
+        'latency': _latency_summary(all_latencies),
+        'latency_by_scenario': {k: _latency_summary(v) for k, v in latencies.items()},
+        'server_cpu': {
+            'seconds': cpu_s,
+            'percent_of_core': cpu_s / wall * 100 if wall > 0 else 0.0,
+        },
+        'server_memory_kb': {
+            'rss_start': rss_start,
+            'rss_end': rss_end,
+            'max_rss': usage_end.ru_maxrss,
+        },
+        'connects': sum(r['connects'] for r in client_results),
+        'client_errors': sum(r['errors'] for r in client_results),
+        'wall_s': wall,
+    }
+
+
+def main():
+    setup_async_logging()
+    parser = argparse.ArgumentParser(description="CarServer 负载测试（模拟GPIO）")
+    for scenario in SCENARIOS:
+        parser.add_argument(f'--{scenario}', type=int, default=0, metavar='N',
+                            help=f"{scenario} 客户端数量")
+    parser.add_argument('--duration', type=float, default=10.0, help="测试时长（秒）")
+    parser.add_argument('--seed', type=int, default=1, help="随机种子")
+    parser.add_argument('--max-clients', type=int, help="服务端连接上限（默认等于客户端总数）")
+    parser.add_argument('--label', help="结果标签，例如版本号或改动说明")
+    parser.add_argument('--json', metavar='PATH', help="把结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    counts = {s: getattr(args, s) for s in SCENARIOS if getattr(args, s) > 0}
+    if not counts:
+        counts = {'joystick': 4, 'keys': 2, 'status': 1, 'reconnect': 1}
+
+    print(f"客户端: {counts}  时长: {args.duration}s")
+    result = run_benchmark(counts, args.duration, args.seed, args.max_clients)
+
+    lat = result['latency']
+    print(f"吞吐量:   {result['commands_per_s']:.1f} 命令/秒 "
+          f"({result['commands_processed']}/{result['commands_sent']} 已处理)")
+    print(f"延迟:     p50={lat['p50_ms']:.3f}ms p90={lat['p90_ms']:.3f}ms "
+          f"p99={lat['p99_ms']:.3f}ms max={lat['max_ms']:.3f}ms")
+    for scenario, s in result['latency_by_scenario'].items():
+        print(f"  {scenario:10s} n={s['count']:6d} p99={s['p99_ms']:.3f}ms")
+    print(f"服务端CPU: {result['server_cpu']['percent_of_core']:.1f}% 单核 "
+          f"({result['server_cpu']['seconds']:.2f}s)")
+    print(f"服务端内存: RSS {result['server_memory_kb']['rss_end']} KB "
+          f"(峰值 {result['server_memory_kb']['max_rss']} KB)")
+    print(f"连接次数: {result['connects']}  客户端错误: {result['client_errors']}")
+
+    if args.json:
+        report = {
+            'label': args.label,
+            'git_revision': _git_revision(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'clients': counts,
+            'duration_s': args.duration,
+            'seed': args.seed,
+            'results': result,
+        }
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"结果已写入 {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
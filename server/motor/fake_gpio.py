@@ -0,0 +1,111 @@
+#!/usr/bin/python3
+"""
+模拟 GPIO 后端
+
+与 RPi.GPIO 接口兼容的最小实现，没有硬件时（开发机、回放、基准测试）使用。
+每次引脚输出和 PWM 占空比变化都会带时间戳记入执行时间线，
+可通过 timeline() 取出用于分析。
+
+    import fake_gpio as GPIO
+"""
+import threading
+import time
+from collections import deque
+
+BCM = 11
+BOARD = 10
+OUT = 0
+IN = 1
+HIGH = 1
+LOW = 0
+PUD_OFF = 20
+PUD_DOWN = 21
+PUD_UP = 22
+
+# 时间线最多保留的事件数，防止长时间运行占满内存
+TIMELINE_SIZE = 200000
+
+_lock = threading.Lock()
+_mode = None
+_pins = {}
+_timeline = deque(maxlen=TIMELINE_SIZE)
+
+
+def _record(kind, pin, value):
+    _timeline.append((time.perf_counter(), kind, pin, value))
+
+
+def setmode(mode):
+    global _mode
+    _mode = mode
+
+
+def getmode():
+    return _mode
+
+
+def setwarnings(flag):
+    pass
+
+
+def setup(pin, direction, pull_up_down=PUD_OFF, initial=LOW):
+    with _lock:
+        _pins[pin] = int(initial) if direction == OUT else LOW
+    _record('setup', pin, direction)
+
+
+def output(pin, value):
+    with _lock:
+        _pins[pin] = int(bool(value))
+    _record('out', pin, int(bool(value)))
+
+
+def input(pin):
+    return _pins.get(pin, LOW)
+
+
+def cleanup(pins=None):
+    with _lock:
+        if pins is None:
+            _pins.clear()
+        else:
+            for pin in ([pins] if isinstance(pins, int) else pins):
+                _pins.pop(pin, None)
+    _record('cleanup', None, None)
+
+
+class PWM:
+    """软件 PWM 的模拟，只记录占空比变化"""
+
+    def __init__(self, pin, frequency):
+        self.pin = pin
+        self.frequency = frequency
+        self.duty = 0
+        self.running = False
+
+    def start(self, duty):
+        self.running = True
+        self.duty = duty
+        _record('pwm', self.pin, duty)
+
+    def ChangeDutyCycle(self, duty):
+        if not 0 <= duty <= 100:
+            raise ValueError("dutycycle must have a value from 0.0 to 100.0")
+        self.duty = duty
+        _record('pwm', self.pin, duty)
+
+    def ChangeFrequency(self, frequency):
+        self.frequency = frequency
+
+    def stop(self):
+        self.running = False
+        _record('pwm', self.pin, 0)
+
+
+def timeline():
+    """返回执行时间线副本: [(perf_counter时间, 类型, 引脚, 值), ...]"""
+    return list(_timeline)
+
+
+def reset_timeline():
+    _timeline.clear()
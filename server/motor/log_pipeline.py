@@ -0,0 +1,185 @@
+#!/usr/bin/python3
+"""
+异步日志管道
+
+热路径（电机、舵机、命令解析、手柄事件）只把日志记录放进队列，
+由后台 QueueListener 线程负责格式化和写出，命令路径上不再做 I/O。
+HotLogger 在此基础上按“调用点”做采样和限速，
+这样生产环境可以长期打开 DEBUG 而不拖慢控制回路。
+"""
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def setup_async_logging(level=None, fmt=LOG_FORMAT, handlers=None):
+    """
+    用队列日志替换 logging.basicConfig
+
+    level 未指定时读取环境变量 CAR_LOG_LEVEL（默认 INFO）。
+    重复调用只会启动一个后台监听线程。
+    会替换根 logger 的 handler，只在程序入口（main() / __main__）调用，库模块导入时不调用。
+    """
+    global _listener
+
+    if level is None:
+        level = os.environ.get('CAR_LOG_LEVEL', 'INFO')
+    if isinstance(level, str):
+        level = logging.getLevelName(level.upper())
+
+    with _listener_lock:
+        root = logging.getLogger()
+        root.setLevel(level)
+        if _listener is not None:
+            return _listener
+
+        if handlers is None:
+            stream_handler = logging.StreamHandler()
+            stream_handler.setFormatter(logging.Formatter(fmt))
+            handlers = [stream_handler]
+
+        # SimpleQueue 无界且 put 不加锁，入队开销最小
+        log_queue = queue.SimpleQueue()
+        for handler in root.handlers[:]:
+            root.removeHandler(handler)
+        root.addHandler(logging.handlers.QueueHandler(log_queue))
+
+        _listener = logging.handlers.QueueListener(
+            log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_async_logging)
+        return _listener
+
+
+def stop_async_logging():
+    """停止后台监听线程并刷新剩余日志"""
+    global _listener
+    with _listener_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+class SiteSampler:
+    """
+    单个日志调用点的采样器
+
+    every: 每 N 条只放行 1 条（1 表示不采样）
+    rate:  令牌桶限速，每秒最多放行的条数（None 表示不限速）
+    burst: 令牌桶容量
+
+    同一个调用点会被多个线程使用（客户端线程、硬件初始化线程、推流的读取线程等），
+    计数和令牌桶由锁保护。
+    """
+
+    def __init__(self, every=1, rate=None, burst=None):
+        self.lock = threading.Lock()
+        self.every = max(1, int(every))
+        self.rate = rate
+        self.burst = float(burst if burst is not None else (rate or 1))
+        self.tokens = self.burst
+        self.last_refill = time.monotonic()
+        self.count = 0
+        self.suppressed = 0
+
+    def allow(self):
+        """返回 True 表示本条日志应该输出"""
+        with self.lock:
+            return self._allow()
+
+    def _allow(self):
+        self.count += 1
+        if self.count % self.every:
+            self.suppressed += 1
+            return False
+
+        if self.rate is not None:
+            now = time.monotonic()
+            self.tokens = min(self.burst,
+                              self.tokens + (now - self.last_refill) * self.rate)
+            self.last_refill = now
+            if self.tokens < 1.0:
+                self.suppressed += 1
+                return False
+            self.tokens -= 1.0
+        return True
+
+    def take_suppressed(self):
+        """取出并清零被丢弃的条数"""
+        with self.lock:
+            n = self.suppressed
+            self.suppressed = 0
+            return n
+
+    def admit(self):
+        """allow() 和 take_suppressed() 在一次加锁中完成：丢弃时返回 None，否则返回之前被丢弃的条数"""
+        with self.lock:
+            if not self._allow():
+                return None
+            n = self.suppressed
+            self.suppressed = 0
+            return n
+
+
+class HotLogger:
+    """
+    热路径日志包装器
+
+    用法:
+        hot = HotLogger(logger, rate=5)
+        hot.debug('forward', "Moving forward at %d%%", speed)
+
+    级别未开启时只做一次 isEnabledFor 判断；开启时按调用点采样/限速，
+    被丢弃的条数会附在该调用点下一条输出的日志后面。
+    """
+
+    def __init__(self, logger, every=1, rate=None, burst=None):
+        self.logger = logger
+        self.default_every = every
+        self.default_rate = rate
+        self.default_burst = burst
+        self._sites = {}
+
+    def configure(self, site, every=1, rate=None, burst=None):
+        """为某个调用点单独设置采样参数"""
+        self._sites[site] = SiteSampler(every, rate, burst)
+
+    def _sampler(self, site):
+        sampler = self._sites.get(site)
+        if sampler is None:
+            # 两个线程同时首次使用一个调用点时只保留一个采样器（dict.setdefault 是原子的）
+            sampler = self._sites.setdefault(
+                site, SiteSampler(self.default_every, self.default_rate, self.default_burst))
+        return sampler
+
+    def log(self, level, site, msg, *args):
+        if not self.logger.isEnabledFor(level):
+            return
+        suppressed = self._sampler(site).admit()
+        if suppressed is None:
+            return
+        if suppressed:
+            msg = msg + " (+%d suppressed)"
+            args = args + (suppressed,)
+        self.logger.log(level, msg, *args)
+
+    def debug(self, site, msg, *args):
+        self.log(logging.DEBUG, site, msg, *args)
+
+    def info(self, site, msg, *args):
+        self.log(logging.INFO, site, msg, *args)
+
+    def warning(self, site, msg, *args):
+        self.log(logging.WARNING, site, msg, *args)
+
+    def error(self, site, msg, *args):
+        self.log(logging.ERROR, site, msg, *args)
@@ -0,0 +1,221 @@
+#!/usr/bin/python3
+"""
+进程指标
+
+控制服务端（server.py）和推流进程（stream_supervisor.py）共用的指标输出：
+每个进程维护计数器、瞬时值和分布（如命令处理耗时），后台线程每隔一段时间把快照
+作为一行 JSON 追加到同一个文件（两边都用 --metrics PATH 指向它）。
+两个来源按时间对齐后，就能看出视频质量下降和控制延迟尖峰是否同时发生。
+
+每行格式:
+    {"t": Unix 时间, "source": "control" / "stream",
+     "counters": {名字: 累计值}, "gauges": {名字: 当前值},
+     "summaries": {名字: {"count", "p50", "p90", "p99", "max"}}}   # 分布只统计本周期
+每行用 O_APPEND 一次 write 写出，两个进程写同一个文件时行不会交错。
+
+按秒对齐查看:
+    python3 server/motor/metrics.py metrics.jsonl
+    python3 server/motor/metrics.py metrics.jsonl --spikes 20    # 只看控制 P99 超过 20ms 的秒
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+
+from log_pipeline import setup_async_logging
+
+logger = logging.getLogger('Metrics')
+
+METRICS_INTERVAL = 1.0
+
+
+def _percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+class Metrics:
+    """
+    一个进程的指标
+
+    incr / set / observe 可从任意线程调用，热路径上只有字典查找和列表追加，不加锁；
+    snapshot() 由写出线程调用，换出本周期的分布样本。
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.counters = {}
+        self.gauges = {}
+        self.samples = {}
+        self.collectors = []
+
+    def incr(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def set_total(self, name, value):
+        """设置由其他组件维护的累计值（如重启次数）"""
+        self.counters[name] = value
+
+    def set(self, name, value):
+        self.gauges[name] = value
+
+    def observe(self, name, value):
+        samples = self.samples.get(name)
+        if samples is None:
+            samples = self.samples[name] = []
+        samples.append(value)
+
+    def add_collector(self, callback):
+        """注册 callback(metrics)，每次快照前调用，用于把其他组件的状态采样成指标"""
+        self.collectors.append(callback)
+
+    def snapshot(self):
+        for collect in self.collectors:
+            try:
+                collect(self)
+            except Exception as e:
+                logger.warning("指标采样出错: %s", e)
+        samples, self.samples = self.samples, {}
+        summaries = {}
+        for name, values in samples.items():
+            if not values:
+                continue
+            values.sort()
+            summaries[name] = {
+                'count': len(values),
+                'p50': round(_percentile(values, 0.5), 3),
+                'p90': round(_percentile(values, 0.9), 3),
+                'p99': round(_percentile(values, 0.99), 3),
+                'max': round(values[-1], 3),
+            }
+        return {'t': round(time.time(), 3), 'source': self.source,
+                'counters': dict(self.counters), 'gauges': dict(self.gauges),
+                'summaries': summaries}
+
+
+class MetricsWriter:
+    """每 interval 秒把 metrics.snapshot() 追加到 path"""
+
+    def __init__(self, metrics, path, interval=METRICS_INTERVAL):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.fd = None
+
+    def start(self):
+        self.fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self.thread = threading.Thread(target=self._run, name='metrics-writer', daemon=True)
+        self.thread.start()
+        logger.info("指标写入 %s（每 %.1f 秒，来源 %s）", self.path, self.interval, self.metrics.source)
+
+    def stop(self):
+        """写出最后一次快照"""
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+            self._write()
+            os.close(self.fd)
+            self.thread = None
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            self._write()
+
+    def _write(self):
+        line = json.dumps(self.metrics.snapshot(), ensure_ascii=False, separators=(',', ':')) + '\n'
+        try:
+            os.write(self.fd, line.encode())
+        except OSError as e:
+            logger.error("写入指标失败: %s", e)
+
+
+# ===== 查看 =====
+
+# 按秒对齐时显示的列：(来源, 类型, 名字, 取值, 表头)
+COLUMNS = [
+    ('control', 'counters', 'commands', 'delta', '命令数'),
+    ('control', 'summaries', 'command_ms', 'p99', '命令P99ms'),
+    ('control', 'summaries', 'command_ms', 'max', '命令最大ms'),
+    ('stream', 'gauges', 'fps', None, '帧率'),
+    ('stream', 'summaries', 'frame_gap_ms', 'max', '帧间隔最大ms'),
+    ('stream', 'gauges', 'output_kbps', None, '输出kbps'),
+    ('stream', 'gauges', 'queue_s', None, '积压s'),
+    ('stream', 'counters', 'drop_frames', 'delta', '丢帧'),
+    ('stream', 'counters', 'restarts', 'delta', '重启'),
+    ('stream', 'gauges', 'profile', None, '档位'),
+    ('stream', 'gauges', 'temp_c', None, '温度'),
+    ('stream', 'gauges', 'thermal_level', None, '温控级别'),
+]
+
+
+def read_metrics(path):
+    records = []
+    with open(path) as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+    records.sort(key=lambda r: r['t'])
+    return records
+
+
+def align(records):
+    """按整秒对齐：返回 [(秒, {来源: 记录}), ...]，计数器换算成与上一条同来源记录的差值"""
+    rows = {}
+    previous = {}
+    for record in records:
+        source = record['source']
+        prev = previous.get(source)
+        record['delta'] = {name: value - (prev['counters'].get(name, 0) if prev else value)
+                           for name, value in record['counters'].items()}
+        previous[source] = record
+        rows.setdefault(int(record['t']), {})[source] = record
+    return sorted(rows.items())
+
+
+def _cell(record, kind, name, field):
+    if record is None:
+        return ''
+    if kind == 'counters':
+        value = record['delta'].get(name)
+    elif kind == 'summaries':
+        value = record['summaries'].get(name, {}).get(field)
+    else:
+        value = record['gauges'].get(name)
+    if value is None:
+        return ''
+    return f'{value:.1f}' if isinstance(value, float) else str(value)
+
+
+def main():
+    setup_async_logging()
+    parser = argparse.ArgumentParser(description="按秒对齐查看控制服务端和推流进程的指标")
+    parser.add_argument('path', help="--metrics 写出的 JSON 行文件")
+    parser.add_argument('--spikes', type=float, metavar='MS',
+                        help="只显示控制命令 P99 超过 MS 毫秒的秒（及其前后各一秒）")
+    args = parser.parse_args()
+
+    rows = align(read_metrics(args.path))
+    if args.spikes is not None:
+        hits = {i for i, (_, sources) in enumerate(rows)
+                if sources.get('control', {}).get('summaries', {}).get('command_ms', {}).get('p99', 0)
+                > args.spikes}
+        keep = {j for i in hits for j in (i - 1, i, i + 1)}
+        rows = [row for i, row in enumerate(rows) if i in keep]
+
+    print(f"{'时间':8s} " + " ".join(f"{c[4]:>10s}" for c in COLUMNS))
+    for second, sources in rows:
+        cells = [_cell(sources.get(source), kind, name, field)
+                 for source, kind, name, field, _ in COLUMNS]
+        print(time.strftime('%H:%M:%S', time.localtime(second)) + " " +
+              " ".join(f"{c:>10s}" for c in cells))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,164 @@
+#!/usr/bin/python3
+"""
+会话回放工具
+
+把 server.py --record 录下的命令按原始节奏（或加速、或尽快）重新送入
+CarServer/CarController，使用模拟 GPIO 后端，输出执行时间线和吞吐量。
+
+用法:
+    python3 replay.py session.rec                 # 1x 实时回放
+    python3 replay.py session.rec --speed 4       # 4 倍速
+    python3 replay.py session.rec --speed 0       # 尽快回放
+    python3 replay.py session.rec --timeline out.csv --json result.json
+"""
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+from collections import Counter
+
+# 回放总是使用模拟 GPIO，默认只输出警告以上日志
+os.environ['CAR_GPIO'] = 'sim'
+os.environ.setdefault('CAR_LOG_LEVEL', 'WARNING')
+
+import fake_gpio
+from log_pipeline import setup_async_logging
+from server import CarServer
+from session_record import read_session
+
+
+class ResponseSink:
+    """代替客户端套接字，收集服务端的回复"""
+
+    def __init__(self):
+        self.responses = []
+
+    def sendall(self, data):
+        self.responses.append((time.perf_counter(), data))
+
+    def close(self):
+        pass
+
+
+def percentile(sorted_values, p):
+    """已排序序列的百分位数（最近秩）"""
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, max(0, int(round(p / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[k]
+
+
+def replay(commands, speed=1.0, server=None):
+    """
+    回放命令序列
+
+    commands: [(相对秒数, 命令), ...]
+    speed:    回放倍速，0 表示不等待、尽快回放
+    返回结果字典，其中 'timeline' 为 [(相对秒数, 类型, 引脚/命令, 值), ...]
+    """
+    own_server = server is None
+    if own_server:
+        server = CarServer()
+    sink = ResponseSink()
+    fake_gpio.reset_timeline()
+
+    latencies = []
+    lags = []
+    marks = []
+    t0 = time.perf_counter()
+    try:
+        for offset, cmd in commands:
+            if speed > 0:
+                target = t0 + offset / speed
+                delay = target - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                lags.append(max(0.0, time.perf_counter() - target))
+            start = time.perf_counter()
+            server._process_command(cmd, sink)
+            end = time.perf_counter()
+            latencies.append(end - start)
+            marks.append((start - t0, 'cmd', cmd, end - start))
+        elapsed = time.perf_counter() - t0
+    finally:
+        events = fake_gpio.timeline()
+        if own_server:
+            server.stop()
+
+    timeline = sorted(marks + [(t - t0, kind, pin, value)
+                               for t, kind, pin, value in events if t >= t0 and t - t0 <= elapsed])
+    latencies.sort()
+    lags.sort()
+    return {
+        'commands': len(commands),
+        'speed': speed,
+        'recorded_duration_s': commands[-1][0] if commands else 0.0,
+        'elapsed_s': elapsed,
+        'throughput_cps': len(commands) / elapsed if elapsed > 0 else 0.0,
+        'latency_ms': {
+            'p50': percentile(latencies, 50) * 1000,
+            'p99': percentile(latencies, 99) * 1000,
+            'max': (latencies[-1] if latencies else 0.0) * 1000,
+        },
+        'schedule_lag_ms': {
+            'p50': percentile(lags, 50) * 1000,
+            'p99': percentile(lags, 99) * 1000,
+        },
+        'actuations': dict(Counter(kind for _, kind, _, _ in timeline if kind != 'cmd')),
+        'command_mix': dict(Counter(cmd.split(':')[0] for _, cmd in commands)),
+        'responses': len(sink.responses),
+        'timeline': timeline,
+    }
+
+
+def write_timeline(path, timeline):
+    """把执行时间线写成 CSV"""
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['t_ms', 'kind', 'target', 'value'])
+        for t, kind, target, value in timeline:
+            writer.writerow([f"{t * 1000:.3f}", kind, target, value])
+
+
+def print_report(result):
+    print(f"命令数:     {result['commands']}  (录制时长 {result['recorded_duration_s']:.2f}s)")
+    print(f"回放耗时:   {result['elapsed_s']:.3f}s  倍速: {result['speed'] or '尽快'}")
+    print(f"吞吐量:     {result['throughput_cps']:.1f} 命令/秒")
+    print("处理耗时:   p50={p50:.3f}ms p99={p99:.3f}ms max={max:.3f}ms".format(**result['latency_ms']))
+    if result['speed']:
+        print("调度延迟:   p50={p50:.3f}ms p99={p99:.3f}ms".format(**result['schedule_lag_ms']))
+    print(f"GPIO动作:   {result['actuations']}")
+    print(f"命令构成:   {result['command_mix']}")
+
+
+def main():
+    setup_async_logging()
+    parser = argparse.ArgumentParser(description="回放录制的控制会话")
+    parser.add_argument('recording', help="server.py --record 生成的文件")
+    parser.add_argument('--speed', type=float, default=1.0, help="回放倍速，0 为尽快回放（默认 1）")
+    parser.add_argument('--timeline', metavar='CSV', help="把执行时间线写入 CSV")
+    parser.add_argument('--json', metavar='PATH', help="把统计结果写入 JSON")
+    args = parser.parse_args()
+
+    start_time, commands = read_session(args.recording)
+    print(f"录制开始于 {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(start_time))}")
+    if not commands:
+        print("录制文件中没有命令")
+        return 1
+
+    result = replay(commands, args.speed)
+    print_report(result)
+
+    if args.timeline:
+        write_timeline(args.timeline, result['timeline'])
+    if args.json:
+        summary = {k: v for k, v in result.items() if k != 'timeline'}
+        with open(args.json, 'w') as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
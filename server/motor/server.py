@@ -1,15 +1,26 @@
 #!/usr/bin/python3
-import RPi.GPIO as GPIO
 import time
+_T0 = time.perf_counter()  # 进程启动计时起点
+
+import os
+import sys
+import json
 import socket
 import threading
 import logging
 from collections import deque
 
-# 配置日志
-logging.basicConfig(level=logging.INFO, 
-                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+from log_pipeline import setup_async_logging, HotLogger
+from session_record import SessionRecorder
+from metrics import Metrics, MetricsWriter
+from thermal_governor import ThermalGovernor
+
+# GPIO 后端在 CarController 初始化时才导入（见 load_gpio），快速启动模式下与端口监听并行
+GPIO = None
+
 logger = logging.getLogger('CarServer')
+# 热路径日志：每个调用点每秒最多 20 条
+hot = HotLogger(logger, rate=20)
 
 # ===== 电机引脚定义 =====
 lf_in1, lf_in2, lf_en = 17, 18, 22
@@ -25,9 +36,141 @@ servo_center = 7.5  # 舵机中位占空比(1ms-2ms脉宽对应50Hz PWM)
 # ===== 闹铃引脚定义 =====
 bell_in1, bell_in2 = 7, 8  # 接 L298N 的 IN1 和 IN2
 
+# ===== 命令解析 =====
+# 不带速度的 MOVE 命令使用的占空比（%）
+DEFAULT_SPEED = 50
+# MOVE 命令中的速度 1-100 映射到的占空比范围：占空比太低时电机转不动，
+# 摇杆轻推产生的小速度也要从 MIN_DUTY 起步；最高速度保持原来固定的 50%，不因摇杆推满而加倍
+MIN_DUTY = 35
+MAX_DUTY = 50
+MOVE_DIRECTIONS = ('FORWARD', 'BACKWARD', 'LEFT', 'RIGHT')
+# 摄像头动作 -> (舵机编号, 角度变化)
+SERVO_STEPS = {
+    'UP': (1, -25),
+    'DOWN': (1, 25),
+    'LEFT': (2, 30),
+    'RIGHT': (2, -30),
+}
+SERVO1_RANGE = (90, 180)
+SERVO2_RANGE = (45, 135)
+BATCH_SEPARATOR = ';'
+# 由服务端自己处理、不交给控制器的动作
+SERVER_ACTIONS = ('time', 'clip', 'snapshot')
+# 解析结果缓存的条目上限（客户端的命令组合有限，满了直接清空）
+PARSE_CACHE_SIZE = 512
+# 舵机停止转动多久后写出持久化状态（秒）：连续转动只写一次，写文件不占用舵机锁
+STATE_SAVE_DELAY = 2.0
+# 各温控级别下客户端命令发送频率的上限（Hz，0 为不限制），以 RATE:<Hz> 通知客户端
+THERMAL_SEND_RATES = (0, 30, 20, 10)
+
+def speed_to_duty(speed):
+    """MOVE 命令的速度（0-100）-> 电机占空比：0 为停止，1-100 线性映射到 MIN_DUTY-MAX_DUTY"""
+    speed = max(0, min(100, speed))
+    if speed == 0:
+        return 0
+    return round(MIN_DUTY + (MAX_DUTY - MIN_DUTY) * speed / 100)
+
+def parse_command(cmd):
+    """
+    解析单条命令，返回 (动作, 参数)，无法识别时返回 None
+
+        MOVE:<方向>[:<速度>]  -> ('move', (方向, 占空比))   速度见 speed_to_duty
+        STOP                  -> ('stop', None)
+        SERVO:<UP|DOWN|LEFT|RIGHT|CENTER>  -> ('servo', 动作)
+        BELL:<ON|OFF>         -> ('bell', True/False)
+        STATUS:REQUEST        -> ('status', None)
+        TIME:REQUEST          -> ('time', None)     回复 TIME:<服务端 time.time_ns()>，用于对时
+        CLIP:SAVE             -> ('clip', None)     通知推流进程保存事件前后的视频片段
+        SNAPSHOT:REQUEST      -> ('snapshot', None) 回复 SNAPSHOT:<截图地址>
+        HEARTBEAT             -> ('heartbeat', None)
+    """
+    parts = cmd.strip().split(':')
+    kind = parts[0].upper()
+    if kind == 'MOVE' and len(parts) in (2, 3):
+        direction = parts[1].upper()
+        if direction not in MOVE_DIRECTIONS:
+            return None
+        speed = DEFAULT_SPEED
+        if len(parts) == 3:
+            try:
+                speed = speed_to_duty(int(parts[2]))
+            except ValueError:
+                return None
+        return ('move', (direction, speed))
+    if len(parts) == 1:
+        if kind == 'STOP':
+            return ('stop', None)
+        if kind == 'HEARTBEAT':
+            return ('heartbeat', None)
+        return None
+    if len(parts) != 2:
+        return None
+    arg = parts[1].upper()
+    if kind == 'SERVO' and (arg in SERVO_STEPS or arg == 'CENTER'):
+        return ('servo', arg)
+    if kind == 'BELL' and arg in ('ON', 'OFF'):
+        return ('bell', arg == 'ON')
+    if kind == 'STATUS' and arg == 'REQUEST':
+        return ('status', None)
+    if kind == 'TIME' and arg == 'REQUEST':
+        return ('time', None)
+    if kind == 'CLIP' and arg == 'SAVE':
+        return ('clip', None)
+    if kind == 'SNAPSHOT' and arg == 'REQUEST':
+        return ('snapshot', None)
+    return None
+
+def parse_batch(line):
+    """
+    解析一行命令，多条命令用 ';' 分隔（例如 "MOVE:FORWARD:60;SERVO:UP;SERVO:RIGHT"）
+
+    返回动作列表；任意一条无法识别时整批返回 None，不做部分执行。
+    """
+    actions = []
+    for cmd in line.split(BATCH_SEPARATOR):
+        if not cmd.strip():
+            continue
+        action = parse_command(cmd)
+        if action is None:
+            return None
+        actions.append(action)
+    return actions or None
+
+def load_gpio():
+    """
+    导入 GPIO 后端：只有 CAR_GPIO=sim 时使用模拟后端
+
+    RPi.GPIO 导入失败时不回退到模拟后端（否则服务端照常应答命令而电机不动），直接报错。
+    """
+    global GPIO
+    if GPIO is None:
+        if os.environ.get('CAR_GPIO') == 'sim':
+            import fake_gpio as backend
+        else:
+            try:
+                import RPi.GPIO as backend
+            except ImportError as e:
+                raise ImportError(f"无法导入 RPi.GPIO（{e}）；没有树莓派时设置 CAR_GPIO=sim 使用模拟 GPIO") from e
+        GPIO = backend
+    return GPIO
+
 class CarController:
-    def __init__(self):
+    def __init__(self, fast_start=False, state_path=None):
+        """
+        fast_start: 舵机不在构造函数中同步回中；有持久化状态时直接恢复角度，
+                    否则在后台线程中回中
+        state_path: 舵机角度持久化文件（JSON），舵机停止转动 STATE_SAVE_DELAY 秒后及退出时更新
+        """
+        self.state_path = state_path
+        self.save_timer = None
+        # 启动各阶段耗时（秒）
+        self.timings = {}
+        t = time.perf_counter()
+        load_gpio()
+        self.timings['gpio_import'] = time.perf_counter() - t
+        
         # 初始化GPIO
+        t = time.perf_counter()
         GPIO.setmode(GPIO.BCM)
         GPIO.setwarnings(False)
         
@@ -40,8 +183,10 @@ class CarController:
         for pin in all_pins:
             GPIO.setup(pin, GPIO.OUT)
             GPIO.output(pin, False)
+        self.timings['gpio_setup'] = time.perf_counter() - t
         
         # 初始化电机PWM
+        t = time.perf_counter()
         pwm_pins = [lf_en, rf_en, lb_en, rb_en]
         self.pwms = [GPIO.PWM(pin, 1000) for pin in pwm_pins]  # 1kHz PWM
         for pwm in self.pwms:
@@ -52,6 +197,7 @@ class CarController:
         self.servo2 = GPIO.PWM(servo2_pin, 50)
         self.servo1.start(0)
         self.servo2.start(0)
+        self.timings['pwm_start'] = time.perf_counter() - t
         
         # 舵机状态
         self.servo1_angle = 135
@@ -60,10 +206,61 @@ class CarController:
         # 使用RLock（可重入锁）代替Lock
         self.servo_lock = threading.RLock()
         
-        # 回中舵机
-        self.center_servos()
+        t = time.perf_counter()
+        if not fast_start:
+            # 回中舵机
+            self.center_servos()
+        elif self._restore_state():
+            # 舵机断电后保持原位，恢复记录的角度即可，无需转动
+            logger.info("Servo state restored: SERVO1=%d SERVO2=%d",
+                        self.servo1_angle, self.servo2_angle)
+        else:
+            threading.Thread(target=self.center_servos, daemon=True).start()
+        self.timings['servo_init'] = time.perf_counter() - t
+        
+        if GPIO.__name__ == 'fake_gpio':
+            logger.warning("Using simulated GPIO backend")
         logger.info("CarController initialized")
     
+    def _restore_state(self):
+        """从持久化文件恢复舵机角度，成功返回 True"""
+        if not self.state_path:
+            return False
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+            servo1_angle = int(state['servo1'])
+            servo2_angle = int(state['servo2'])
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
+        if not (90 <= servo1_angle <= 180 and 45 <= servo2_angle <= 135):
+            return False
+        self.servo1_angle = servo1_angle
+        self.servo2_angle = servo2_angle
+        return True
+    
+    def _schedule_save(self):
+        """舵机转动后延迟写出状态，期间的再次转动不重新计时"""
+        if not self.state_path or self.save_timer is not None:
+            return
+        self.save_timer = threading.Timer(STATE_SAVE_DELAY, self._save_state)
+        self.save_timer.daemon = True
+        self.save_timer.start()
+    
+    def _save_state(self):
+        """持久化舵机角度（先写临时文件再替换，避免断电时写坏）"""
+        self.save_timer = None
+        if not self.state_path:
+            return
+        state = {'servo1': self.servo1_angle, 'servo2': self.servo2_angle}
+        tmp_path = self.state_path + '.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(state, f)
+            os.replace(tmp_path, self.state_path)
+        except OSError as e:
+            logger.error("Failed to save servo state: %s", str(e))
+    
     def set_motor(self, pwm, in1, in2, speed):
         """设置单个电机速度和方向"""
         if speed > 0:
@@ -85,7 +282,7 @@ class CarController:
         self.set_motor(self.pwms[1], rf_in1, rf_in2, speed)
         self.set_motor(self.pwms[2], lb_in1, lb_in2, speed)
         self.set_motor(self.pwms[3], rb_in1, rb_in2, speed)
-        logger.debug("Moving forward at %d%%", speed)
+        hot.debug('forward', "Moving forward at %d%%", speed)
     
     def backward(self, speed=50):
         """后退"""
@@ -93,7 +290,7 @@ class CarController:
         self.set_motor(self.pwms[1], rf_in1, rf_in2, -speed)
         self.set_motor(self.pwms[2], lb_in1, lb_in2, -speed)
         self.set_motor(self.pwms[3], rb_in1, rb_in2, -speed)
-        logger.debug("Moving backward at %d%%", speed)
+        hot.debug('backward', "Moving backward at %d%%", speed)
     
     def left(self, speed=50):
         """左转"""
@@ -101,7 +298,7 @@ class CarController:
         self.set_motor(self.pwms[1], rf_in1, rf_in2, speed)
         self.set_motor(self.pwms[2], lb_in1, lb_in2, -speed)
         self.set_motor(self.pwms[3], rb_in1, rb_in2, speed)
-        logger.debug("Turning left at %d%%", speed)
+        hot.debug('left', "Turning left at %d%%", speed)
     
     def right(self, speed=50):
         """右转"""
@@ -109,29 +306,29 @@ class CarController:
         self.set_motor(self.pwms[1], rf_in1, rf_in2, -speed)
         self.set_motor(self.pwms[2], lb_in1, lb_in2, speed)
         self.set_motor(self.pwms[3], rb_in1, rb_in2, -speed)
-        logger.debug("Turning right at %d%%", speed)
+        hot.debug('right', "Turning right at %d%%", speed)
     
     def stop(self):
         """停止所有电机"""
         for pwm in self.pwms:
             pwm.ChangeDutyCycle(0)
-        logger.debug("All motors stopped")
+        hot.debug('stop', "All motors stopped")
     
     def bell_on(self):
         """打开闹铃"""
         GPIO.output(bell_in1, GPIO.HIGH)
         GPIO.output(bell_in2, GPIO.LOW)
-        logger.debug("Bell ringing")
+        hot.debug('bell_on', "Bell ringing")
     
     def bell_off(self):
         """关闭闹铃"""
         GPIO.output(bell_in1, GPIO.LOW)
         GPIO.output(bell_in2, GPIO.LOW)
-        logger.debug("Bell stopped")
+        hot.debug('bell_off', "Bell stopped")
     
     def set_servo(self, servo, angle):
         """设置舵机角度(0-180度)"""
-        logger.debug("Setting servo to %d°", angle)
+        hot.debug('set_servo', "Setting servo to %d°", angle)
         
         # 尝试获取锁，设置1秒超时
         if not self.servo_lock.acquire(timeout=1.0):
@@ -139,16 +336,22 @@ class CarController:
             return False
             
         try:
-            logger.debug("Servo lock acquired for set_servo()")
-            duty = angle / 18 + 2.5  # 角度转占空比
-            servo.ChangeDutyCycle(duty)
-            time.sleep(0.1)  # 稳定时间
-            servo.ChangeDutyCycle(0)  # 防止抖舵
-            self.last_servo_time = time.time()
+            hot.debug('lock_acquired.set_servo', "Servo lock acquired for set_servo()")
+            self._drive_servos([(servo, angle)])
             return True
         finally:
             self.servo_lock.release()
-            logger.debug("Servo lock released from set_servo()")
+            hot.debug('lock_released.set_servo', "Servo lock released from set_servo()")
+    
+    def _drive_servos(self, targets):
+        """同时转动若干舵机 [(舵机PWM, 角度), ...]，共用一次稳定等待（调用方持有锁）"""
+        for servo, angle in targets:
+            servo.ChangeDutyCycle(angle / 18 + 2.5)  # 角度转占空比
+        time.sleep(0.1)  # 稳定时间
+        for servo, _ in targets:
+            servo.ChangeDutyCycle(0)  # 防止抖舵
+        self.last_servo_time = time.time()
+        self._schedule_save()
     
     def center_servos(self):
         """舵机回中"""
@@ -158,12 +361,12 @@ class CarController:
             return
             
         try:
-            logger.debug("Servo lock acquired for center_servos()")
+            hot.debug('lock_acquired.center_servos', "Servo lock acquired for center_servos()")
+            self.servo1_angle = 135
+            self.servo2_angle = 90
             # 直接调用set_servo，由于使用RLock，嵌套调用不会死锁
             self.set_servo(self.servo1, 135)
             self.set_servo(self.servo2, 90)
-            self.servo1_angle = 135
-            self.servo2_angle = 90
         finally:
             self.servo_lock.release()
             logger.info("Servos centered (lock released)")
@@ -176,17 +379,17 @@ class CarController:
             return
             
         try:
-            logger.debug("Servo lock acquired for move_servo_up()")
+            hot.debug('lock_acquired.move_servo_up', "Servo lock acquired for move_servo_up()")
             if time.time() - self.last_servo_time > 0.2:  # 防抖
                 angle = self.servo1_angle - 25
                 if 90 <= angle <= 180:
                     self.servo1_angle = angle
                     # 由于使用RLock，这里可以安全调用set_servo
                     self.set_servo(self.servo1, self.servo1_angle)
-                    logger.info("Servo1 up to %d°", self.servo1_angle)
+                    hot.info('servo_up', "Servo1 up to %d°", self.servo1_angle)
         finally:
             self.servo_lock.release()
-            logger.debug("Servo lock released from move_servo_up()")
+            hot.debug('lock_released.move_servo_up', "Servo lock released from move_servo_up()")
     
     def move_servo_down(self):
         """摄像头向下"""
@@ -196,17 +399,17 @@ class CarController:
             return
             
         try:
-            logger.debug("Servo lock acquired for move_servo_down()")
+            hot.debug('lock_acquired.move_servo_down', "Servo lock acquired for move_servo_down()")
             if time.time() - self.last_servo_time > 0.2:  # 防抖
                 angle = self.servo1_angle + 25
                 if 90 <= angle <= 180:
                     self.servo1_angle = angle
                     # 由于使用RLock，这里可以安全调用set_servo
                     self.set_servo(self.servo1, self.servo1_angle)
-                    logger.info("Servo1 down to %d°", self.servo1_angle)
+                    hot.info('servo_down', "Servo1 down to %d°", self.servo1_angle)
         finally:
             self.servo_lock.release()
-            logger.debug("Servo lock released from move_servo_down()")
+            hot.debug('lock_released.move_servo_down', "Servo lock released from move_servo_down()")
     
     def move_servo_left(self):
         """摄像头向左"""
@@ -216,17 +419,17 @@ class CarController:
             return
             
         try:
-            logger.debug("Servo lock acquired for move_servo_left()")
+            hot.debug('lock_acquired.move_servo_left', "Servo lock acquired for move_servo_left()")
             if time.time() - self.last_servo_time > 0.2:  # 防抖
                 angle = self.servo2_angle + 30
                 if 45 <= angle <= 135:
                     self.servo2_angle = angle
                     # 由于使用RLock，这里可以安全调用set_servo
                     self.set_servo(self.servo2, self.servo2_angle)
-                    logger.info("Servo2 left to %d°", self.servo2_angle)
+                    hot.info('servo_left', "Servo2 left to %d°", self.servo2_angle)
         finally:
             self.servo_lock.release()
-            logger.debug("Servo lock released from move_servo_left()")
+            hot.debug('lock_released.move_servo_left', "Servo lock released from move_servo_left()")
     
     def move_servo_right(self):
         """摄像头向右"""
@@ -236,17 +439,17 @@ class CarController:
             return
             
         try:
-            logger.debug("Servo lock acquired for move_servo_right()")
+            hot.debug('lock_acquired.move_servo_right', "Servo lock acquired for move_servo_right()")
             if time.time() - self.last_servo_time > 0.2:  # 防抖
                 angle = self.servo2_angle - 30
                 if 45 <= angle <= 135:
                     self.servo2_angle = angle
                     # 由于使用RLock，这里可以安全调用set_servo
                     self.set_servo(self.servo2, self.servo2_angle)
-                    logger.info("Servo2 right to %d°", self.servo2_angle)
+                    hot.info('servo_right', "Servo2 right to %d°", self.servo2_angle)
         finally:
             self.servo_lock.release()
-            logger.debug("Servo lock released from move_servo_right()")
+            hot.debug('lock_released.move_servo_right', "Servo lock released from move_servo_right()")
     
     def get_status(self):
         """获取当前状态"""
@@ -256,7 +459,7 @@ class CarController:
             return "STATUS:ERROR=LOCK_TIMEOUT"
             
         try:
-            logger.debug("Servo lock acquired for get_status()")
+            hot.debug('lock_acquired.get_status', "Servo lock acquired for get_status()")
             return (
                 f"STATUS:MOVE={self.get_current_move()}|"
                 f"SERVO1={self.servo1_angle}|SERVO2={self.servo2_angle}|"
@@ -264,7 +467,94 @@ class CarController:
             )
         finally:
             self.servo_lock.release()
-            logger.debug("Servo lock released from get_status()")
+            hot.debug('lock_released.get_status', "Servo lock released from get_status()")
+    
+    def apply_batch(self, actions):
+        """
+        应用一批已解析的动作（见 parse_batch）
+
+        电机和铃音只取批内最后的状态各写一次 GPIO，不经过舵机锁（STOP 不能排在舵机的
+        稳定等待或后台回中之后）；舵机位移先累加（逐步检查范围，与单条命令相同），
+        在一次加锁中两个舵机同时转动、共用一次稳定等待。
+        返回批内 STATUS 请求的状态字符串，没有请求时返回 None。
+        """
+        move = None
+        bell = None
+        center = False
+        steps = []
+        want_status = False
+        for kind, arg in actions:
+            if kind == 'move' or kind == 'stop':
+                move = arg if kind == 'move' else 'STOP'
+            elif kind == 'bell':
+                bell = arg
+            elif kind == 'servo':
+                if arg == 'CENTER':
+                    center = True
+                    steps = []
+                else:
+                    steps.append(SERVO_STEPS[arg])
+            elif kind == 'status':
+                want_status = True
+
+        if move == 'STOP':
+            self.stop()
+        elif move:
+            direction, speed = move
+            if direction == 'FORWARD':
+                self.forward(speed)
+            elif direction == 'BACKWARD':
+                self.backward(speed)
+            elif direction == 'LEFT':
+                self.left(speed)
+            else:
+                self.right(speed)
+        
+        if bell is not None:
+            if bell:
+                self.bell_on()
+            else:
+                self.bell_off()
+        
+        if not (center or steps or want_status):
+            return None
+        if not self.servo_lock.acquire(timeout=1.0):
+            logger.error("Failed to acquire servo lock within timeout for apply_batch")
+            return "STATUS:ERROR=LOCK_TIMEOUT" if want_status else None
+        try:
+            # 需要转动的舵机编号
+            moved = set()
+            if center:
+                self.servo1_angle = 135
+                self.servo2_angle = 90
+                moved.update((1, 2))
+            if steps and time.time() - self.last_servo_time > 0.2:  # 防抖
+                for servo_id, delta in steps:
+                    if servo_id == 1:
+                        angle = self.servo1_angle + delta
+                        if SERVO1_RANGE[0] <= angle <= SERVO1_RANGE[1]:
+                            self.servo1_angle = angle
+                            moved.add(1)
+                    else:
+                        angle = self.servo2_angle + delta
+                        if SERVO2_RANGE[0] <= angle <= SERVO2_RANGE[1]:
+                            self.servo2_angle = angle
+                            moved.add(2)
+            if moved:
+                targets = []
+                if 1 in moved:
+                    targets.append((self.servo1, self.servo1_angle))
+                if 2 in moved:
+                    targets.append((self.servo2, self.servo2_angle))
+                self._drive_servos(targets)
+                hot.info('servo_batch', "Servos to SERVO1=%d° SERVO2=%d°",
+                         self.servo1_angle, self.servo2_angle)
+            
+            if want_status:
+                return self.get_status()
+            return None
+        finally:
+            self.servo_lock.release()
     
     def get_current_move(self):
         """获取当前运动状态（简化版）"""
@@ -286,21 +576,95 @@ class CarController:
         except Exception as e:
             logger.error("Error during servo cleanup: %s", str(e))
         
+        # 退出前立即写出还在延迟中的舵机状态
+        timer = self.save_timer
+        if timer is not None:
+            timer.cancel()
+            self._save_state()
+        
         GPIO.cleanup()
         logger.info("GPIO cleaned up")
 
 class CarServer:
-    def __init__(self, host='0.0.0.0', port=5000, heartbeat_interval=10):
+    def __init__(self, host='0.0.0.0', port=5000, heartbeat_interval=10, record_path=None,
+                 max_clients=1, fast_start=False, state_path=None, clip_notify=None,
+                 clip_on_bell=False, snapshot_port=None, metrics_path=None, thermal=False):
         self.host = host
         self.port = port
         self.heartbeat_interval = heartbeat_interval
-        self.controller = CarController()
+        # 同时保持的连接数上限，超过时断开最早的连接
+        self.max_clients = max(1, max_clients)
+        # 快速启动：先监听端口，硬件在后台线程中初始化
+        self.fast_start = fast_start
+        self.state_path = state_path
+        self.controller = None
+        self.controller_ready = threading.Event()
+        self.timings = {'imports': _IMPORT_TIME}
+        self._startup_reported = False
+        # 会话录制（可选）
+        self.recorder = SessionRecorder(record_path) if record_path else None
+        # 指标（可选）：命令处理耗时等，与推流进程写到同一个文件（见 metrics.py）
+        self.metrics = None
+        self.metrics_writer = None
+        if metrics_path:
+            self.metrics = Metrics('control')
+            self.metrics.add_collector(self._collect_metrics)
+            self.metrics_writer = MetricsWriter(self.metrics, metrics_path)
+        # 视频片段保存请求发往推流进程（stream_supervisor.py --clip-buffer）的 UDP 地址
+        self.clip_notify = clip_notify
+        self.clip_on_bell = clip_on_bell
+        self.bell_pressed = False
+        self.clip_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM) if clip_notify else None
+        # 推流进程截图服务（stream_supervisor.py --snapshot-listen）的端口
+        self.snapshot_port = snapshot_port
+        # 温控（可选）：温度或 CPU 负载过高时降低客户端的命令发送频率
+        self.send_rate = 0
+        self.governor = None
+        if thermal:
+            self.governor = ThermalGovernor()
+            self.governor.add_listener(self._on_thermal_level)
+            if self.metrics:
+                self.governor.attach(self.metrics)
         self.clients = []
         self.client_lock = threading.Lock()
+        # 命令行 -> 解析后的动作列表（无法识别的命令为 None）
+        self.parse_cache = {}
         self.running = False
         self.heartbeat_thread = None
+        if not fast_start:
+            self._init_controller()
         logger.info("CarServer initialized on %s:%d", host, port)
     
+    def _init_controller(self):
+        """初始化硬件，失败时不继续运行（没有硬件的服务端只会丢弃命令）"""
+        try:
+            self.controller = CarController(self.fast_start, self.state_path)
+        except Exception:
+            logger.exception("Hardware initialization failed")
+            if not self.fast_start:
+                raise
+            # 后台初始化失败：停止监听，主循环随之退出（shutdown 唤醒阻塞中的 accept）
+            self.running = False
+            try:
+                self.server_socket.shutdown(socket.SHUT_RDWR)
+            except Exception:
+                pass
+            return
+        self.timings.update(self.controller.timings)
+        self.timings['hardware_ready'] = time.perf_counter() - _T0
+        self.controller_ready.set()
+        self._report_startup()
+    
+    def _report_startup(self):
+        """端口监听和硬件都就绪后输出一次启动耗时明细"""
+        with self.client_lock:
+            if (self._startup_reported or 'listening' not in self.timings
+                    or 'hardware_ready' not in self.timings):
+                return
+            self._startup_reported = True
+        logger.info("Startup timing (ms): %s", " ".join(
+            f"{name}={seconds * 1000:.1f}" for name, seconds in self.timings.items()))
+    
     def start(self):
         """启动服务器"""
         self.running = True
@@ -308,6 +672,10 @@ class CarServer:
         # 启动心跳线程
         self.heartbeat_thread = threading.Thread(target=self._heartbeat_loop, daemon=True)
         self.heartbeat_thread.start()
+        if self.metrics_writer:
+            self.metrics_writer.start()
+        if self.governor:
+            self.governor.start()
         
         # 创建TCP服务器
         self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -315,7 +683,11 @@ class CarServer:
         try:
             self.server_socket.bind((self.host, self.port))
             self.server_socket.listen(5)
+            self.timings['listening'] = time.perf_counter() - _T0
             logger.info("Server started, listening on %s:%d", self.host, self.port)
+            if self.fast_start:
+                threading.Thread(target=self._init_controller, daemon=True).start()
+            self._report_startup()
             
             while self.running:
                 try:
@@ -325,13 +697,16 @@ class CarServer:
                     
                     # 添加客户端到列表
                     with self.client_lock:
-                        # 断开之前的连接（只允许一个客户端）
-                        for c in self.clients:
+                        # 断开最早的连接（默认只允许一个客户端）
+                        while len(self.clients) >= self.max_clients:
+                            c = self.clients.pop(0)
                             try:
                                 c.close()
                             except:
                                 pass
-                        self.clients = [client_socket]
+                        self.clients.append(client_socket)
+                    if self.send_rate:
+                        self._send_rate(client_socket)
                     
                     # 启动客户端处理线程
                     client_thread = threading.Thread(
@@ -342,6 +717,8 @@ class CarServer:
                     client_thread.start()
                     
                 except Exception as e:
+                    if not self.running:
+                        break
                     logger.error("Error accepting connection: %s", str(e))
                     time.sleep(1)
         
@@ -369,8 +746,19 @@ class CarServer:
         except:
             pass
         
-        # 清理硬件
-        self.controller.cleanup()
+        # 结束录制
+        if self.recorder:
+            self.recorder.close()
+            logger.info("Recorded %d commands to %s", self.recorder.count, self.recorder.path)
+        
+        if self.governor:
+            self.governor.stop()
+        if self.metrics_writer:
+            self.metrics_writer.stop()
+        
+        # 清理硬件（快速启动时硬件可能还在初始化）
+        if self.controller_ready.wait(2.0):
+            self.controller.cleanup()
         logger.info("Server stopped")
     
     def _heartbeat_loop(self):
@@ -381,7 +769,7 @@ class CarServer:
                 for client in self.clients[:]:
                     try:
                         client.sendall(b"HEARTBEAT\n")
-                        logger.debug("Sent heartbeat to client")
+                        hot.debug('heartbeat_tx', "Sent heartbeat to client")
                     except:
                         # 客户端断开
                         try:
@@ -393,6 +781,8 @@ class CarServer:
     
     def _handle_client(self, client_socket, addr):
         """处理客户端连接"""
+        # 未收完整的半行命令（TCP 分包可能把一条命令拆到两次 recv 中）
+        pending = b''
         try:
             while self.running:
                 # 接收数据
@@ -403,13 +793,22 @@ class CarServer:
                 except ConnectionResetError:
                     logger.warning("Client %s disconnected abruptly", addr)
                     break
+                arrival = time.perf_counter()
                 
-                # 处理接收到的命令
-                commands = data.decode().strip().split('\n')
-                for cmd in commands:
+                # 处理接收到的命令（按行切分，最后不完整的一段留到下次）
+                pending += data
+                *lines, pending = pending.split(b'\n')
+                for line in lines:
+                    cmd = line.decode().strip()
                     if not cmd:
                         continue
+                    if self.recorder:
+                        self.recorder.record(cmd, arrival)
                     self._process_command(cmd, client_socket)
+                    if self.metrics:
+                        # 从收到这批数据到处理完这一行（同一批中排在后面的命令包含前面命令的处理时间）
+                        self.metrics.observe('command_ms', (time.perf_counter() - arrival) * 1000)
+                        self.metrics.incr('commands')
         
         except Exception as e:
             logger.error("Client %s error: %s", addr, str(e))
@@ -425,64 +824,149 @@ class CarServer:
             logger.info("Client %s disconnected", addr)
     
     def _process_command(self, cmd, client_socket):
-        """处理单个命令"""
-        logger.debug("Received command: %s", cmd)
+        """处理一行命令（单条命令或用 ';' 分隔的一批命令，整批一次应用）"""
+        hot.debug('command', "Received command: %s", cmd)
+        
+        if not self.controller_ready.is_set():
+            # 快速启动时硬件可能尚未就绪，短暂等待
+            if not self.controller_ready.wait(2.0):
+                logger.error("Hardware not ready, dropping command: %s", cmd)
+                return
+        
+        actions = self._parse(cmd)
+        if actions is None:
+            logger.warning("Unknown command: %s", cmd)
+            return
+        
+        time_request = ('time', None) in actions
+        clip_request = ('clip', None) in actions
+        snapshot_request = ('snapshot', None) in actions
+        if time_request:
+            # 对时请求不经过控制器，尽快回复，减少往返时间中的不确定部分
+            try:
+                client_socket.sendall(f"TIME:{time.time_ns()}\n".encode())
+            except Exception as e:
+                logger.error("Failed to send time response: %s", str(e))
+        if clip_request or self.clip_on_bell:
+            self._check_clip(actions, clip_request)
+        if snapshot_request:
+            self._reply_snapshot(client_socket)
+        if time_request or clip_request or snapshot_request:
+            actions = [a for a in actions if a[0] not in SERVER_ACTIONS]
+            if not actions:
+                return
         
         try:
-            if cmd.startswith("MOVE:"):
-                direction = cmd.split(":")[1].upper()
-                if direction == "FORWARD":
-                    self.controller.forward()
-                elif direction == "BACKWARD":
-                    self.controller.backward()
-                elif direction == "LEFT":
-                    self.controller.left()
-                elif direction == "RIGHT":
-                    self.controller.right()
-            
-            elif cmd == "STOP":
-                self.controller.stop()
-            
-            elif cmd.startswith("SERVO:"):
-                action = cmd.split(":")[1].upper()
-                if action == "UP":
-                    self.controller.move_servo_up()
-                elif action == "DOWN":
-                    self.controller.move_servo_down()
-                elif action == "LEFT":
-                    self.controller.move_servo_left()
-                elif action == "RIGHT":
-                    self.controller.move_servo_right()
-                elif action == "CENTER":
-                    self.controller.center_servos()
-            
-            elif cmd.startswith("BELL:"):
-                state = cmd.split(":")[1].upper()
-                if state == "ON":
-                    self.controller.bell_on()
-                elif state == "OFF":
-                    self.controller.bell_off()
-            
-            elif cmd == "STATUS:REQUEST":
-                status = self.controller.get_status()
+            status = self.controller.apply_batch(actions)
+            if status is not None:
                 try:
                     client_socket.sendall((status + "\n").encode())
-                    logger.debug("Sent status response: %s", status)
+                    hot.debug('status', "Sent status response: %s", status)
                 except Exception as e:
                     logger.error("Failed to send status response: %s", str(e))
-            
-            elif cmd == "HEARTBEAT":
-                # 客户端的心跳，不需要响应
-                logger.debug("Received heartbeat from client")
-            
-            else:
-                logger.warning("Unknown command: %s", cmd)
         
         except Exception as e:
             logger.error("Error processing command '%s': %s", cmd, str(e))
+    
+    def _check_clip(self, actions, save):
+        """CLIP:SAVE 或（--clip-on-bell 时）铃音从关到开时通知推流进程保存片段"""
+        if self.clip_on_bell:
+            for kind, arg in actions:
+                if kind == 'bell':
+                    if arg and not self.bell_pressed:
+                        save = True
+                    self.bell_pressed = arg
+        if not save:
+            return
+        if not self.clip_socket:
+            hot.warning('clip', "Clip save requested but --clip-notify is not set")
+            return
+        try:
+            self.clip_socket.sendto(b"CLIP:SAVE", self.clip_notify)
+            logger.info("Clip save requested")
+        except OSError as e:
+            logger.error("Failed to send clip request: %s", str(e))
+    
+    def _reply_snapshot(self, client_socket):
+        """回复截图地址，主机取客户端连入的本机地址；图片由客户端直接从推流进程获取"""
+        if not self.snapshot_port:
+            hot.warning('snapshot', "Snapshot requested but --snapshot-port is not set")
+            return
+        try:
+            host = client_socket.getsockname()[0]
+            client_socket.sendall(f"SNAPSHOT:http://{host}:{self.snapshot_port}/snapshot.jpg\n".encode())
+        except Exception as e:
+            logger.error("Failed to send snapshot response: %s", str(e))
+    
+    def _on_thermal_level(self, level, step):
+        """温控级别变化时通知所有客户端新的发送频率上限"""
+        self.send_rate = THERMAL_SEND_RATES[min(level, len(THERMAL_SEND_RATES) - 1)]
+        logger.info("Client send rate limit: %s", f"{self.send_rate} Hz" if self.send_rate else "none")
+        with self.client_lock:
+            for client in self.clients:
+                self._send_rate(client)
+    
+    def _send_rate(self, client_socket):
+        try:
+            client_socket.sendall(f"RATE:{self.send_rate}\n".encode())
+        except Exception as e:
+            # 断开的连接由心跳线程清理
+            logger.error("Failed to send rate limit: %s", str(e))
+    
+    def _collect_metrics(self, metrics):
+        metrics.set('clients', len(self.clients))
+        metrics.set('hardware_ready', self.controller_ready.is_set())
+    
+    def _parse(self, cmd):
+        """解析一行命令（带缓存，相同的命令行只解析一次）"""
+        actions = self.parse_cache.get(cmd)
+        if actions is None and cmd not in self.parse_cache:
+            if len(self.parse_cache) >= PARSE_CACHE_SIZE:
+                self.parse_cache.clear()
+            actions = self.parse_cache[cmd] = parse_batch(cmd)
+        return actions
+
+_IMPORT_TIME = time.perf_counter() - _T0
 
 if __name__ == "__main__":
-    server = CarServer()
+    # 配置日志（队列 + 后台线程写出，CAR_LOG_LEVEL 控制级别）
+    setup_async_logging()
+    import argparse
+    parser = argparse.ArgumentParser(description="小车控制服务端")
+    parser.add_argument('--host', default='0.0.0.0', help="监听地址")
+    parser.add_argument('--port', type=int, default=5000, help="监听端口")
+    parser.add_argument('--record', metavar='PATH', help="录制收到的命令到文件（用 replay.py 回放）")
+    parser.add_argument('--max-clients', type=int, default=1, help="同时保持的连接数（默认 1）")
+    parser.add_argument('--fast-start', action='store_true',
+                        help="先监听端口，硬件在后台初始化，舵机从状态文件恢复或异步回中")
+    parser.add_argument('--state-file', metavar='PATH',
+                        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'car_state.json'),
+                        help="舵机角度持久化文件（默认 car_state.json）")
+    parser.add_argument('--clip-notify', metavar='HOST:PORT',
+                        help="收到 CLIP:SAVE 时通知推流进程保存视频片段（如 127.0.0.1:33100）")
+    parser.add_argument('--clip-on-bell', action='store_true', help="按下铃音时也保存视频片段")
+    parser.add_argument('--metrics', metavar='PATH',
+                        help="把命令处理耗时等指标追加到 PATH（JSON 行，可与 stream_supervisor.py --metrics 共用）")
+    parser.add_argument('--snapshot-port', type=int,
+                        help="推流进程截图服务的端口，收到 SNAPSHOT:REQUEST 时回复截图地址")
+    parser.add_argument('--thermal', action='store_true',
+                        help="SoC 温度或 CPU 负载过高时分级降低客户端的命令发送频率（RATE:<Hz>）")
+    args = parser.parse_args()
+
+    clip_notify = None
+    if args.clip_notify:
+        clip_host, _, clip_port = args.clip_notify.rpartition(':')
+        clip_notify = (clip_host, int(clip_port))
+
+    try:
+        server = CarServer(args.host, args.port, record_path=args.record,
+                           max_clients=args.max_clients, fast_start=args.fast_start,
+                           state_path=args.state_file, clip_notify=clip_notify,
+                           clip_on_bell=args.clip_on_bell, snapshot_port=args.snapshot_port,
+                           metrics_path=args.metrics, thermal=args.thermal)
+    except Exception:
+        # 原因已在 _init_controller 中记录
+        sys.exit(1)
     try:
         server.start()
     except KeyboardInterrupt:
@@ -490,3 +974,5 @@ if __name__ == "__main__":
     except Exception as e:
         logger.exception("Unexpected error")
         server.stop()
+    if not server.controller_ready.is_set():
+        sys.exit(1)
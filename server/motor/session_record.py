@@ -0,0 +1,83 @@
+#!/usr/bin/python3
+"""
+控制会话录制
+
+把服务端收到的每条命令连同到达时间写入紧凑的二进制文件，供 replay.py 回放。
+
+文件格式:
+    文件头:  b'CARREC1\\n' + <d 录制开始的 Unix 时间>
+    每条记录: <I 距上一条的微秒数> <H 命令长度> <命令 UTF-8 字节>
+"""
+import struct
+import threading
+import time
+
+MAGIC = b'CARREC1\n'
+_HEADER = struct.Struct('<d')
+_RECORD = struct.Struct('<IH')
+_MAX_DELTA_US = 0xFFFFFFFF
+
+
+class SessionRecorder:
+    """命令录制器（线程安全，写入带缓冲）"""
+
+    def __init__(self, path, buffer_size=64 * 1024):
+        self.path = path
+        self.file = open(path, 'wb', buffering=buffer_size)
+        self.lock = threading.Lock()
+        self.start_time = time.time()
+        self.last_us = 0
+        self.count = 0
+        self.file.write(MAGIC)
+        self.file.write(_HEADER.pack(self.start_time))
+        self._t0 = time.perf_counter()
+
+    def record(self, cmd, arrival=None):
+        """
+        记录一条命令
+
+        arrival 为 time.perf_counter() 时间戳，未指定时取当前时间
+        """
+        if arrival is None:
+            arrival = time.perf_counter()
+        data = cmd.encode()[:0xFFFF]
+        with self.lock:
+            if self.file is None:
+                return
+            now_us = max(int((arrival - self._t0) * 1e6), self.last_us)
+            delta = min(now_us - self.last_us, _MAX_DELTA_US)
+            self.last_us = now_us
+            self.file.write(_RECORD.pack(delta, len(data)))
+            self.file.write(data)
+            self.count += 1
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+def read_session(path):
+    """
+    读取录制文件
+
+    返回 (录制开始的 Unix 时间, [(相对秒数, 命令), ...])
+    """
+    commands = []
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a session recording")
+        start_time, = _HEADER.unpack(f.read(_HEADER.size))
+        t_us = 0
+        while True:
+            head = f.read(_RECORD.size)
+            if len(head) < _RECORD.size:
+                break
+            delta, length = _RECORD.unpack(head)
+            data = f.read(length)
+            if len(data) < length:
+                break  # 录制中断导致的残缺记录
+            t_us += delta
+            commands.append((t_us / 1e6, data.decode(errors='replace')))
+    return start_time, commands
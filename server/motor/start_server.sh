@@ -9,6 +9,10 @@ SCRIPT_NAME="server.py"
 LOG_FILE="$SCRIPT_DIR/server.log"
 PID_FILE="$SCRIPT_DIR/server.pid"
 PORT=5000
+# 传给 server.py 的额外参数，默认不加；例如快速启动（先监听端口，硬件后台初始化，
+# 舵机从 car_state.json 恢复，看门狗重启时尽快恢复可控）:
+#   SERVER_ARGS="--fast-start" ./start_server.sh start
+SERVER_ARGS="${SERVER_ARGS:-}"
 
 # 检查服务是否正在运行
 is_running() {
@@ -39,7 +43,7 @@ start() {
     fi
     
     # 使用nohup启动服务
-    nohup python3 "$SCRIPT_NAME" >> "$LOG_FILE" 2>&1 &
+    nohup python3 "$SCRIPT_NAME" $SERVER_ARGS >> "$LOG_FILE" 2>&1 &
     echo $! > "$PID_FILE"
     
     # 等待服务启动
@@ -0,0 +1,257 @@
+#!/usr/bin/python3
+"""
+温度 / CPU 负载调速
+
+定期读取 SoC 温度（/sys/class/thermal/thermal_zone0/temp，毫摄氏度）和 CPU 占用率
+（/proc/stat），在固件降频（80°C 起）之前分级降低负载：
+    推流进程（stream_supervisor.py --thermal）每升一级把画质档位上限降一档
+    控制服务端（server.py --thermal）每升一级降低客户端的命令发送频率（RATE:<Hz>）
+
+升级：温度超过该级的进入温度、CPU 持续满载或固件已经在降频时，每次采样最多升一级。
+降级：温度低于当前级别的进入温度减去回差、CPU 不再满载，并保持 RESTORE_HOLD 秒后才降一级；
+降级后很快又升级时加倍下次的等待时间，避免在两级之间来回振荡。
+
+两个进程各自运行一个调速器，读取同样的传感器，得到的级别一致。
+sysfs / proc 的根目录可以用 CAR_SYSFS_ROOT / CAR_PROC_ROOT 指向一个模拟目录，
+没有树莓派时也能验证（见 README）:
+    python3 server/motor/thermal_governor.py                          # 查看当前读数和级别
+    python3 server/motor/thermal_governor.py --sysfs-root /tmp/fakesys --interval 0.5 --restore-hold 3
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+import threading
+
+from log_pipeline import setup_async_logging
+
+logger = logging.getLogger('ThermalGovernor')
+
+SYSFS_ROOT = os.environ.get('CAR_SYSFS_ROOT', '/sys')
+PROC_ROOT = os.environ.get('CAR_PROC_ROOT', '/proc')
+TEMP_PATH = 'class/thermal/thermal_zone0/temp'
+# 树莓派固件的降频状态（与 vcgencmd get_throttled 相同），非树莓派内核没有这个文件
+THROTTLED_PATH = 'devices/platform/soc/soc:firmware/get_throttled'
+# get_throttled 中表示"当前正在限频"的位：ARM 频率受限、正在降频、达到软温度上限
+THROTTLED_NOW = (1 << 1) | (1 << 2) | (1 << 3)
+
+SAMPLE_INTERVAL = 2.0
+LEVEL_TEMPS = (70.0, 75.0, 79.0)   # 进入第 1/2/3 级的温度（°C），固件在 80°C 开始降频
+HYSTERESIS = 5.0                   # 降级的回差（°C）
+LOAD_HIGH = 0.9                    # CPU 占用率超过 90% 视为满载
+LOAD_LOW = 0.75                    # 降级要求 CPU 占用率低于 75%
+LOAD_SAMPLES = 3                   # 连续几次满载才升级（温度正常时最多升到第 1 级）
+RESTORE_HOLD = 30.0                # 条件满足多久后降一级（秒）
+RESTORE_HOLD_MAX = 300.0
+
+
+class SysfsSensors:
+    """读取温度、CPU 占用率和固件降频状态，读不到的值返回 None"""
+
+    def __init__(self, sysfs_root=SYSFS_ROOT, proc_root=PROC_ROOT):
+        self.temp_path = os.path.join(sysfs_root, TEMP_PATH)
+        self.throttled_path = os.path.join(sysfs_root, THROTTLED_PATH)
+        self.stat_path = os.path.join(proc_root, 'stat')
+        self.prev_cpu = None   # 上次读到的 (忙碌, 总计) jiffies
+
+    def temperature(self):
+        try:
+            with open(self.temp_path) as f:
+                return int(f.read().strip()) / 1000
+        except (OSError, ValueError):
+            return None
+
+    def throttled(self):
+        try:
+            with open(self.throttled_path) as f:
+                return bool(int(f.read().strip(), 16) & THROTTLED_NOW)
+        except (OSError, ValueError):
+            return None
+
+    def cpu_load(self):
+        """与上次调用之间的 CPU 占用率（0-1），第一次调用返回 None"""
+        try:
+            with open(self.stat_path) as f:
+                fields = [int(v) for v in f.readline().split()[1:]]
+        except (OSError, ValueError):
+            return None
+        # user nice system idle iowait irq softirq steal ...（guest 已计入 user）
+        total = sum(fields[:8])
+        busy = total - sum(fields[3:5])
+        prev, self.prev_cpu = self.prev_cpu, (busy, total)
+        if prev is None or total <= prev[1]:
+            return None
+        return (busy - prev[0]) / (total - prev[1])
+
+
+class ThermalPolicy:
+    """
+    升降级决策，只依赖输入的采样值，便于用合成数据验证
+
+    update() 返回 +1（升一级）、-1（降一级）或 0，当前级别为 level（0 为不限制）。
+    """
+
+    def __init__(self, level_temps=LEVEL_TEMPS, hysteresis=HYSTERESIS, load_high=LOAD_HIGH,
+                 load_low=LOAD_LOW, load_samples=LOAD_SAMPLES, restore_hold=RESTORE_HOLD,
+                 restore_hold_max=RESTORE_HOLD_MAX):
+        self.level_temps = level_temps
+        self.hysteresis = hysteresis
+        self.load_high = load_high
+        self.load_low = load_low
+        self.load_samples = load_samples
+        self.initial_restore_hold = restore_hold
+        self.restore_hold = restore_hold
+        self.restore_hold_max = restore_hold_max
+        self.level = 0
+        self.busy = 0
+        self.cool_since = None
+        self.last_restore = None
+
+    @property
+    def max_level(self):
+        return len(self.level_temps)
+
+    def update(self, temp, load, throttled, now):
+        target = 0 if temp is None else sum(1 for t in self.level_temps if temp >= t)
+        self.busy = self.busy + 1 if load is not None and load >= self.load_high else 0
+        if self.busy >= self.load_samples:
+            target = max(target, 1)
+        if throttled:
+            target = self.max_level
+
+        if target > self.level:
+            if self.last_restore is not None and now - self.last_restore < self.restore_hold:
+                # 刚降级就又升级：下次多等一倍时间
+                self.restore_hold = min(self.restore_hold_max, self.restore_hold * 2)
+            self.last_restore = None
+            self.level += 1
+            self.cool_since = None
+            return 1
+
+        if self.last_restore is not None and now - self.last_restore >= self.restore_hold:
+            # 降级后稳定运行，恢复初始等待时间
+            self.restore_hold = self.initial_restore_hold
+            self.last_restore = None
+        if self.level == 0:
+            return 0
+        cool = (not throttled
+                and (temp is None or temp < self.level_temps[self.level - 1] - self.hysteresis)
+                and (load is None or load < self.load_low))
+        if not cool:
+            self.cool_since = None
+            return 0
+        if self.cool_since is None:
+            self.cool_since = now
+        if now - self.cool_since < self.restore_hold:
+            return 0
+        self.level -= 1
+        self.cool_since = None
+        self.last_restore = now
+        return -1
+
+
+class ThermalGovernor:
+    """
+    按 ThermalPolicy 的决策调整级别，级别变化时调用 add_listener 注册的 callback(level, step)；
+    最近一次采样保存在 stats
+    """
+
+    def __init__(self, sensors=None, policy=None, interval=SAMPLE_INTERVAL):
+        self.sensors = sensors or SysfsSensors()
+        self.policy = policy or ThermalPolicy()
+        self.interval = interval
+        self.listeners = []
+        self.stats = {'level': 0, 'temp_c': None, 'cpu_load': None, 'throttled': None}
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    @property
+    def level(self):
+        return self.policy.level
+
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+
+    def attach(self, metrics):
+        """把温度、CPU 占用率和级别加入 metrics.Metrics 的采样"""
+        metrics.add_collector(self._collect)
+
+    def start(self):
+        if self.sensors.temperature() is None:
+            logger.warning("读不到 SoC 温度（%s），只按 CPU 负载调速", self.sensors.temp_path)
+        self.sensors.cpu_load()
+        self.thread = threading.Thread(target=self.run, name='thermal-governor', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            self.sample()
+
+    def sample(self, now=None):
+        """采样一次，返回本次的级别变化"""
+        if now is None:
+            now = time.monotonic()
+        temp = self.sensors.temperature()
+        load = self.sensors.cpu_load()
+        throttled = self.sensors.throttled()
+        step = self.policy.update(temp, load, throttled, now)
+        self.stats = {'level': self.policy.level,
+                      'temp_c': None if temp is None else round(temp, 1),
+                      'cpu_load': None if load is None else round(load, 3),
+                      'throttled': throttled}
+        if step:
+            logger.warning("温控%s到第 %d 级（温度 %s°C，CPU %s%s）",
+                           '升' if step > 0 else '降', self.policy.level,
+                           '-' if temp is None else f'{temp:.1f}',
+                           '-' if load is None else f'{load * 100:.0f}%',
+                           '，固件已降频' if throttled else '')
+            for callback in self.listeners:
+                try:
+                    callback(self.policy.level, step)
+                except Exception:
+                    logger.exception("温控回调出错")
+        return step
+
+    def _collect(self, metrics):
+        for name, value in self.stats.items():
+            metrics.set(name if name != 'level' else 'thermal_level', value)
+
+
+def main():
+    setup_async_logging()
+    parser = argparse.ArgumentParser(description="查看温度、CPU 负载和温控级别（可指向模拟的 sysfs 目录）")
+    parser.add_argument('--sysfs-root', default=SYSFS_ROOT, help="sysfs 根目录")
+    parser.add_argument('--proc-root', default=PROC_ROOT, help="proc 根目录")
+    parser.add_argument('--interval', type=float, default=SAMPLE_INTERVAL, help="采样间隔（秒）")
+    parser.add_argument('--restore-hold', type=float, default=RESTORE_HOLD,
+                        help="降级前条件需要保持的时间（秒）")
+    args = parser.parse_args()
+
+    governor = ThermalGovernor(SysfsSensors(args.sysfs_root, args.proc_root),
+                               ThermalPolicy(restore_hold=args.restore_hold), args.interval)
+    governor.sensors.cpu_load()
+    print(f"{'时间':8s} {'温度':>6s} {'CPU':>5s} {'降频':>4s} {'级别':>4s}")
+    try:
+        while True:
+            time.sleep(args.interval)
+            step = governor.sample()
+            s = governor.stats
+            temp = '-' if s['temp_c'] is None else f"{s['temp_c']:.1f}"
+            load = '-' if s['cpu_load'] is None else f"{s['cpu_load'] * 100:.0f}%"
+            throttled = '-' if s['throttled'] is None else ('是' if s['throttled'] else '否')
+            mark = '  ↑' if step > 0 else '  ↓' if step < 0 else ''
+            print(f"{time.strftime('%H:%M:%S')} {temp:>6s} {load:>5s} {throttled:>4s} {s['level']:>4d}{mark}",
+                  flush=True)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,358 @@
+#!/usr/bin/python3
+"""
+H.264 多路转发
+
+编码器输出只读一次，由 StreamSupervisor 按 Annex-B 起始码切成 NAL 单元（memoryview 切片，
+不复制数据，所有 NAL 回调共用一次切分），分发给多个 TCP / UDP 观看端。每个观看端有独立的发送线程和有界队列：
+
+    - 新观看端从缓存的最新 SPS/PPS 和当前 GOP（最近的 IDR 帧起）开始，立即可以解码
+    - 观看端跟不上时清空它的队列，丢弃数据直到下一个 IDR 帧，不影响其他观看端
+
+由 stream_supervisor.py 的 relay 模式使用:
+    python3 stream_supervisor.py relay 0.0.0.0:33064 --udp-viewer 192.168.1.5:5600
+    ffplay -fflags nobuffer -f h264 tcp://<小车IP>:33064
+"""
+import os
+import sys
+import socket
+import logging
+import threading
+from collections import deque
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'motor'))
+from log_pipeline import HotLogger
+
+logger = logging.getLogger('NalRelay')
+hot = HotLogger(logger, rate=5)
+
+START_CODE = b'\x00\x00\x01'
+NAL_SPS = 7
+NAL_PPS = 8
+NAL_IDR = 5
+VIEWER_QUEUE_BYTES = 512 * 1024   # 每个观看端最多积压的字节数
+GOP_CACHE_BYTES = 1024 * 1024     # 当前 GOP 超过该大小时不再缓存，新观看端等下一个 IDR
+SEND_TIMEOUT = 10.0               # TCP 观看端发送阻塞超过该时间视为断开
+# TCP 观看端的发送缓冲区：固定大小，积压主要留在有界队列里，由丢帧逻辑控制延迟
+VIEWER_SNDBUF = 64 * 1024
+UDP_PAYLOAD = 1400
+
+
+class NalSplitter:
+    """
+    把字节流切成以起始码开头的片段
+
+    feed() 返回 [(view, nal_type), ...]：view 以起始码开头时 nal_type 为 NAL 类型，
+    否则为 None，表示接续上一个 NAL（NAL 跨越了两次读取）。
+    片段都是输入数据的 memoryview，只有跨读取边界的起始码（最多几个字节）会被暂存复制。
+    IDR 片段的 nal_type 为 NAL_IDR 且是一帧的第一个 slice 时记为 'idr'。
+    """
+
+    def __init__(self):
+        self.pending = b''
+
+    def feed(self, chunk):
+        data = self.pending + chunk if self.pending else chunk
+        view = memoryview(data)
+        end = len(data)
+
+        # 末尾可能是不完整的起始码，或起始码之后还不足两个字节（NAL 头和 slice 首字节），暂存到下次
+        keep = end
+        tail = data.rfind(START_CODE, max(0, end - 5))
+        if tail >= 0 and end - tail < 5:
+            keep = tail - 1 if tail > 0 and data[tail - 1] == 0 else tail
+        else:
+            while keep > max(0, end - 3) and data[keep - 1] == 0:
+                keep -= 1
+        self.pending = bytes(view[keep:])
+
+        pieces = []
+        pos = 0
+        found = data.find(START_CODE, 0, keep)
+        while pos < keep:
+            if found < 0:
+                pieces.append((view[pos:keep], None))
+                break
+            begin = found - 1 if found > pos and data[found - 1] == 0 else found
+            if begin > pos:
+                pieces.append((view[pos:begin], None))
+            nxt = data.find(START_CODE, found + 3, keep)
+            stop = keep if nxt < 0 else (nxt - 1 if data[nxt - 1] == 0 else nxt)
+            header = data[found + 3]
+            nal_type = header & 0x1f
+            if nal_type == NAL_IDR and data[found + 4] & 0x80:
+                # first_mb_in_slice 为 0（ue(v) 编码的首位为 1）：一帧的第一个 slice
+                nal_type = 'idr'
+            pieces.append((view[begin:stop], nal_type))
+            pos = stop
+            found = nxt
+        return pieces
+
+
+class ParameterSets:
+    """
+    最新的 SPS / PPS（带起始码），由 StreamSupervisor 在把片段交给 NAL 回调之前更新
+
+    参数集要到下一个 NAL 开始时才算完整（可能跨越多次读取），所以回调收到 PPS 片段时
+    SPS 已经更新，收到 IDR 片段时 SPS 和 PPS 都已更新。
+    current:    正在接收的 NAL 是 SPS / PPS 时为其类型，否则为 None（用于识别接续片段）
+    generation: SPS 内容变化（编码器重启或切换档位）的次数，回调据此丢弃旧参数下的缓存
+    """
+
+    def __init__(self):
+        self.sps = None
+        self.pps = None
+        self.current = None
+        self.generation = 0
+        self.parts = None
+
+    def update(self, piece, nal_type):
+        if nal_type is None:
+            if self.current is not None:
+                self.parts.append(bytes(piece))
+            return
+        if self.current is not None:
+            self._finish()
+        if nal_type == NAL_SPS or nal_type == NAL_PPS:
+            self.current = nal_type
+            self.parts = [bytes(piece)]
+
+    def reset(self):
+        """编码器重启时丢掉接收到一半的参数集；完整的 SPS / PPS 保留，由新编码器的输出覆盖"""
+        self.current = None
+        self.parts = None
+
+    def _finish(self):
+        data = b''.join(self.parts)
+        if self.current == NAL_SPS:
+            if data != self.sps:
+                self.sps = data
+                self.generation += 1
+        else:
+            self.pps = data
+        self.current = None
+        self.parts = None
+
+
+class Viewer:
+    """观看端基类：有界队列 + 发送线程，子类实现 _send"""
+
+    def __init__(self, name, max_bytes=VIEWER_QUEUE_BYTES):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.queue = deque()
+        self.queued = 0
+        self.cond = threading.Condition()
+        self.closed = False
+        self.synced = False   # 由 NalRelay 维护：已从关键帧开始发送
+        self.sent_bytes = 0
+        self.drops = 0
+        self.on_close = None
+
+    def offer(self, pieces, size):
+        """加入队列；放不下时清空队列并返回 False（之后需要从下一个 IDR 重新开始）"""
+        with self.cond:
+            if self.closed:
+                return False
+            if self.queued + size > self.max_bytes:
+                self.queue.clear()
+                self.queued = 0
+                self.drops += 1
+                return False
+            self.queue.extend(pieces)
+            self.queued += size
+            self.cond.notify()
+        return True
+
+    def start(self):
+        threading.Thread(target=self._run, name=f'relay-{self.name}', daemon=True).start()
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.queue.clear()
+            self.queued = 0
+            self.cond.notify()
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self.queue and not self.closed:
+                    self.cond.wait()
+                if self.closed:
+                    break
+                piece = self.queue.popleft()
+                self.queued -= len(piece)
+            try:
+                self._send(piece)
+            except OSError as e:
+                logger.info("观看端 %s 断开: %s", self.name, e)
+                break
+            self.sent_bytes += len(piece)
+        self.close()
+        self._cleanup()
+        if self.on_close:
+            self.on_close(self)
+
+    def _send(self, piece):
+        raise NotImplementedError
+
+    def _cleanup(self):
+        pass
+
+
+class TcpViewer(Viewer):
+    def __init__(self, sock, peer, max_bytes=VIEWER_QUEUE_BYTES):
+        super().__init__(f'{peer[0]}:{peer[1]}', max_bytes)
+        self.sock = sock
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, VIEWER_SNDBUF)
+        sock.settimeout(SEND_TIMEOUT)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def _send(self, piece):
+        self.sock.sendall(piece)
+
+    def _cleanup(self):
+        self.sock.close()
+
+
+class UdpViewer(Viewer):
+    """固定地址的 UDP 观看端；没有连接状态，发送失败只记录日志"""
+
+    def __init__(self, sock, address, max_bytes=VIEWER_QUEUE_BYTES):
+        super().__init__(f'udp://{address[0]}:{address[1]}', max_bytes)
+        self.sock = sock
+        self.address = address
+
+    def _send(self, piece):
+        try:
+            for offset in range(0, len(piece), UDP_PAYLOAD):
+                self.sock.sendto(piece[offset:offset + UDP_PAYLOAD], self.address)
+        except OSError as e:
+            hot.warning(self.name, "UDP 发送失败 %s: %s", self.name, e)
+
+
+class NalRelay:
+    """
+    H.264 转发器
+
+    feed_nal(piece, nal_type) 作为 StreamSupervisor 的 NAL 回调，在读取线程中调用；
+    params 为 StreamSupervisor 维护的 ParameterSets；
+    listen 为 TCP 观看端的监听地址 (host, port)，udp_viewers 为固定推送的地址列表。
+    """
+
+    def __init__(self, params, listen=None, udp_viewers=(), max_bytes=VIEWER_QUEUE_BYTES):
+        self.params = params
+        self.listen = listen
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.viewers = ()
+        self.generation = 0     # 当前 GOP 缓存对应的 SPS 版本
+        self.gop = None         # 最近 IDR 起的所有片段（bytes 副本），None 表示没有可用的缓存
+        self.gop_bytes = 0
+        self.server = None
+        self.stop_event = threading.Event()
+
+        self.udp_sock = None
+        if udp_viewers:
+            self.udp_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        for address in udp_viewers:
+            self.add_viewer(UdpViewer(self.udp_sock, address, max_bytes))
+
+    # ===== 观看端管理 =====
+
+    def add_viewer(self, viewer):
+        viewer.on_close = self.remove_viewer
+        with self.lock:
+            sps, pps = self.params.sps, self.params.pps
+            if self.gop is not None and sps and pps:
+                cached = [sps, pps] + self.gop
+                size = sum(len(p) for p in cached)
+                # 放不下整个 GOP 时等下一个 IDR
+                if size <= viewer.max_bytes:
+                    viewer.synced = viewer.offer(cached, size)
+            self.viewers = self.viewers + (viewer,)
+        viewer.start()
+        logger.info("观看端 %s 加入（共 %d 个）", viewer.name, len(self.viewers))
+
+    def remove_viewer(self, viewer):
+        with self.lock:
+            self.viewers = tuple(v for v in self.viewers if v is not viewer)
+        viewer.close()
+
+    def stats(self):
+        return {v.name: {'sent_bytes': v.sent_bytes, 'queued_bytes': v.queued,
+                         'drops': v.drops, 'synced': v.synced}
+                for v in self.viewers}
+
+    # ===== 数据 =====
+
+    def feed_nal(self, piece, nal_type):
+        with self.lock:
+            self._update_cache(piece, nal_type)
+            size = len(piece)
+            for viewer in self.viewers:
+                if viewer.synced:
+                    if not viewer.offer((piece,), size):
+                        viewer.synced = False
+                        hot.warning(viewer.name, "观看端 %s 跟不上，丢弃到下一个关键帧", viewer.name)
+                elif nal_type == 'idr':
+                    sps, pps = self.params.sps, self.params.pps
+                    if sps and pps:
+                        viewer.synced = viewer.offer((sps, pps, piece), len(sps) + len(pps) + size)
+
+    def _update_cache(self, piece, nal_type):
+        params = self.params
+        if params.generation != self.generation:
+            # 参数变化（编码器重启或切换档位），旧 GOP 不能再用
+            self.generation = params.generation
+            self.gop = None
+        if params.current is not None:
+            # SPS / PPS 由 params 单独保存，不进 GOP 缓存
+            return
+        # 片段是整块读取数据的 memoryview，缓存一整个 GOP 时会让每个 64 KB 的块都活着，
+        # 所以复制出片段本身；gop_bytes 因此也是实际占用的内存
+        piece = bytes(piece)
+        if nal_type == 'idr':
+            self.gop = [piece]
+            self.gop_bytes = len(piece)
+        else:
+            self._append_gop(piece)
+
+    def _append_gop(self, piece):
+        if self.gop is None:
+            return
+        self.gop_bytes += len(piece)
+        if self.gop_bytes > GOP_CACHE_BYTES:
+            self.gop = None
+        else:
+            self.gop.append(piece)
+
+    # ===== TCP 监听 =====
+
+    def start(self):
+        if not self.listen:
+            return
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind(self.listen)
+        self.server.listen(8)
+        self.server.settimeout(0.5)
+        threading.Thread(target=self._accept_loop, name='relay-accept', daemon=True).start()
+        logger.info("转发监听 %s:%d", *self.listen)
+
+    def stop(self):
+        self.stop_event.set()
+        for viewer in self.viewers:
+            viewer.close()
+
+    def _accept_loop(self):
+        while not self.stop_event.is_set():
+            try:
+                sock, peer = self.server.accept()
+            except socket.timeout:
+                continue
+            except OSError as e:
+                logger.error("接受连接失败: %s", e)
+                break
+            self.add_viewer(TcpViewer(sock, peer, self.max_bytes))
+        self.server.close()
@@ -0,0 +1,223 @@
+#!/usr/bin/python3
+"""
+H.264 RTP 打包（RFC 6184，packetization-mode=1）
+
+把编码器输出的 NAL 单元打成不超过 MTU 的 RTP 包经 UDP 发送：
+    - 小 NAL 单独成包（Single NAL Unit Packet）
+    - 大 NAL 用 FU-A 分片
+    - 时间戳为 90kHz 时钟，取每个访问单元（一帧）第一个 NAL 到达的时刻
+    - 每帧最后一个包设置 marker 位
+
+RTP 头部放在预先分配的缓冲区里，负载是编码器数据的 memoryview 切片，
+用 sendmsg 一次发出，不拼接复制。
+
+NAL 的结尾一般要等到下一个起始码出现才能确定；StreamSupervisor 一次读取以完整的
+访问单元结尾时调用 flush()，这一帧的最后一个 NAL 立即发出并设置 marker 位，
+不用等到下一帧开始（否则多出一个帧间隔的延迟）。
+
+由 stream_supervisor.py 的 rtp 模式使用:
+    python3 stream_supervisor.py rtp 192.168.1.5:5004 --sdp stream.sdp
+    ffplay -protocol_whitelist file,udp,rtp -fflags nobuffer stream.sdp   # 接收端
+"""
+import os
+import sys
+import time
+import base64
+import random
+import socket
+import struct
+import logging
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'motor'))
+from log_pipeline import HotLogger
+from nal_relay import NAL_SPS, NAL_PPS, NAL_IDR
+
+logger = logging.getLogger('RtpPacketizer')
+hot = HotLogger(logger, rate=5)
+
+RTP_MTU = 1400          # RTP 包（含 12 字节头）的最大长度
+PAYLOAD_TYPE = 96       # 动态负载类型，与 SDP 中一致
+CLOCK_RATE = 90000
+RTP_HEADER = struct.Struct('!BBHII')
+FU_A = 28
+NAL_SEI = 6
+NAL_AUD = 9
+# 出现在上一个 VCL NAL 之后时表示新的访问单元开始
+AU_START_TYPES = (NAL_SEI, NAL_SPS, NAL_PPS, NAL_AUD)
+
+
+def _is_vcl(nal_type):
+    return 1 <= nal_type <= 5
+
+
+def _header_offset(piece):
+    """起始码长度（3 或 4）"""
+    return 4 if piece[2] == 0 else 3
+
+
+class RtpPacketizer:
+    """
+    feed_nal(piece, nal_type) / flush() 作为 StreamSupervisor 的 NAL 回调，在读取线程中调用
+
+    params:   StreamSupervisor 的 ParameterSets，SDP 中的 SPS/PPS 取自这里
+    address:  接收端 (host, port)
+    sdp_path: 收到 SPS/PPS 后写出 SDP 文件，参数变化时重写
+    """
+
+    def __init__(self, params, address, mtu=RTP_MTU, payload_type=PAYLOAD_TYPE, sdp_path=None):
+        self.params = params
+        self.address = address
+        self.mtu = mtu
+        self.payload_type = payload_type
+        self.sdp_path = sdp_path
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+        self.ssrc = random.getrandbits(32)
+        self.seq = random.getrandbits(16)
+        self.ts_base = random.getrandbits(32)
+        self.clock_start = time.monotonic()
+        self.timestamp = self.ts_base
+
+        # 预分配的头部：RTP 头 12 字节 + FU indicator / FU header 2 字节
+        self.header = bytearray(RTP_HEADER.size + 2)
+        self.header_view = memoryview(self.header)
+
+        # 正在接收的 NAL（起始码之后的部分），等下一个起始码出现时发出
+        self.current = []
+        self.current_type = None
+        self.sdp_params = (None, None)   # 写出 SDP 时的 (SPS, PPS)
+
+        self.packets = 0
+        self.bytes_sent = 0
+
+    # ===== 数据 =====
+
+    def feed_nal(self, piece, nal_type):
+        if nal_type is None:
+            if self.current:
+                self.current.append(piece)
+            elif self.current_type is not None:
+                # flush() 之后上一个 NAL 还有数据：读取没有停在访问单元的结尾，这一帧已经发出的部分不完整
+                hot.warning('truncated', "NAL 在 flush 之后还有数据，丢弃 %d 字节", len(piece))
+            return
+        nal_type = NAL_IDR if nal_type == 'idr' else nal_type
+        offset = _header_offset(piece)
+        new_au = self._starts_access_unit(piece, offset, nal_type)
+        # 新 NAL 开始，上一个 NAL 已经完整；新访问单元开始时上一个 NAL 是一帧的最后一个
+        self._flush(marker=new_au)
+        if new_au:
+            elapsed = time.monotonic() - self.clock_start
+            timestamp = (self.ts_base + int(elapsed * CLOCK_RATE)) & 0xffffffff
+            # 同一次读取里的几帧时间几乎相同，保证每帧时间戳不同
+            if timestamp == self.timestamp:
+                timestamp = (timestamp + 1) & 0xffffffff
+            self.timestamp = timestamp
+        self.current = [piece[offset:]]
+        self.current_type = nal_type
+
+    def flush(self):
+        """一次读取以完整的访问单元结尾：立即发出这一帧的最后一个 NAL（带 marker）"""
+        if self.current and _is_vcl(self.current_type):
+            self._flush(marker=True)
+
+    def _starts_access_unit(self, piece, offset, nal_type):
+        # 只有紧跟在 VCL NAL（或流的开头）之后才可能开始新的一帧；
+        # SPS/PPS/SEI 之后的 slice 属于它们开始的那一帧
+        if self.current_type is not None and not _is_vcl(self.current_type):
+            return False
+        if nal_type in AU_START_TYPES:
+            return True
+        if _is_vcl(nal_type):
+            # first_mb_in_slice 为 0（ue(v) 编码的首位为 1）的 slice 开始新的一帧
+            return bool(piece[offset + 1] & 0x80)
+        return False
+
+    def _flush(self, marker):
+        if not self.current:
+            return
+        nal = self.current[0] if len(self.current) == 1 else memoryview(b''.join(self.current))
+        nal_type = self.current_type
+        self.current = []
+        if nal_type in (NAL_SPS, NAL_PPS):
+            # 这时 params 已经包含刚结束的这个参数集
+            self._update_sdp()
+        try:
+            self._send_nal(nal, marker and _is_vcl(nal_type))
+        except OSError as e:
+            hot.warning('send', "RTP 发送失败: %s", e)
+
+    # ===== RTP =====
+
+    def _send_nal(self, nal, marker):
+        max_payload = self.mtu - RTP_HEADER.size
+        if len(nal) <= max_payload:
+            self._send_packet(nal, marker, fu=None)
+            return
+
+        # FU-A：FU indicator 取原 NAL 头的 F/NRI 位，FU header 带起止标志和原类型
+        indicator = (nal[0] & 0xe0) | FU_A
+        nal_type = nal[0] & 0x1f
+        max_payload -= 2
+        offset = 1
+        end = len(nal)
+        while offset < end:
+            stop = min(end, offset + max_payload)
+            fu_header = nal_type
+            if offset == 1:
+                fu_header |= 0x80
+            if stop == end:
+                fu_header |= 0x40
+            self._send_packet(nal[offset:stop], marker and stop == end, fu=(indicator, fu_header))
+            offset = stop
+
+    def _send_packet(self, payload, marker, fu):
+        RTP_HEADER.pack_into(self.header, 0, 0x80, (marker << 7) | self.payload_type,
+                             self.seq, self.timestamp, self.ssrc)
+        self.seq = (self.seq + 1) & 0xffff
+        if fu is None:
+            header = self.header_view[:RTP_HEADER.size]
+        else:
+            self.header[RTP_HEADER.size] = fu[0]
+            self.header[RTP_HEADER.size + 1] = fu[1]
+            header = self.header_view
+        sent = self.sock.sendmsg((header, payload), (), 0, self.address)
+        self.packets += 1
+        self.bytes_sent += sent
+
+    # ===== SDP =====
+
+    def _update_sdp(self):
+        current = (self.params.sps, self.params.pps)
+        if current == self.sdp_params or not (self.sdp_path and all(current)):
+            return
+        self.sdp_params = current
+        with open(self.sdp_path, 'w') as f:
+            f.write(self.sdp())
+        logger.info("已写出 SDP: %s", self.sdp_path)
+
+    def sdp(self):
+        """接收端使用的 SDP 描述；sprop-parameter-sets 来自最近的 SPS/PPS"""
+        host, port = self.address
+        lines = [
+            'v=0',
+            f'o=- {self.ssrc} 0 IN IP4 0.0.0.0',
+            's=raspberry-pi-motor',
+            f'c=IN IP4 {host}',
+            't=0 0',
+            f'm=video {port} RTP/AVP {self.payload_type}',
+            f'a=rtpmap:{self.payload_type} H264/{CLOCK_RATE}',
+        ]
+        fmtp = f'a=fmtp:{self.payload_type} packetization-mode=1'
+        sps, pps = self.params.sps, self.params.pps
+        if sps and pps:
+            # sprop-parameter-sets 中的 NAL 不带起始码
+            sps = sps[_header_offset(sps):]
+            pps = pps[_header_offset(pps):]
+            fmtp += (f';profile-level-id={sps[1:4].hex()}'
+                     f';sprop-parameter-sets={base64.b64encode(sps).decode()},'
+                     f'{base64.b64encode(pps).decode()}')
+        lines.append(fmtp)
+        return '\r\n'.join(lines) + '\r\n'
+
+    def stats(self):
+        return {'packets': self.packets, 'bytes': self.bytes_sent, 'ssrc': self.ssrc}
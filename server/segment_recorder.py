@@ -0,0 +1,487 @@
+#!/usr/bin/python3
+"""
+本地分段录制
+
+把编码器输出的 H.264（不重新编码）封装成固定时长的 MPEG-TS 分段写到 SD 卡：
+    - 每个分段从关键帧开始，到时长后在下一个关键帧处切换；参数（SPS）变化时也立即切换
+    - 封装在读取线程里完成，数据攒成大块（WRITE_BLOCK 或 FLUSH_INTERVAL 秒）交给写入线程顺序写出，
+      SD 卡卡顿不会阻塞推流；积压超过上限时提前结束当前分段，从下一个关键帧开始新分段
+    - 分段写完后追加到目录下的 index.csv（开始时间、结束时间、字节数、文件名），
+      超过总大小或保留时长时从最旧的分段开始删除
+    - MPEG-TS 不需要文件尾，断电时正在写的分段也能播放；启动时会把索引里没有的分段补进索引
+
+时间戳取每帧第一个 NAL 到达的时刻（90kHz），和 RTP 打包相同；编码器一次输出多帧时（如刚启动），
+按帧率拉开间隔，保证时间戳递增。
+
+由 stream_supervisor.py 使用，可以和任意推流方式同时运行（共用同一个编码器）:
+    python3 stream_supervisor.py rtmp "rtmp://..." --record /media/sd/rec --record-segment 60
+    python3 segment_recorder.py /media/sd/rec --at "2026-10-19 17:40:00"   # 查找某一时刻所在的分段
+"""
+import os
+import sys
+import time
+import queue
+import struct
+import bisect
+import logging
+import argparse
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'motor'))
+from log_pipeline import setup_async_logging, HotLogger
+from rtp_packetizer import AU_START_TYPES, CLOCK_RATE
+
+logger = logging.getLogger('SegmentRecorder')
+hot = HotLogger(logger, rate=5)
+
+SEGMENT_SECONDS = 60.0
+MAX_BYTES = 4 * 1024 ** 3          # 录制目录的总大小上限
+MAX_AGE = 0                        # 分段保留时长（秒），0 为不限
+WRITE_BLOCK = 1024 * 1024          # 每次写入的字节数
+FLUSH_INTERVAL = 5.0               # 码率低时最多攒这么久就写出，限制断电时丢失的时长
+MAX_PENDING = 16 * 1024 * 1024     # 写入线程积压的上限
+INDEX_NAME = 'index.csv'
+INDEX_HEADER = 'start,end,bytes,file\n'
+NAME_FORMAT = 'seg-%Y%m%d-%H%M%S'
+
+TS_PACKET = 188
+TS_PAYLOAD = 184
+PID_PMT = 0x1000
+PID_VIDEO = 0x100
+STREAM_TYPE_H264 = 0x1b
+PTS_DELAY = CLOCK_RATE // 10       # PTS 比 PCR 晚 100ms，给解码端留出缓冲
+AUD = b'\x00\x00\x00\x01\x09\xf0'  # 访问单元分隔符，MPEG-TS 中每帧以它开始
+PES_HEADER = b'\x00\x00\x01\xe0\x00\x00\x80\x80\x05'   # 视频流，长度不限，只带 PTS
+
+
+def _crc32_mpeg(data):
+    """MPEG-2 CRC32（多项式 0x04C11DB7，不反转）"""
+    crc = 0xffffffff
+    for b in data:
+        crc ^= b << 24
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x04c11db7) if crc & 0x80000000 else crc << 1
+            crc &= 0xffffffff
+    return crc
+
+
+def _psi_packet(pid, section):
+    section += struct.pack('!I', _crc32_mpeg(section))
+    payload = b'\x00' + section   # pointer_field
+    header = bytes((0x47, 0x40 | pid >> 8, pid & 0xff, 0x10))
+    return header + payload + b'\xff' * (TS_PAYLOAD - len(payload))
+
+
+def _pts_bytes(pts):
+    return bytes((0x21 | (pts >> 29) & 0x0e, (pts >> 22) & 0xff, (pts >> 14) & 0xfe | 1,
+                  (pts >> 7) & 0xff, (pts << 1) & 0xfe | 1))
+
+
+def _pcr_bytes(pcr):
+    return bytes((pcr >> 25 & 0xff, pcr >> 17 & 0xff, pcr >> 9 & 0xff, pcr >> 1 & 0xff,
+                  (pcr & 1) << 7 | 0x7e, 0))
+
+
+# PAT 和 PMT 内容固定，预先生成，每个关键帧前重复一次（写出时填入 continuity_counter）
+PAT_PACKET = _psi_packet(0, bytes((0x00, 0xb0, 0x0d, 0x00, 0x01, 0xc1, 0x00, 0x00,
+                                   0x00, 0x01, 0xe0 | PID_PMT >> 8, PID_PMT & 0xff)))
+PMT_PACKET = _psi_packet(PID_PMT, bytes((0x02, 0xb0, 0x12, 0x00, 0x01, 0xc1, 0x00, 0x00,
+                                         0xe0 | PID_VIDEO >> 8, PID_VIDEO & 0xff, 0xf0, 0x00,
+                                         STREAM_TYPE_H264, 0xe0 | PID_VIDEO >> 8, PID_VIDEO & 0xff,
+                                         0xf0, 0x00)))
+
+
+PAYLOAD_HEADERS = [bytes((0x47, PID_VIDEO >> 8, PID_VIDEO & 0xff, 0x10 | cc)) for cc in range(16)]
+
+
+class TsMuxer:
+    """最小的单节目 MPEG-TS 封装：一路 H.264，PCR 放在视频 PID 上"""
+
+    def __init__(self):
+        self.cc = 0
+        self.psi_cc = 0
+
+    def write_tables(self, out):
+        """PAT + PMT，每个分段开头和每个关键帧前写一次，播放器从任意关键帧都能开始"""
+        for packet in (PAT_PACKET, PMT_PACKET):
+            out += packet[:3]
+            out.append(0x10 | self.psi_cc)
+            out += packet[4:]
+        self.psi_cc = (self.psi_cc + 1) & 0x0f
+
+    def write_frame(self, out, data, pts, keyframe):
+        """把一帧（Annex-B，已含 AUD）封装成 PES 追加到 out（bytearray）"""
+        pes = PES_HEADER + _pts_bytes(pts) + data
+        view = memoryview(pes)
+        end = len(pes)
+        # 第一个包带 PCR，关键帧同时设置 random_access_indicator
+        adaptation = bytes((0x50 if keyframe else 0x10,)) + _pcr_bytes(pts - PTS_DELAY)
+        pos = self._write_packet(out, view, 0, True, adaptation)
+        # 中间的整包没有自适应字段，包头按 continuity_counter 预先生成
+        cc = self.cc
+        full_end = pos + (end - pos) // TS_PAYLOAD * TS_PAYLOAD
+        while pos < full_end:
+            out += PAYLOAD_HEADERS[cc]
+            out += view[pos:pos + TS_PAYLOAD]
+            pos += TS_PAYLOAD
+            cc = (cc + 1) & 0x0f
+        self.cc = cc
+        if pos < end:
+            self._write_packet(out, view, pos, False, None)
+
+    def _write_packet(self, out, view, pos, first, adaptation):
+        """写一个包，放不满时用自适应字段填充到 188 字节，返回写到的位置"""
+        room = TS_PAYLOAD if adaptation is None else TS_PAYLOAD - 1 - len(adaptation)
+        remaining = len(view) - pos
+        if remaining < room:
+            stuffing = room - remaining
+            if adaptation is not None:
+                adaptation += b'\xff' * stuffing
+            elif stuffing == 1:
+                adaptation = b''
+            else:
+                adaptation = b'\x00' + b'\xff' * (stuffing - 2)
+            room = remaining
+        out += bytes((0x47, (0x40 if first else 0) | PID_VIDEO >> 8, PID_VIDEO & 0xff,
+                      (0x30 if adaptation is not None else 0x10) | self.cc))
+        if adaptation is not None:
+            out.append(len(adaptation))
+            out += adaptation
+        out += view[pos:pos + room]
+        self.cc = (self.cc + 1) & 0x0f
+        return pos + room
+
+
+class Segment:
+    def __init__(self, path, start):
+        self.path = path
+        self.start = start      # 开始时间（time.time()）
+        self.end = start
+        self.bytes = 0
+        self.file = None
+        self.failed = False
+
+
+def read_index(directory):
+    """返回按开始时间排序的 [(开始, 结束, 字节数, 文件名), ...]"""
+    entries = []
+    try:
+        with open(os.path.join(directory, INDEX_NAME)) as f:
+            for line in f:
+                parts = line.strip().split(',')
+                if len(parts) != 4 or parts[0] == 'start':
+                    continue
+                entries.append((float(parts[0]), float(parts[1]), int(parts[2]), parts[3]))
+    except FileNotFoundError:
+        pass
+    entries.sort()
+    return entries
+
+
+def find_segment(entries, when):
+    """返回包含时刻 when 的 (条目, 分段内偏移秒数)；不在任何分段内时返回 None"""
+    i = bisect.bisect_right([e[0] for e in entries], when) - 1
+    if i < 0 or when > entries[i][1]:
+        return None
+    return entries[i], when - entries[i][0]
+
+
+class SegmentRecorder:
+    """
+    feed_nal(piece, nal_type) 作为 StreamSupervisor 的 NAL 回调，在读取线程中调用
+
+    params:           StreamSupervisor 的 ParameterSets，SPS 变化时立即切换分段
+    out_dir:          录制目录
+    segment_seconds:  分段时长，实际在到时后的第一个关键帧处切换
+    max_bytes/max_age: 超过总大小或保留时长（秒，0 为不限）时删除最旧的分段
+    fps_getter:       返回当前帧率的可调用对象，用于帧间隔的下限
+    """
+
+    def __init__(self, params, out_dir, segment_seconds=SEGMENT_SECONDS, max_bytes=MAX_BYTES,
+                 max_age=MAX_AGE, fps_getter=lambda: 25):
+        self.params = params
+        self.out_dir = out_dir
+        self.fps_getter = fps_getter
+        self.segment_seconds = segment_seconds
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.muxer = TsMuxer()
+        # 单调时钟换算为墙上时间（索引里记录墙上时间，方便按时刻查找）
+        self.wall_offset = time.time() - time.monotonic()
+        self.clock_start = time.monotonic()
+        self.pts = 0
+
+        # 正在接收的帧（一个访问单元）
+        self.frame = []
+        self.frame_time = 0.0
+        self.frame_keyframe = False
+        self.last_type = None
+        self.generation = params.generation
+        self.params_changed = False
+
+        self.segment = None
+        self.segment_start = 0.0
+        self.buffer = bytearray()
+        self.last_submit = 0.0
+        self.pending = 0          # 已交给写入线程、尚未写出的字节数
+        self.pending_lock = threading.Lock()
+        self.queue = queue.Queue()
+        self.writer = None
+
+        self.entries = []
+        self.total_bytes = 0
+        self.segments = 0
+        self.overflows = 0
+
+    def start(self):
+        os.makedirs(self.out_dir, exist_ok=True)
+        self._load_index()
+        self.writer = threading.Thread(target=self._write_loop, name='segment-writer', daemon=True)
+        self.writer.start()
+        logger.info("本地录制到 %s（分段 %.0f 秒，上限 %d MB）", self.out_dir,
+                    self.segment_seconds, self.max_bytes // (1024 * 1024))
+
+    def stop(self):
+        """结束当前分段并等待写入完成"""
+        self._emit_frame()
+        self._close_segment()
+        self.queue.put(None)
+        if self.writer:
+            self.writer.join()
+
+    def stats(self):
+        return {'segments': self.segments, 'total_bytes': self.total_bytes,
+                'pending_bytes': self.pending, 'overflows': self.overflows}
+
+    # ===== 数据（读取线程） =====
+
+    def feed_nal(self, piece, nal_type):
+        if nal_type is None:
+            if self.frame:
+                self.frame.append(piece)
+            return
+
+        # 与 RTP 打包相同：只有紧跟在 VCL NAL 之后才可能开始新的一帧，
+        # SPS/PPS/SEI 或 first_mb_in_slice 为 0 的 slice 开始新的一帧
+        if self._is_vcl(self.last_type) and (
+                nal_type in AU_START_TYPES or
+                self._is_vcl(nal_type) and piece[(4 if piece[2] == 0 else 3) + 1] & 0x80):
+            self._emit_frame()
+        if not self.frame:
+            self.frame_time = time.monotonic()
+        self.last_type = nal_type
+
+        # SPS 在下一个 NAL（PPS）开始时才更新，这时上一帧已经发出，变化落在本帧（关键帧）上
+        if self.params.generation != self.generation:
+            self.generation = self.params.generation
+            self.params_changed = True
+        self.frame.append(piece)
+        if nal_type == 'idr':
+            self.frame_keyframe = True
+
+    @staticmethod
+    def _is_vcl(nal_type):
+        return nal_type == 'idr' or nal_type is not None and 1 <= nal_type <= 5
+
+    def _emit_frame(self):
+        if not self.frame:
+            return
+        data = b''.join([AUD] + self.frame)
+        keyframe = self.frame_keyframe
+        frame_time = self.frame_time
+        self.frame = []
+        self.frame_keyframe = False
+
+        if keyframe and (self.segment is None or self.params_changed or
+                         frame_time - self.segment_start >= self.segment_seconds):
+            self._close_segment()
+            self._open_segment(frame_time)
+            self.params_changed = False
+        if self.segment is None:
+            # 还没有关键帧（或积压后等待下一个关键帧）
+            return
+
+        pts = int((frame_time - self.clock_start) * CLOCK_RATE) + PTS_DELAY
+        # 同一次读取里的几帧到达时间几乎相同，至少间隔一帧
+        self.pts = pts = max(pts, self.pts + CLOCK_RATE // self.fps_getter()) & 0x1ffffffff
+        if keyframe:
+            self.muxer.write_tables(self.buffer)
+        self.muxer.write_frame(self.buffer, data, pts, keyframe)
+        self.segment.end = frame_time + self.wall_offset
+        if len(self.buffer) >= WRITE_BLOCK or frame_time - self.last_submit >= FLUSH_INTERVAL:
+            self.last_submit = frame_time
+            self._submit()
+
+    def _open_segment(self, frame_time):
+        start = frame_time + self.wall_offset
+        name = time.strftime(NAME_FORMAT, time.localtime(start)) + f'-{int(start * 1000) % 1000:03d}.ts'
+        self.segment = Segment(os.path.join(self.out_dir, name), start)
+        self.segment_start = frame_time
+
+    def _close_segment(self):
+        if self.segment is not None and self._submit():
+            self.queue.put((self.segment, None))
+            self.segment = None
+
+    def _submit(self):
+        """把缓冲区交给写入线程；积压超过上限时放弃这块数据、结束当前分段并返回 False"""
+        if not self.buffer:
+            return True
+        with self.pending_lock:
+            if self.pending + len(self.buffer) > MAX_PENDING:
+                overflow = True
+            else:
+                overflow = False
+                self.pending += len(self.buffer)
+        if overflow:
+            # SD 卡写不过来：放弃这块数据，结束当前分段，从下一个关键帧开始新分段
+            self.buffer = bytearray()
+            self.overflows += 1
+            hot.warning('overflow', "写入积压超过 %d MB，提前结束分段 %s",
+                        MAX_PENDING // (1024 * 1024), self.segment.path)
+            self.queue.put((self.segment, None))
+            self.segment = None
+            return False
+        self.queue.put((self.segment, bytes(self.buffer)))
+        self.buffer = bytearray()
+        return True
+
+    # ===== 写入线程 =====
+
+    def _write_loop(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            segment, data = item
+            if data is None:
+                self._finish_segment(segment)
+                continue
+            try:
+                if not segment.failed:
+                    if segment.file is None:
+                        segment.file = open(segment.path, 'wb', buffering=0)
+                    segment.file.write(data)
+                    segment.bytes += len(data)
+            except OSError as e:
+                segment.failed = True
+                logger.error("写入分段 %s 失败: %s", segment.path, e)
+            finally:
+                with self.pending_lock:
+                    self.pending -= len(data)
+
+    def _finish_segment(self, segment):
+        if segment.file is None:
+            return
+        try:
+            segment.file.flush()
+            os.fsync(segment.file.fileno())
+            if hasattr(os, 'posix_fadvise'):
+                # 录像不会马上再读，释放页缓存，避免挤占其他进程的内存
+                os.posix_fadvise(segment.file.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+        except OSError as e:
+            logger.error("同步分段 %s 失败: %s", segment.path, e)
+        segment.file.close()
+        entry = (segment.start, segment.end, segment.bytes, os.path.basename(segment.path))
+        self.entries.append(entry)
+        self.total_bytes += segment.bytes
+        self.segments += 1
+        logger.info("分段完成 %s（%.1f 秒，%.1f MB）", entry[3], segment.end - segment.start,
+                    segment.bytes / 1e6)
+        if self._rotate():
+            self._write_index()
+        else:
+            self._append_index(entry)
+
+    # ===== 索引与轮换 =====
+
+    def _load_index(self):
+        self.entries = read_index(self.out_dir)
+        indexed = {e[3] for e in self.entries}
+        # 断电或被杀时正在写的分段没有进索引，按文件名和修改时间补上
+        added = False
+        for name in sorted(os.listdir(self.out_dir)):
+            if not name.startswith('seg-') or not name.endswith('.ts') or name in indexed:
+                continue
+            path = os.path.join(self.out_dir, name)
+            try:
+                stamp, _, millis = name[:-3].rpartition('-')
+                start = time.mktime(time.strptime(stamp, NAME_FORMAT)) + int(millis) / 1000
+            except ValueError:
+                continue
+            st = os.stat(path)
+            self.entries.append((start, max(start, st.st_mtime), st.st_size, name))
+            added = True
+        self.entries.sort()
+        self.total_bytes = sum(e[2] for e in self.entries)
+        if self._rotate() or added:
+            self._write_index()
+
+    def _rotate(self):
+        """删除超出总大小或保留时长的最旧分段，有删除时返回 True"""
+        removed = False
+        now = time.time()
+        while len(self.entries) > 1 and (self.total_bytes > self.max_bytes or
+                                         self.max_age and self.entries[0][1] < now - self.max_age):
+            start, end, size, name = self.entries.pop(0)
+            self.total_bytes -= size
+            try:
+                os.remove(os.path.join(self.out_dir, name))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.error("删除分段 %s 失败: %s", name, e)
+            removed = True
+        return removed
+
+    def _write_index(self):
+        path = os.path.join(self.out_dir, INDEX_NAME)
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write(INDEX_HEADER)
+            for entry in self.entries:
+                f.write('%.3f,%.3f,%d,%s\n' % entry)
+        os.replace(tmp, path)
+
+    def _append_index(self, entry):
+        path = os.path.join(self.out_dir, INDEX_NAME)
+        new = not os.path.exists(path)
+        with open(path, 'a') as f:
+            if new:
+                f.write(INDEX_HEADER)
+            f.write('%.3f,%.3f,%d,%s\n' % entry)
+
+
+def main():
+    setup_async_logging()
+    parser = argparse.ArgumentParser(description="查看本地录制的分段索引")
+    parser.add_argument('directory', help="录制目录")
+    parser.add_argument('--at', metavar='TIME', help="查找该时刻所在的分段（YYYY-mm-dd HH:MM:SS）")
+    args = parser.parse_args()
+
+    entries = read_index(args.directory)
+    if not entries:
+        print("没有已完成的分段")
+        return 1
+    if args.at is None:
+        fmt = '%Y-%m-%d %H:%M:%S'
+        for start, end, size, name in entries:
+            print(f"{time.strftime(fmt, time.localtime(start))}  {end - start:7.1f}s  "
+                  f"{size / 1e6:8.1f}MB  {name}")
+        print(f"共 {len(entries)} 个分段，{sum(e[2] for e in entries) / 1e6:.1f} MB")
+        return 0
+
+    when = time.mktime(time.strptime(args.at, '%Y-%m-%d %H:%M:%S'))
+    found = find_segment(entries, when)
+    if found is None:
+        print("该时刻没有录像")
+        return 1
+    entry, offset = found
+    path = os.path.join(args.directory, entry[3])
+    print(f"{path} {offset:.1f}")
+    print(f"ffplay -ss {offset:.1f} {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,687 @@
+#!/usr/bin/python3
+"""
+摄像头推流守护进程（替代 cam_stream*.sh）
+
+编码器（raspivid / libcamera-vid，或用于本地测试的 ffmpeg lavfi 测试源）输出 H.264
+裸流，由本进程读出后转发给输出端：
+    rtmp / srt - 交给 ffmpeg 封装为 flv / mpegts 推流，解析其 -progress 输出
+    tcp / udp  - 直接写入套接字（替代 nc）
+    relay      - 监听 TCP 端口，由 nal_relay.NalRelay 把同一路 H.264 转发给多个观看端
+    rtp        - 由 rtp_packetizer.RtpPacketizer 按 RFC 6184 打成 RTP 包经 UDP 发送
+
+进程退出、输出断开或数据停滞时按指数退避重启。切换画质档位只重启编码器，
+输出端（ffmpeg 和推流连接）保持不动。读出的每块数据也会交给 add_sink 注册的回调；
+需要按 NAL 处理的组件用 add_nal_sink 注册，每块数据只切分一次，所有 NAL 回调共用
+切分结果和 params（最新的 SPS/PPS）。
+
+用法:
+    python3 stream_supervisor.py rtmp "rtmp://localhost/live/stream?live=1"
+    python3 stream_supervisor.py srt "srt://192.168.1.5:9527?pkt_size=1316" --profile medium
+    python3 stream_supervisor.py tcp 192.168.1.5:33064 --width 640 --height 480
+    python3 stream_supervisor.py udp 127.0.0.1:5600 --source test     # 无摄像头时用测试画面
+    python3 stream_supervisor.py relay 0.0.0.0:33064 --udp-viewer 192.168.1.5:5600
+    python3 stream_supervisor.py rtp 192.168.1.5:5004 --sdp stream.sdp
+
+运行中 SIGUSR1 降一档画质，SIGUSR2 升一档。
+--stamp-latency 在每帧前插入时间戳 SEI，配合 latency_probe.py 测量视频延迟；
+--no-low-delay 去掉低延迟相关的编码/封装参数，用于对比。
+--clip-buffer 在内存中保留最近几秒的码流，收到 CLIP:SAVE 时导出为 MP4（见 clip_buffer.py）。
+--record 同时把码流分段录制到本地目录（见 segment_recorder.py），可与任意推流方式一起使用。
+--snapshot-listen 提供 HTTP 截图，按需把最新的关键帧转成 JPEG（见 keyframe_snapshot.py）。
+--metrics 把帧率、码率、丢帧、重启次数等指标写入与 server.py 共用的指标文件（见 stream_telemetry.py）。
+--thermal 按 SoC 温度和 CPU 负载分级限制画质档位，降温后逐级恢复（见 motor/thermal_governor.py）。
+"""
+import os
+import sys
+import time
+import shutil
+import signal
+import fcntl
+import socket
+import struct
+import termios
+import logging
+import argparse
+import threading
+import subprocess
+from collections import namedtuple
+
+# 日志管道模块位于 server/motor 下，与控制服务端共用
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'motor'))
+from log_pipeline import setup_async_logging, HotLogger
+from adaptive_bitrate import AdaptiveBitrate
+from nal_relay import NalRelay, NalSplitter, ParameterSets
+from rtp_packetizer import RtpPacketizer
+from latency_sei import SeiStamper
+from clip_buffer import ClipBuffer, CLIP_PORT, POST_SECONDS
+from segment_recorder import SegmentRecorder, SEGMENT_SECONDS, MAX_BYTES as RECORD_MAX_BYTES
+from keyframe_snapshot import KeyframeSnapshot
+from stream_telemetry import StreamTelemetry
+from metrics import Metrics, MetricsWriter, METRICS_INTERVAL
+from thermal_governor import ThermalGovernor
+
+logger = logging.getLogger('StreamSupervisor')
+hot = HotLogger(logger, rate=5)
+
+Profile = namedtuple('Profile', ['name', 'width', 'height', 'fps', 'bitrate', 'gop'])
+
+# 画质档位，从低到高（low 与原 cam_stream.sh 的配置相同）；自适应码率沿此阶梯升降，
+# 先降码率，再降帧率，最后降分辨率
+PROFILES = [
+    Profile('minimal', 320, 240, 10, 150000, 10),
+    Profile('lower', 480, 360, 15, 300000, 15),
+    Profile('low', 480, 360, 25, 500000, 15),
+    Profile('medium', 640, 480, 25, 1000000, 25),
+    Profile('high', 1280, 720, 30, 2500000, 30),
+]
+PROFILE_BY_NAME = {p.name: p for p in PROFILES}
+
+MODES = ('rtmp', 'srt', 'tcp', 'udp', 'relay', 'rtp')
+CHUNK_SIZE = 65536       # 每次从编码器读取的最大字节数
+UDP_PAYLOAD = 1400       # UDP 模式每个数据报的最大长度（低于常见 MTU）
+WATCH_INTERVAL = 0.2     # 监控循环间隔（秒）
+STALL_TIMEOUT = 5.0      # 超过该时间没有数据视为停滞（秒）
+BACKOFF_INITIAL = 1.0
+BACKOFF_MAX = 30.0
+BACKOFF_RESET_AFTER = 30.0  # 连续正常运行这么久后退避时间恢复初始值
+# tcp 模式的发送缓冲区大小：固定大小（关闭自动调整），积压上限可控，也便于测量队列深度
+TCP_SNDBUF = 64 * 1024
+SIOCOUTQ = termios.TIOCOUTQ  # 套接字发送队列中尚未被确认的字节数
+
+
+def encoder_command(profile, source='camera', low_delay=True):
+    """
+    编码器命令，输出带内联 SPS/PPS 的 H.264 裸流到 stdout
+
+    source: 'camera' 使用 raspivid（没有时用 libcamera-vid）；'test' 使用 ffmpeg lavfi 测试源
+    low_delay: 测试源使用 x264 的 zerolatency 调优（摄像头编码器本身没有帧缓冲，不受影响）
+    """
+    p = profile
+    if source == 'test':
+        tune = ['-tune', 'zerolatency'] if low_delay else []
+        return ['ffmpeg', '-hide_banner', '-loglevel', 'warning', '-nostats', '-re',
+                '-f', 'lavfi', '-i', f'testsrc2=size={p.width}x{p.height}:rate={p.fps}',
+                '-c:v', 'libx264', '-preset', 'ultrafast'] + tune + [
+                '-b:v', str(p.bitrate), '-maxrate', str(p.bitrate),
+                '-bufsize', str(p.bitrate), '-g', str(p.gop), '-bf', '0',
+                '-x264-params', 'repeat-headers=1', '-f', 'h264', '-']
+    if shutil.which('raspivid') or not shutil.which('libcamera-vid'):
+        return ['raspivid', '-n', '-t', '0', '-w', str(p.width), '-h', str(p.height),
+                '-fps', str(p.fps), '-b', str(p.bitrate), '-g', str(p.gop),
+                '-ih', '--codec', 'H264', '-o', '-']
+    return ['libcamera-vid', '-n', '-t', '0', '--width', str(p.width), '--height', str(p.height),
+            '--framerate', str(p.fps), '--bitrate', str(p.bitrate), '--intra', str(p.gop),
+            '--inline', '--codec', 'h264', '-o', '-']
+
+
+def muxer_command(mode, url, low_delay=True):
+    """
+    rtmp / srt 模式的 ffmpeg 封装命令，从 stdin 读 H.264 裸流
+
+    时间戳取自到达时刻，帧率变化（切换档位）时不需要重启。
+    进度以 key=value 行输出到 stdout。
+    low_delay: 输入不缓冲（-fflags nobuffer -flags low_delay），每个包立即写出（-flush_packets 1）
+    """
+    fmt = 'flv' if mode == 'rtmp' else 'mpegts'
+    input_flags = ['-fflags', '+nobuffer+genpts', '-flags', 'low_delay'] if low_delay else ['-fflags', '+genpts']
+    output_flags = ['-flush_packets', '1'] if low_delay else []
+    return (['ffmpeg', '-hide_banner', '-loglevel', 'warning', '-nostats',
+             '-progress', 'pipe:1'] + input_flags +
+            ['-use_wallclock_as_timestamps', '1',
+             '-f', 'h264', '-i', '-',
+             '-c:v', 'copy', '-f', fmt] + output_flags + [url])
+
+
+def parse_address(target):
+    host, _, port = target.rpartition(':')
+    if not host or not port.isdigit():
+        raise ValueError(f"地址格式应为 host:port，实际为 {target!r}")
+    return host, int(port)
+
+
+class ProgressParser:
+    """
+    解析 ffmpeg -progress 输出
+
+    输出按块给出 key=value 行，以 progress=continue / progress=end 结束一块。
+    feed() 在一块结束时返回解析后的字典，否则返回 None。
+    """
+
+    NUMERIC = {
+        'frame': int, 'fps': float, 'total_size': int, 'out_time_us': int,
+        'dup_frames': int, 'drop_frames': int,
+    }
+
+    def __init__(self):
+        self.block = {}
+
+    def feed(self, line):
+        key, sep, value = line.strip().partition('=')
+        if not sep:
+            return None
+        if key == 'progress':
+            block, self.block = self.block, {}
+            block['progress'] = value
+            return block
+        convert = self.NUMERIC.get(key)
+        try:
+            if convert:
+                self.block[key] = convert(value)
+            elif key == 'bitrate':
+                # 例如 "512.3kbits/s"，起始阶段为 "N/A"
+                self.block['bitrate_kbps'] = float(value.replace('kbits/s', ''))
+            elif key == 'speed':
+                self.block['speed'] = float(value.rstrip('x'))
+        except ValueError:
+            pass
+        return None
+
+
+class Backoff:
+    """指数退避：每次失败等待时间翻倍，连续正常运行 reset_after 秒后恢复初始值"""
+
+    def __init__(self, initial=BACKOFF_INITIAL, maximum=BACKOFF_MAX, reset_after=BACKOFF_RESET_AFTER):
+        self.initial = initial
+        self.maximum = maximum
+        self.reset_after = reset_after
+        self.delay = initial
+
+    def next_delay(self):
+        delay = self.delay
+        self.delay = min(self.maximum, self.delay * 2)
+        return delay
+
+    def running_since(self, started, now):
+        if now - started >= self.reset_after:
+            self.delay = self.initial
+
+
+def _stop_process(proc, timeout=2.0):
+    if proc is None or proc.poll() is not None:
+        return
+    proc.terminate()
+    try:
+        proc.wait(timeout)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+
+class StreamSupervisor:
+    """
+    管理编码器和输出端
+
+    mode:    'rtmp' / 'srt'（target 为 URL）或 'tcp' / 'udp'（target 为 host:port）；
+             'relay' / 'rtp' 不直接输出，数据只交给 add_nal_sink 注册的回调
+    profile: 初始画质档位（Profile）
+    source:  'camera' 或 'test'
+    nice:    输出端 ffmpeg 的 nice 值（原脚本用 renice 10 降低推流进程优先级）
+    low_delay:    编码器和封装使用低延迟参数（见 encoder_command / muxer_command）
+    stamp_latency: 在每帧前插入时间戳 SEI（见 latency_sei）
+    """
+
+    def __init__(self, mode, target, profile=PROFILES[0], source='camera', nice=0,
+                 low_delay=True, stamp_latency=False):
+        if mode not in MODES:
+            raise ValueError(f"未知的推流模式: {mode}")
+        self.mode = mode
+        self.target = target
+        self.profile = profile
+        self.source = source
+        self.nice = nice
+        self.low_delay = low_delay
+        self.stamper = SeiStamper() if stamp_latency else None
+
+        self.encoder = None
+        self.muxer = None
+        self.sock = None
+        self.sinks = ()
+        self.nal_sinks = ()
+        self.nal_flushes = ()
+        self.splitter = NalSplitter()
+        self.params = ParameterSets()
+        self.pending_profile = None
+        self.profile_ceiling = None   # 可用的最高档位（PROFILES 下标），None 为不限制
+        self.output_error = None
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.backoff = Backoff()
+
+        self.bytes_in = 0   # 从编码器读出的字节数
+        self.bytes_out = 0  # 写入输出端（ffmpeg 管道或套接字）的字节数
+        self.last_data = time.monotonic()
+        self.stats = {
+            'state': 'stopped',
+            'mode': mode,
+            'profile': profile.name,
+            'restarts': 0,
+            'encoder_restarts': 0,
+            'input_kbps': 0.0,
+            'muxer': {},
+        }
+
+    # ===== 对外接口 =====
+
+    def add_sink(self, callback):
+        """注册数据回调 callback(chunk)，在读取线程中调用，不应阻塞"""
+        self.sinks = self.sinks + (callback,)
+
+    def remove_sink(self, callback):
+        self.sinks = tuple(s for s in self.sinks if s is not callback)
+
+    def add_nal_sink(self, callback, flush=None):
+        """
+        注册 NAL 回调 callback(piece, nal_type)，在读取线程中按码流顺序调用，不应阻塞
+
+        piece / nal_type 见 nal_relay.NalSplitter；调用前 self.params 已经更新。
+        flush(): 一次读取的片段交完、且这次读取以完整的访问单元结尾时调用。编码器（ffmpeg
+        -f h264 写管道）每写完一个访问单元就刷新，没有读满 CHUNK_SIZE 说明管道已经读空，
+        最后一个 NAL 已经完整，不必等下一帧的起始码。
+        """
+        self.nal_sinks = self.nal_sinks + (callback,)
+        if flush is not None:
+            self.nal_flushes = self.nal_flushes + (flush,)
+
+    def switch_profile(self, profile):
+        """切换画质档位（只重启编码器），由监控线程在下一个周期执行"""
+        if isinstance(profile, str):
+            profile = PROFILE_BY_NAME[profile]
+        self.pending_profile = profile
+
+    def step_profile(self, step):
+        """按 PROFILES 顺序升降 step 档（不超过 profile_ceiling）"""
+        top = len(PROFILES) - 1 if self.profile_ceiling is None else self.profile_ceiling
+        index = max(0, min(top, self.profile_index() + step))
+        self.switch_profile(PROFILES[index])
+
+    def profile_index(self):
+        """当前档位在 PROFILES 中的下标，自定义档位按码率归入阶梯中不高于它的最高一档"""
+        current = self.pending_profile or self.profile
+        index = 0
+        for i, p in enumerate(PROFILES):
+            if p.bitrate <= current.bitrate:
+                index = i
+        return index
+
+    def set_profile_ceiling(self, index):
+        """限制可用的最高档位（None 为不限制），当前档位高于上限时立即降到上限"""
+        self.profile_ceiling = index
+        if index is not None and self.profile_index() > index:
+            self.switch_profile(PROFILES[index])
+
+    def queue_bytes(self):
+        """
+        输出端积压的字节数
+
+        tcp: 发送队列中尚未被对端确认的字节（SIOCOUTQ）
+        rtmp/srt: 管道中尚未被 ffmpeg 读走的字节（FIONREAD）；RTMP 走 TCP，网络变差时
+                  ffmpeg 写阻塞，管道随之积压；SRT 自己丢弃过期数据，积压信号较弱
+        udp / relay / rtp: 没有反馈（relay 的每个观看端各自丢帧），总是 0
+        """
+        try:
+            if self.muxer:
+                fd, request = self.muxer.stdin.fileno(), termios.FIONREAD
+            elif self.sock and self.mode == 'tcp':
+                fd, request = self.sock.fileno(), SIOCOUTQ
+            else:
+                return 0
+            return struct.unpack('i', fcntl.ioctl(fd, request, b'\0\0\0\0'))[0]
+        except (OSError, ValueError, AttributeError):
+            return 0
+
+    def start(self):
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name='stream-supervisor', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join()
+
+    # ===== 监控循环 =====
+
+    def run(self):
+        while not self.stop_event.is_set():
+            started = time.monotonic()
+            try:
+                self._start_output()
+                self._start_encoder()
+                self.stats['state'] = 'running'
+                reason = self._watch(started)
+            except (OSError, ValueError) as e:
+                reason = f"启动失败: {e}"
+            self._stop_all()
+            if self.stop_event.is_set():
+                break
+            self.stats['state'] = 'backoff'
+            self.stats['restarts'] += 1
+            delay = self.backoff.next_delay()
+            logger.warning("推流中断（%s），%.0f 秒后重启", reason, delay)
+            self.stop_event.wait(delay)
+        self.stats['state'] = 'stopped'
+        logger.info("推流已停止")
+
+    def _watch(self, started):
+        """监控运行状态，需要整体重启时返回原因"""
+        last_rate_time = time.monotonic()
+        last_rate_bytes = self.bytes_in
+        while not self.stop_event.wait(WATCH_INTERVAL):
+            now = time.monotonic()
+            if self.pending_profile is not None:
+                profile, self.pending_profile = self.pending_profile, None
+                if profile != self.profile:
+                    logger.info("切换画质: %s -> %s", self.profile.name, profile.name)
+                    self.profile = profile
+                    self.stats['profile'] = profile.name
+                    self._restart_encoder()
+                    continue
+
+            if self.output_error:
+                return self.output_error
+            if self.muxer and self.muxer.poll() is not None:
+                return f"ffmpeg 退出，返回码 {self.muxer.returncode}"
+            if self.encoder.poll() is not None:
+                # 编码器单独重启，输出端保持连接
+                delay = self.backoff.next_delay()
+                logger.warning("编码器退出，返回码 %s，%.0f 秒后重启",
+                               self.encoder.returncode, delay)
+                self.stats['encoder_restarts'] += 1
+                if self.stop_event.wait(delay):
+                    return "停止"
+                self._restart_encoder()
+                continue
+            if now - self.last_data > STALL_TIMEOUT:
+                return f"{STALL_TIMEOUT:.0f} 秒没有数据"
+
+            if now - last_rate_time >= 1.0:
+                self.stats['input_kbps'] = (self.bytes_in - last_rate_bytes) * 8 / 1000 / (now - last_rate_time)
+                last_rate_time, last_rate_bytes = now, self.bytes_in
+            self.backoff.running_since(started, now)
+        return "停止"
+
+    # ===== 编码器 =====
+
+    def _start_encoder(self):
+        # 上一个编码器的读取线程已退出；丢掉它留下的不完整 NAL，免得拼到新编码器的输出前面
+        self.splitter = NalSplitter()
+        self.params.reset()
+        cmd = encoder_command(self.profile, self.source, self.low_delay)
+        logger.info("启动编码器: %s", " ".join(cmd))
+        self.encoder = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                        stderr=subprocess.PIPE, bufsize=0, start_new_session=True)
+        self.last_data = time.monotonic()
+        self.encoder_thread = threading.Thread(target=self._pump, args=(self.encoder,),
+                                               name='stream-pump', daemon=True)
+        self.encoder_thread.start()
+        threading.Thread(target=self._log_stderr, args=(self.encoder, 'encoder'), daemon=True).start()
+
+    def _restart_encoder(self):
+        """停止当前编码器，等读取线程读完剩余数据后启动新的编码器"""
+        _stop_process(self.encoder)
+        self.encoder_thread.join()
+        self._start_encoder()
+
+    def _pump(self, proc):
+        """读取编码器输出，转发给输出端和回调"""
+        fd = proc.stdout.fileno()
+        while True:
+            try:
+                chunk = os.read(fd, CHUNK_SIZE)
+            except OSError:
+                break
+            if not chunk:
+                break
+            drained = len(chunk) < CHUNK_SIZE
+            self.bytes_in += len(chunk)
+            self.last_data = time.monotonic()
+            pieces = None
+            if self.stamper or self.nal_sinks:
+                # 只切分一次，SEI 插入和所有 NAL 回调共用；插入 SEI 时输出也用切分后的数据
+                # （最多几个字节的不完整起始码会留到下一次输出）
+                pieces = self.splitter.feed(chunk)
+                if self.stamper:
+                    pieces = self.stamper.stamp(pieces)
+                    chunk = b''.join(piece for piece, _ in pieces)
+            if not self.output_error:
+                try:
+                    self._write_output(chunk)
+                    self.bytes_out += len(chunk)
+                except OSError as e:
+                    self.output_error = f"输出失败: {e}"
+            for sink in self.sinks:
+                try:
+                    sink(chunk)
+                except Exception as e:
+                    hot.warning('sink', "数据回调出错: %s", e)
+            if self.nal_sinks:
+                self._dispatch(pieces)
+                if drained and not self.splitter.pending:
+                    for flush in self.nal_flushes:
+                        try:
+                            flush()
+                        except Exception as e:
+                            hot.warning('nal_sink', "NAL 回调出错: %s", e)
+        proc.stdout.close()
+
+    def _dispatch(self, pieces):
+        params = self.params
+        sinks = self.nal_sinks
+        for piece, nal_type in pieces:
+            params.update(piece, nal_type)
+            for sink in sinks:
+                try:
+                    sink(piece, nal_type)
+                except Exception as e:
+                    hot.warning('nal_sink', "NAL 回调出错: %s", e)
+
+    # ===== 输出端 =====
+
+    def _start_output(self):
+        self.output_error = None
+        if self.mode in ('rtmp', 'srt'):
+            cmd = muxer_command(self.mode, self.target, self.low_delay)
+            if self.nice:
+                cmd = ['nice', '-n', str(self.nice)] + cmd
+            logger.info("启动 ffmpeg: %s", " ".join(cmd))
+            self.muxer = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                          stderr=subprocess.PIPE, bufsize=0, start_new_session=True)
+            threading.Thread(target=self._read_progress, args=(self.muxer,), daemon=True).start()
+            threading.Thread(target=self._log_stderr, args=(self.muxer, 'ffmpeg'), daemon=True).start()
+        elif self.mode == 'tcp':
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, TCP_SNDBUF)
+            self.sock.settimeout(5)
+            self.sock.connect(parse_address(self.target))
+            self.sock.settimeout(STALL_TIMEOUT)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            logger.info("已连接 %s", self.target)
+        elif self.mode == 'udp':
+            self.address = parse_address(self.target)
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            logger.info("UDP 发送到 %s", self.target)
+
+    def _write_output(self, chunk):
+        if self.muxer:
+            # bufsize=0 的管道写入可能只写了一部分（例如被切换档位的信号打断），要循环写完
+            view = memoryview(chunk)
+            while view:
+                view = view[self.muxer.stdin.write(view):]
+        elif self.mode == 'tcp':
+            self.sock.sendall(chunk)
+        elif self.mode == 'udp':
+            view = memoryview(chunk)
+            for offset in range(0, len(view), UDP_PAYLOAD):
+                self.sock.sendto(view[offset:offset + UDP_PAYLOAD], self.address)
+
+    def _read_progress(self, proc):
+        parser = ProgressParser()
+        for raw in proc.stdout:
+            block = parser.feed(raw.decode(errors='replace'))
+            if block is not None:
+                self.stats['muxer'] = block
+                hot.debug('progress', "ffmpeg 进度: %s", block)
+
+    def _log_stderr(self, proc, name):
+        for raw in proc.stderr:
+            line = raw.decode(errors='replace').rstrip()
+            if line:
+                hot.warning(name, "[%s] %s", name, line)
+
+    def _stop_all(self):
+        # 先停进程、断开套接字，让读取线程的写入立即失败，再等它读完退出
+        _stop_process(self.encoder)
+        _stop_process(self.muxer)
+        if self.sock:
+            try:
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if self.encoder:
+            self.encoder_thread.join()
+        if self.muxer:
+            self.muxer.stdin.close()
+            self.muxer = None
+        if self.sock:
+            self.sock.close()
+            self.sock = None
+        self.stats['input_kbps'] = 0.0
+
+
+def thermal_limiter(supervisor):
+    """
+    温控级别变化时的回调：第 N 级把档位上限设为温控开始前的档位再降 N 档（最低到 minimal），
+    每降一级升回一档；回到第 0 级时取消上限并恢复温控开始前的档位（可能是自定义档位）
+    """
+    saved = {}
+
+    def on_level(level, step):
+        if level == 0:
+            supervisor.set_profile_ceiling(None)
+            supervisor.switch_profile(saved.pop('profile'))
+            return
+        if 'profile' not in saved:
+            saved['profile'] = supervisor.pending_profile or supervisor.profile
+            saved['index'] = supervisor.profile_index()
+        supervisor.set_profile_ceiling(max(0, saved['index'] - level))
+        if step < 0:
+            supervisor.step_profile(1)
+
+    return on_level
+
+
+def main():
+    # 配置日志（队列 + 后台线程写出，CAR_LOG_LEVEL 控制级别）
+    setup_async_logging()
+    parser = argparse.ArgumentParser(description="摄像头推流守护进程")
+    parser.add_argument('mode', choices=MODES, help="推流方式")
+    parser.add_argument('target', help="rtmp/srt 为 URL，tcp/udp/rtp 为 host:port，relay 为监听地址 host:port")
+    parser.add_argument('--profile', choices=list(PROFILE_BY_NAME), default='low', help="画质档位")
+    parser.add_argument('--width', type=int, help="覆盖档位的宽度")
+    parser.add_argument('--height', type=int, help="覆盖档位的高度")
+    parser.add_argument('--fps', type=int, help="覆盖档位的帧率")
+    parser.add_argument('--bitrate', type=int, help="覆盖档位的码率（bit/s）")
+    parser.add_argument('--gop', type=int, help="覆盖档位的关键帧间隔")
+    parser.add_argument('--source', choices=['camera', 'test'], default='camera',
+                        help="camera 使用摄像头；test 使用 ffmpeg lavfi 测试画面")
+    parser.add_argument('--nice', type=int, default=0, help="ffmpeg 进程的 nice 值")
+    parser.add_argument('--adaptive', action='store_true',
+                        help="根据发送队列积压和实际吞吐量自动升降画质档位（rtmp/tcp 有效）")
+    parser.add_argument('--udp-viewer', action='append', default=[], metavar='HOST:PORT',
+                        help="relay 模式下额外推送的 UDP 观看端（可重复）")
+    parser.add_argument('--sdp', metavar='PATH', help="rtp 模式下写出供接收端使用的 SDP 文件")
+    parser.add_argument('--stamp-latency', action='store_true',
+                        help="在每帧前插入时间戳 SEI，供 latency_probe.py 测量延迟")
+    parser.add_argument('--no-low-delay', action='store_true',
+                        help="不使用低延迟编码/封装参数（用于对比延迟）")
+    parser.add_argument('--clip-buffer', type=float, default=0, metavar='SECONDS',
+                        help="在内存中保留最近 SECONDS 秒的码流，收到保存请求时导出片段（0 为关闭）")
+    parser.add_argument('--clip-post', type=float, default=POST_SECONDS, metavar='SECONDS',
+                        help="保存请求之后继续录制的秒数")
+    parser.add_argument('--clip-dir', default='clips', help="片段保存目录")
+    parser.add_argument('--clip-port', type=int, default=CLIP_PORT,
+                        help="接收保存请求的本机 UDP 端口（server.py --clip-notify）")
+    parser.add_argument('--record', metavar='DIR', help="同时把码流分段录制到本地目录（MPEG-TS，不重新编码）")
+    parser.add_argument('--record-segment', type=float, default=SEGMENT_SECONDS, metavar='SECONDS',
+                        help="分段时长，在到时后的第一个关键帧处切换")
+    parser.add_argument('--record-max-mb', type=int, default=RECORD_MAX_BYTES // (1024 * 1024),
+                        help="录制目录的总大小上限，超过时删除最旧的分段")
+    parser.add_argument('--record-max-hours', type=float, default=0,
+                        help="分段保留时长，0 为不限")
+    parser.add_argument('--snapshot-listen', metavar='HOST:PORT',
+                        help="提供 HTTP 截图 /snapshot.jpg（最新关键帧按需转 JPEG），如 0.0.0.0:8081")
+    parser.add_argument('--metrics', metavar='PATH',
+                        help="把推流指标追加到 PATH（JSON 行，可与 server.py --metrics 共用同一个文件）")
+    parser.add_argument('--metrics-interval', type=float, default=METRICS_INTERVAL, help="指标写出间隔（秒）")
+    parser.add_argument('--thermal', action='store_true',
+                        help="SoC 温度或 CPU 负载过高时分级降低画质档位上限，降温后逐级恢复")
+    args = parser.parse_args()
+
+    profile = PROFILE_BY_NAME[args.profile]
+    overrides = {k: getattr(args, k) for k in ('width', 'height', 'fps', 'bitrate', 'gop')
+                 if getattr(args, k) is not None}
+    if overrides:
+        profile = profile._replace(name='custom', **overrides)
+
+    supervisor = StreamSupervisor(args.mode, args.target, profile, args.source, args.nice,
+                                  low_delay=not args.no_low_delay, stamp_latency=args.stamp_latency)
+    signal.signal(signal.SIGUSR1, lambda *_: supervisor.step_profile(-1))
+    signal.signal(signal.SIGUSR2, lambda *_: supervisor.step_profile(1))
+    signal.signal(signal.SIGTERM, lambda *_: supervisor.stop_event.set())
+    if args.mode == 'relay':
+        relay = NalRelay(supervisor.params, parse_address(args.target),
+                         [parse_address(a) for a in args.udp_viewer])
+        relay.start()
+        supervisor.add_nal_sink(relay.feed_nal)
+    elif args.mode == 'rtp':
+        packetizer = RtpPacketizer(supervisor.params, parse_address(args.target), sdp_path=args.sdp)
+        supervisor.add_nal_sink(packetizer.feed_nal, packetizer.flush)
+    if args.clip_buffer > 0:
+        clips = ClipBuffer(supervisor.params, args.clip_dir, args.clip_buffer, args.clip_post,
+                           fps_getter=lambda: supervisor.profile.fps)
+        clips.listen(('127.0.0.1', args.clip_port))
+        supervisor.add_nal_sink(clips.feed_nal)
+    recorder = None
+    if args.record:
+        recorder = SegmentRecorder(supervisor.params, args.record, args.record_segment,
+                                   args.record_max_mb * 1024 * 1024, args.record_max_hours * 3600,
+                                   fps_getter=lambda: supervisor.profile.fps)
+        recorder.start()
+        supervisor.add_nal_sink(recorder.feed_nal)
+    if args.snapshot_listen:
+        snapshot = KeyframeSnapshot(supervisor.params)
+        snapshot.serve(parse_address(args.snapshot_listen))
+        supervisor.add_nal_sink(snapshot.feed_nal)
+    governor = None
+    if args.thermal:
+        governor = ThermalGovernor()
+        governor.add_listener(thermal_limiter(supervisor))
+        governor.start()
+    metrics_writer = None
+    if args.metrics:
+        metrics = Metrics('stream')
+        StreamTelemetry(supervisor).attach(metrics)
+        if governor:
+            governor.attach(metrics)
+        metrics_writer = MetricsWriter(metrics, args.metrics, args.metrics_interval)
+        metrics_writer.start()
+    supervisor.start()
+    if args.adaptive:
+        AdaptiveBitrate(supervisor).start()
+    try:
+        while supervisor.thread.is_alive():
+            supervisor.thread.join(1.0)
+    except KeyboardInterrupt:
+        pass
+    supervisor.stop()
+    if governor:
+        governor.stop()
+    if recorder:
+        recorder.stop()
+    if metrics_writer:
+        metrics_writer.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+#!/usr/bin/python3
+"""
+推流健康指标
+
+把 StreamSupervisor 的状态整理成 metrics.Metrics 指标（来源 "stream"），
+与控制服务端写到同一个指标文件：
+
+    帧率 fps / 关键帧 keyframes  由读出的码流按帧计数（所有推流方式都有，不依赖 ffmpeg）
+    frame_gap_ms                 相邻两帧到达的间隔分布，编码器卡顿或 CPU 降频时最大值升高
+    input_kbps / output_kbps     编码器产生 / 写入输出端的码率
+    queue_s                      输出端积压（按当前档位码率折算成秒，见 queue_bytes）
+    stall_s                      距上一次读到数据的时间
+    muxer_fps / muxer_bitrate_kbps / muxer_speed   rtmp / srt 模式下 ffmpeg -progress 的输出
+    drop_frames / dup_frames     ffmpeg 丢弃 / 复制的帧数（ffmpeg 重启后继续累加）
+    restarts / encoder_restarts  整体重启和编码器单独重启的次数
+    state / profile              运行状态和当前画质档位
+
+由 stream_supervisor.py --metrics PATH 使用。
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'motor'))
+from latency_sei import is_frame_start
+
+
+class StreamTelemetry:
+    """
+    feed_nal(piece, nal_type) 作为 StreamSupervisor 的 NAL 回调（按帧计数）；
+    collect(metrics) 注册为 Metrics 的采样回调
+    """
+
+    def __init__(self, supervisor):
+        self.supervisor = supervisor
+        self.frames = 0
+        self.keyframes = 0
+        self.metrics = None
+        self.last_frame = None
+        self.prev = None           # 上次采样：(时间, 帧数, 读入字节, 写出字节)
+        self.muxer_frames = {}     # 当前 ffmpeg 进程的 drop_frames / dup_frames
+
+    def attach(self, metrics):
+        self.metrics = metrics
+        for name in ('drop_frames', 'dup_frames'):
+            metrics.incr(name, 0)
+        metrics.add_collector(self.collect)
+        self.supervisor.add_nal_sink(self.feed_nal)
+
+    def feed_nal(self, piece, nal_type):
+        if not is_frame_start(piece, nal_type):
+            return
+        now = time.monotonic()
+        self.frames += 1
+        if nal_type == 'idr':
+            self.keyframes += 1
+        if self.last_frame is not None:
+            self.metrics.observe('frame_gap_ms', (now - self.last_frame) * 1000)
+        self.last_frame = now
+
+    def collect(self, metrics):
+        sup = self.supervisor
+        stats = sup.stats
+        now = time.monotonic()
+        sample = (now, self.frames, sup.bytes_in, sup.bytes_out)
+        if self.prev is not None and now > self.prev[0]:
+            dt = now - self.prev[0]
+            metrics.set('fps', round((sample[1] - self.prev[1]) / dt, 1))
+            metrics.set('input_kbps', round((sample[2] - self.prev[2]) * 8 / 1000 / dt, 1))
+            metrics.set('output_kbps', round((sample[3] - self.prev[3]) * 8 / 1000 / dt, 1))
+        self.prev = sample
+
+        metrics.set('state', stats['state'])
+        metrics.set('profile', stats['profile'])
+        metrics.set('stall_s', round(now - sup.last_data, 2) if stats['state'] == 'running' else None)
+        metrics.set('queue_s', round(sup.queue_bytes() * 8 / sup.profile.bitrate, 3))
+        metrics.set_total('frames', self.frames)
+        metrics.set_total('keyframes', self.keyframes)
+        for name in ('restarts', 'encoder_restarts'):
+            metrics.set_total(name, stats[name])
+
+        muxer = stats['muxer']
+        metrics.set('muxer_fps', muxer.get('fps'))
+        metrics.set('muxer_bitrate_kbps', muxer.get('bitrate_kbps'))
+        metrics.set('muxer_speed', muxer.get('speed'))
+        for name in ('drop_frames', 'dup_frames'):
+            value = muxer.get(name)
+            if value is None:
+                continue
+            # ffmpeg 重启后计数从 0 开始，只累加增量
+            last = self.muxer_frames.get(name, 0)
+            metrics.incr(name, value - last if value >= last else value)
+            self.muxer_frames[name] = value
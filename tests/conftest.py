@@ -0,0 +1,14 @@
+"""
+单元测试的公共设置
+
+服务端模块是 server/ 和 server/motor/ 下的平铺脚本，与 bench_micro.py 一样把两个目录加入 sys.path；
+测试总是使用模拟 GPIO，日志只输出错误。
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'server', 'motor'))
+sys.path.insert(0, os.path.join(ROOT, 'server'))
+os.environ['CAR_GPIO'] = 'sim'
+os.environ.setdefault('CAR_LOG_LEVEL', 'ERROR')
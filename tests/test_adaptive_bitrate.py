@@ -0,0 +1,87 @@
+"""adaptive_bitrate.AbrPolicy: 用合成的积压 / 送达率序列验证何时降档、何时升档、升档前等多久"""
+from adaptive_bitrate import AbrPolicy
+
+IDLE = (0.0, 1.0)        # 没有积压，全部送达
+BUSY = (0.1, 1.0)        # 有积压但没到拥塞
+BACKLOG = (0.5, 1.0)     # 积压超过 0.25 秒
+LOSSY = (0.0, 0.5)       # 送达率低于 70%
+
+
+def run(policy, samples, start=0.0, interval=1.0):
+    """每 interval 秒送入一个 (queue_s, delivery) 采样，返回每次的决策"""
+    return [policy.update(queue_s, delivery, start + i * interval)
+            for i, (queue_s, delivery) in enumerate(samples)]
+
+
+def first_step(policy, sample, start, step):
+    """从 start 起每秒送入同一个采样，返回第一次得到 step 的时刻"""
+    t = start
+    while policy.update(*sample, t) != step:
+        t += 1
+        assert t < start + 1000
+    return t
+
+
+def test_steps_down_after_consecutive_congestion():
+    policy = AbrPolicy()
+    assert run(policy, [BACKLOG, BACKLOG]) == [0, -1]
+
+
+def test_low_delivery_counts_as_congestion():
+    policy = AbrPolicy()
+    assert run(policy, [LOSSY, BACKLOG]) == [0, -1]
+
+
+def test_single_congested_sample_is_ignored():
+    policy = AbrPolicy()
+    assert run(policy, [BACKLOG, IDLE, BACKLOG, BUSY, BACKLOG, IDLE]) == [0] * 6
+
+
+def test_cooldown_after_switch():
+    policy = AbrPolicy(cooldown=3.0)
+    assert run(policy, [BACKLOG] * 2) == [0, -1]
+    # t=1 降档，t=2、3 的采样被忽略（编码器重启）；t=4 起重新连续计数，t=5 再降档后又进入冷却
+    assert run(policy, [BACKLOG] * 5, start=2.0) == [0, 0, 0, -1, 0]
+
+
+def test_steps_up_after_idle_hold():
+    policy = AbrPolicy(up_hold=10.0)
+    results = run(policy, [IDLE] * 12)
+    assert results.index(1) == 10
+    assert results.count(1) == 1
+
+
+def test_busy_queue_restarts_idle_hold():
+    policy = AbrPolicy(up_hold=10.0)
+    assert run(policy, [IDLE] * 8 + [BUSY] + [IDLE] * 10) == [0] * 19
+    assert policy.update(*IDLE, 19.0) == 1
+
+
+def test_up_hold_doubles_when_upgrade_fails():
+    policy = AbrPolicy(up_hold=10.0, up_hold_max=40.0, cooldown=0.0)
+    up = first_step(policy, IDLE, 0, 1)
+    assert up == 10
+    # 升档后马上拥塞：这一档撑不住，下次升档等 20 秒
+    down = first_step(policy, BACKLOG, up + 1, -1)
+    assert policy.up_hold == 20.0
+    up = first_step(policy, IDLE, down + 1, 1)
+    assert up - (down + 1) == 20
+    # 再次失败：40 秒，之后不再增加
+    down = first_step(policy, BACKLOG, up + 1, -1)
+    assert policy.up_hold == 40.0
+    up = first_step(policy, IDLE, down + 1, 1)
+    down = first_step(policy, BACKLOG, up + 1, -1)
+    assert policy.up_hold == 40.0
+
+
+def test_up_hold_resets_after_stable_upgrade():
+    policy = AbrPolicy(up_hold=10.0, cooldown=0.0)
+    up = first_step(policy, IDLE, 0, 1)
+    down = first_step(policy, BACKLOG, up + 1, -1)
+    up = first_step(policy, IDLE, down + 1, 1)
+    assert policy.up_hold == 20.0
+    # 升档后稳定运行满 up_hold，恢复初始等待时间；之后的拥塞不再加倍
+    assert run(policy, [BUSY] * 21, start=up + 1) == [0] * 21
+    assert policy.up_hold == 10.0
+    first_step(policy, BACKLOG, up + 22, -1)
+    assert policy.up_hold == 10.0
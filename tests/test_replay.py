@@ -0,0 +1,86 @@
+"""session_record + replay: 在模拟 GPIO 上录制一段会话，回放后对比 GPIO 时间线和命令构成"""
+import time
+from collections import Counter
+
+import replay
+import fake_gpio
+from server import CarServer
+from session_record import read_session
+
+# (等待秒数, 这次 recv 收到的数据)：包含一批多条命令、一条被 TCP 分成两段的命令；
+# 舵机命令之间隔开 0.35 秒，避开 0.2 秒的防抖，回放结果才与录制时一致
+SESSION = [
+    (0.3, b"MOVE:FORWARD:60\n"),
+    (0.05, b"MOVE:LEFT\nBELL:ON\n"),
+    (0.05, b"SERVO:UP\n"),
+    (0.35, b"SERVO:RIGHT\nSTATUS:REQ"),
+    (0.05, b"UEST\nBELL:OFF\n"),
+    (0.35, b"MOVE:BACKWARD:100;SERVO:DOWN\n"),
+    (0.05, b"STOP\n"),
+]
+COMMANDS = ["MOVE:FORWARD:60", "MOVE:LEFT", "BELL:ON", "SERVO:UP", "SERVO:RIGHT",
+            "STATUS:REQUEST", "BELL:OFF", "MOVE:BACKWARD:100;SERVO:DOWN", "STOP"]
+# 录制和回放的时间线允许的偏差（秒）
+TOLERANCE = 0.1
+
+
+class ScriptedClient:
+    """代替客户端套接字：按 SESSION 的节奏返回数据，收集服务端的回复"""
+
+    def __init__(self, script):
+        self.script = list(script)
+        self.responses = []
+
+    def recv(self, size):
+        if not self.script:
+            return b''
+        delay, data = self.script.pop(0)
+        time.sleep(delay)
+        return data
+
+    def sendall(self, data):
+        self.responses.append(data)
+
+    def close(self):
+        pass
+
+
+def gpio_events(timeline):
+    return [(kind, pin, value) for _, kind, pin, value in timeline if kind != 'cmd']
+
+
+def test_record_and_replay_match(tmp_path):
+    path = str(tmp_path / 'session.rec')
+    server = CarServer(port=0, record_path=path)
+    client = ScriptedClient(SESSION)
+    fake_gpio.reset_timeline()
+    server.running = True
+    try:
+        server._handle_client(client, ('127.0.0.1', 0))
+        recorded = fake_gpio.timeline()
+        t0 = server.recorder._t0
+    finally:
+        server.stop()
+
+    assert [r for r in client.responses if r.startswith(b'STATUS:')] == [
+        b"STATUS:MOVE=STOPPED|SERVO1=110|SERVO2=60|BELL=ON\n"]
+    _, commands = read_session(path)
+    assert [cmd for _, cmd in commands] == COMMANDS
+    offsets = [offset for offset, _ in commands]
+    assert offsets == sorted(offsets)
+
+    result = replay.replay(commands, speed=1.0)
+
+    assert result['commands'] == len(COMMANDS)
+    assert result['responses'] == 1
+    assert result['command_mix'] == {'MOVE': 3, 'BELL': 2, 'SERVO': 2, 'STATUS': 1, 'STOP': 1}
+    # 回放产生与录制时完全相同的 GPIO 动作序列
+    recorded_events = gpio_events(recorded)
+    assert gpio_events(result['timeline']) == recorded_events
+    assert Counter(kind for kind, _, _ in recorded_events) == result['actuations']
+    assert ('pwm', 2, 0) in recorded_events and ('out', 7, 1) in recorded_events
+    # 按原始节奏回放：每个动作的时刻与录制时接近
+    replayed_times = [t for t, kind, _, _ in result['timeline'] if kind != 'cmd']
+    recorded_times = [t - t0 for t, _, _, _ in recorded]
+    for replayed_t, recorded_t in zip(replayed_times, recorded_times):
+        assert abs(replayed_t - recorded_t) < TOLERANCE
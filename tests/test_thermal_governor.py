@@ -0,0 +1,173 @@
+"""thermal_governor: 模拟 sysfs / proc 目录下的传感器读数，以及 ThermalPolicy 的升降级决策"""
+import os
+import importlib
+
+import pytest
+
+import thermal_governor
+
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(text)
+
+
+def stat_line(busy, idle):
+    # cpu user nice system idle iowait irq softirq steal guest guest_nice
+    return f"cpu  {busy} 0 0 {idle} 0 0 0 0 0 0\ncpu0 {busy} 0 0 {idle} 0 0 0 0 0 0\n"
+
+
+@pytest.fixture
+def fake_root(tmp_path, monkeypatch):
+    """CAR_SYSFS_ROOT / CAR_PROC_ROOT 指向临时目录并重新加载模块，结束后恢复默认路径"""
+    sysfs = tmp_path / 'sys'
+    proc = tmp_path / 'proc'
+    write(os.path.join(sysfs, thermal_governor.TEMP_PATH), '45000\n')
+    write(os.path.join(sysfs, thermal_governor.THROTTLED_PATH), '0x0\n')
+    write(os.path.join(proc, 'stat'), stat_line(100, 900))
+    monkeypatch.setenv('CAR_SYSFS_ROOT', str(sysfs))
+    monkeypatch.setenv('CAR_PROC_ROOT', str(proc))
+    module = importlib.reload(thermal_governor)
+    yield module, sysfs, proc
+    monkeypatch.undo()
+    importlib.reload(thermal_governor)
+
+
+# ===== SysfsSensors =====
+
+def test_sensors_use_env_roots(fake_root):
+    module, sysfs, proc = fake_root
+    sensors = module.SysfsSensors()
+    assert sensors.temp_path == os.path.join(str(sysfs), module.TEMP_PATH)
+    assert sensors.stat_path == os.path.join(str(proc), 'stat')
+    assert sensors.temperature() == 45.0
+
+
+def test_temperature_millidegrees(fake_root):
+    module, sysfs, _ = fake_root
+    write(os.path.join(sysfs, module.TEMP_PATH), '71234\n')
+    assert module.SysfsSensors().temperature() == pytest.approx(71.234)
+
+
+def test_throttled_only_current_bits(fake_root):
+    module, sysfs, _ = fake_root
+    sensors = module.SysfsSensors()
+    path = os.path.join(sysfs, module.THROTTLED_PATH)
+    assert sensors.throttled() is False
+    write(path, '0x4\n')       # 正在降频
+    assert sensors.throttled() is True
+    write(path, '0x50000\n')   # 只有"曾经降频"的历史位
+    assert sensors.throttled() is False
+
+
+def test_cpu_load_between_reads(fake_root):
+    module, _, proc = fake_root
+    sensors = module.SysfsSensors()
+    assert sensors.cpu_load() is None
+    # 忙碌 +90，空闲 +10
+    write(os.path.join(proc, 'stat'), stat_line(190, 910))
+    assert sensors.cpu_load() == pytest.approx(0.9)
+    # 计数没有增加（读数异常）时不给出占用率
+    assert sensors.cpu_load() is None
+
+
+def test_missing_or_bad_files_read_as_none(fake_root):
+    module, sysfs, _ = fake_root
+    os.remove(os.path.join(sysfs, module.THROTTLED_PATH))
+    write(os.path.join(sysfs, module.TEMP_PATH), 'garbage\n')
+    sensors = module.SysfsSensors()
+    assert sensors.throttled() is None
+    assert sensors.temperature() is None
+
+
+# ===== ThermalPolicy =====
+
+def test_steps_up_at_level_temps():
+    policy = thermal_governor.ThermalPolicy()
+    assert policy.update(69.9, None, False, 0) == 0
+    assert policy.update(70.0, None, False, 2) == 1
+    assert policy.level == 1
+    assert policy.update(74.9, None, False, 4) == 0
+    assert policy.update(75.0, None, False, 6) == 1
+    assert policy.level == 2
+    assert policy.update(79.0, None, False, 8) == 1
+    assert policy.level == 3
+    assert policy.update(85.0, None, False, 10) == 0
+
+
+def test_steps_up_one_level_per_sample():
+    policy = thermal_governor.ThermalPolicy()
+    assert [policy.update(79.5, None, False, t) for t in range(4)] == [1, 1, 1, 0]
+
+
+def test_load_and_throttling():
+    policy = thermal_governor.ThermalPolicy()
+    # 连续 3 次满载才升级，温度正常时最多到第 1 级
+    assert [policy.update(50.0, 0.95, False, t) for t in range(5)] == [0, 0, 1, 0, 0]
+    # 固件降频时一直升到最高级
+    assert [policy.update(50.0, 0.95, True, t) for t in range(5, 8)] == [1, 1, 0]
+
+
+def test_hysteresis():
+    policy = thermal_governor.ThermalPolicy(restore_hold=10)
+    policy.update(71.0, None, False, 0)
+    # 低于进入温度但在回差以内：一直不降级
+    for t in range(2, 100, 2):
+        assert policy.update(66.0, None, False, t) == 0
+    assert policy.level == 1
+    # 低于 70 - 5 后还要保持 restore_hold 秒
+    assert policy.update(64.9, None, False, 100) == 0
+    assert policy.update(64.9, None, False, 109) == 0
+    # 中途回到回差以内重新计时
+    assert policy.update(66.0, None, False, 110) == 0
+    assert policy.update(64.9, None, False, 112) == 0
+    assert policy.update(64.9, None, False, 121) == 0
+    assert policy.update(64.9, None, False, 122) == -1
+    assert policy.level == 0
+
+
+def test_load_blocks_restore():
+    policy = thermal_governor.ThermalPolicy(restore_hold=10)
+    policy.update(71.0, None, False, 0)
+    assert policy.update(60.0, 0.8, False, 20) == 0
+    assert policy.update(60.0, 0.5, False, 22) == 0
+    assert policy.update(60.0, 0.5, False, 32) == -1
+
+
+def cool_down(policy, start):
+    """从 start 起保持低温，返回降级发生的时刻"""
+    t = start
+    while policy.update(50.0, None, False, t) != -1:
+        t += 1
+    return t
+
+
+def test_restore_hold_doubles_on_quick_relapse():
+    policy = thermal_governor.ThermalPolicy(restore_hold=30, restore_hold_max=100)
+    policy.update(71.0, None, False, 0)
+    restored = cool_down(policy, 1)
+    assert restored == 31
+    # 降级后 30 秒内又升级：下次降级要等 60 秒
+    assert policy.update(71.0, None, False, restored + 10) == 1
+    assert policy.restore_hold == 60
+    restored = cool_down(policy, 42)
+    assert restored == 42 + 60
+    # 再次很快复发：加倍但不超过 restore_hold_max
+    policy.update(71.0, None, False, restored + 5)
+    assert policy.restore_hold == 100
+
+
+def test_restore_hold_resets_after_stable_period():
+    policy = thermal_governor.ThermalPolicy(restore_hold=30)
+    policy.update(71.0, None, False, 0)
+    restored = cool_down(policy, 1)
+    policy.update(71.0, None, False, restored + 1)
+    assert policy.restore_hold == 60
+    restored = cool_down(policy, restored + 2)
+    # 降级后稳定运行满 restore_hold，恢复初始等待时间
+    assert policy.update(50.0, None, False, restored + 60) == 0
+    assert policy.restore_hold == 30
+    # 之后再升级不算"刚降级就复发"
+    assert policy.update(71.0, None, False, restored + 61) == 1
+    assert policy.restore_hold == 30